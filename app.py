@@ -3,21 +3,42 @@ SeniorCare - AI Caregiver Companion
 Backend Flask para a aplicação mobile de cuidado a idosos
 """
 
+import asyncio
+import atexit
+import base64
+import hashlib
+import hmac
+import heapq
+import json
 import os
+import queue
+import random
+import re
 import sys
-from datetime import datetime, timedelta
-from functools import wraps
-
-from flask import Flask, jsonify, request, render_template, send_from_directory
+import traceback
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import partial, wraps
+from types import SimpleNamespace
+
+from flask import Flask, Response, g, has_request_context, jsonify, request, render_template, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import make_transient_to_detached, object_session
 from flask_cors import CORS
-from flask_migrate import Migrate
+from flask_migrate import Migrate, upgrade as upgrade_db
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 
 # Twilio para notificações WhatsApp
 try:
     from twilio.rest import Client as TwilioClient
+    from twilio.http.http_client import TwilioHttpClient
     TWILIO_AVAILABLE = True
 except ImportError:
     TWILIO_AVAILABLE = False
@@ -25,7 +46,7 @@ except ImportError:
 
 # Inicialização da app
 app = Flask(__name__, static_folder='static', template_folder='templates')
-CORS(app)
+CORS(app, expose_headers=['X-Next-Cursor'])
 
 # Configuração
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -34,16 +55,140 @@ app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-i
 TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
 TWILIO_WHATSAPP_FROM = os.environ.get('TWILIO_WHATSAPP_FROM', 'whatsapp:+14155238886')  # Sandbox default
+TWILIO_SMS_FROM = os.environ.get('TWILIO_SMS_FROM')  # Número SMS (failover); sem ele não há failover
+NOTIFICATION_SEND_TIMEOUT = float(os.environ.get('NOTIFICATION_SEND_TIMEOUT', 10))  # Segundos por envio
 
 # Inicializar cliente Twilio
 twilio_client = None
 if TWILIO_AVAILABLE and TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN:
     try:
-        twilio_client = TwilioClient(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+        twilio_client = TwilioClient(
+            TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN,
+            http_client=TwilioHttpClient(timeout=NOTIFICATION_SEND_TIMEOUT)
+        )
         print(f"Twilio inicializado com sucesso!")
     except Exception as e:
         print(f"Erro ao inicializar Twilio: {e}")
 
+
+class FakeTwilioClient:
+    """
+    Cliente Twilio local (sem rede) para testes e desenvolvimento.
+    Regista as mensagens enviadas e pode simular latência e falhas.
+    """
+
+    class _Messages:
+        def __init__(self, client):
+            self._client = client
+
+        def create(self, body, from_, to):
+            return self._client._create(body, from_, to)
+
+    def __init__(self, latency=0.0, fail_numbers=None):
+        self.latency = latency
+        self.fail_numbers = set(fail_numbers or [])
+        self.sent = []
+        self.messages = self._Messages(self)
+        self._lock = threading.Lock()
+
+    def _create(self, body, from_, to):
+        if self.latency:
+            time.sleep(self.latency)
+        if to in self.fail_numbers or to.replace('whatsapp:', '') in self.fail_numbers:
+            raise Exception(f"Falha simulada para {to}")
+        with self._lock:
+            self.sent.append({'body': body, 'from': from_, 'to': to})
+            sid = f"SMFAKE{len(self.sent):010d}"
+        return SimpleNamespace(sid=sid)
+
+
+# Cliente local em vez do Twilio (TWILIO_FAKE=1)
+if os.environ.get('TWILIO_FAKE') == '1':
+    twilio_client = FakeTwilioClient(latency=float(os.environ.get('TWILIO_FAKE_LATENCY', 0)))
+    print("Twilio: cliente local (fake) ativo")
+
+# Fila de notificações
+NOTIFICATION_WORKERS = int(os.environ.get('NOTIFICATION_WORKERS', 8))
+NOTIFICATION_POLL_INTERVAL = float(os.environ.get('NOTIFICATION_POLL_INTERVAL', 5))
+NOTIFICATION_QUEUE_SYNC = os.environ.get('NOTIFICATION_QUEUE_SYNC') == '1'  # Enviar no próprio pedido (testes)
+# queue = pool em background; async = no pedido, em paralelo (asyncio); sync = no pedido, sequencial
+NOTIFICATION_MODE = os.environ.get('NOTIFICATION_MODE', 'sync' if NOTIFICATION_QUEUE_SYNC else 'queue')
+
+# Deduplicação e limite por (destinatário, tipo, referência)
+NOTIFICATION_DEDUP_WINDOW = float(os.environ.get('NOTIFICATION_DEDUP_WINDOW', 120))  # Segundos: mensagem idêntica descartada
+NOTIFICATION_RATE_LIMIT = int(os.environ.get('NOTIFICATION_RATE_LIMIT', 3))  # Envios por janela (0 = sem limite)
+NOTIFICATION_RATE_WINDOW = float(os.environ.get('NOTIFICATION_RATE_WINDOW', 600))  # Segundos; o excedente segue num resumo
+NOTIFICATION_THROTTLE_BACKEND = os.environ.get('NOTIFICATION_THROTTLE_BACKEND', 'memory')  # memory ou database
+
+# Novas tentativas (backoff exponencial com jitter) e disjuntor por canal
+NOTIFICATION_MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', 5))  # Depois disto: 'dead' (+ failover)
+NOTIFICATION_RETRY_BASE = float(os.environ.get('NOTIFICATION_RETRY_BASE', 10))  # Segundos até à 2ª tentativa
+NOTIFICATION_RETRY_MAX = float(os.environ.get('NOTIFICATION_RETRY_MAX', 600))  # Limite do intervalo entre tentativas
+NOTIFICATION_BREAKER_THRESHOLD = int(os.environ.get('NOTIFICATION_BREAKER_THRESHOLD', 5))  # Falhas seguidas até abrir
+NOTIFICATION_BREAKER_RESET = float(os.environ.get('NOTIFICATION_BREAKER_RESET', 60))  # Segundos com o circuito aberto
+
+# Nunca retidas pelo limite; failover para SMS mesmo sem notify_via_sms
+CRITICAL_NOTIFICATION_TYPES = ('emergency', 'fall')
+
+# Resultados de envio gravados em lote (segundos; 0 = gravar logo). As críticas são sempre gravadas logo.
+NOTIFICATION_LOG_FLUSH_INTERVAL = float(os.environ.get('NOTIFICATION_LOG_FLUSH_INTERVAL', 2))
+
+# Agendador de lembretes de medicação
+MEDICATION_SCHEDULER_ENABLED = os.environ.get('MEDICATION_SCHEDULER_ENABLED', '1') == '1'
+MEDICATION_SCHEDULER_INTERVAL = float(os.environ.get('MEDICATION_SCHEDULER_INTERVAL', 30))  # Segundos entre ticks
+MEDICATION_SCHEDULER_REFRESH = float(os.environ.get('MEDICATION_SCHEDULER_REFRESH', 60))  # Recolha de novos lembretes
+MEDICATION_REMINDER_GRACE = int(os.environ.get('MEDICATION_REMINDER_GRACE', 5))  # Minutos de tolerância ao planear e ao disparar
+
+# Agendador de lembretes de consultas (Appointment.reminder_hours_before)
+APPOINTMENT_SCHEDULER_ENABLED = os.environ.get('APPOINTMENT_SCHEDULER_ENABLED', '1') == '1'
+APPOINTMENT_SCHEDULER_INTERVAL = float(os.environ.get('APPOINTMENT_SCHEDULER_INTERVAL', 30))  # Segundos entre ticks
+APPOINTMENT_SCHEDULER_REFRESH = float(os.environ.get('APPOINTMENT_SCHEDULER_REFRESH', 300))  # Recolha por intervalo no índice
+
+# Deteção de inatividade (tempo acordado, entre wake_time e sleep_time, sem atividade).
+# Opt-in: só utilizadores com User.inactivity_threshold definido são monitorizados.
+INACTIVITY_DETECTOR_ENABLED = os.environ.get('INACTIVITY_DETECTOR_ENABLED', '0') == '1'
+INACTIVITY_CHECK_INTERVAL = float(os.environ.get('INACTIVITY_CHECK_INTERVAL', 30))  # Segundos entre ticks
+INACTIVITY_REFRESH = float(os.environ.get('INACTIVITY_REFRESH', 60))  # Recolha da atividade gravada por outros workers
+
+# Heartbeats (/api/user/activity): intervalo de escrita em lote (0 = escrever em cada pedido)
+ACTIVITY_FLUSH_INTERVAL = float(os.environ.get('ACTIVITY_FLUSH_INTERVAL', 30))
+ACTIVITY_FLUSH_BATCH = int(os.environ.get('ACTIVITY_FLUSH_BATCH', 500))
+
+# Eventos em tempo real (/api/caregiver/stream)
+SSE_KEEPALIVE = float(os.environ.get('SSE_KEEPALIVE', 15))  # Segundos entre comentários keep-alive
+SSE_QUEUE_SIZE = int(os.environ.get('SSE_QUEUE_SIZE', 100))  # Eventos por ligação antes de a desligar
+SSE_REPLAY_SIZE = int(os.environ.get('SSE_REPLAY_SIZE', 1000))  # Eventos recentes para Last-Event-ID
+ACTIVITY_PUBLISH_INTERVAL = float(os.environ.get('ACTIVITY_PUBLISH_INTERVAL', 60))  # Mínimo entre eventos last_active
+
+# Cache de autenticação (tokens JWT já verificados e dados do utilizador/cuidador)
+AUTH_CACHE_TTL = float(os.environ.get('AUTH_CACHE_TTL', 60))  # Segundos
+AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', 10000))
+RECIPIENT_CACHE_TTL = float(os.environ.get('RECIPIENT_CACHE_TTL', 300))  # Destinatários dos alertas por utilizador
+
+# Limites de pedidos
+PAGE_SIZE_MAX = int(os.environ.get('PAGE_SIZE_MAX', 200))  # Itens por página nos históricos
+HEALTH_BATCH_MAX = int(os.environ.get('HEALTH_BATCH_MAX', 10000))  # Medições por pedido em /batch
+
+# ETags: muda a cada deploy para invalidar respostas com formato antigo
+ETAG_SALT = os.environ.get('RENDER_GIT_COMMIT', '')
+HEALTH_TYPES_MAX_AGE = int(os.environ.get('HEALTH_TYPES_MAX_AGE', 86400))  # Cache do catálogo /api/health/types
+
+# Sincronização incremental (/api/sync)
+SYNC_MAX_CHANGES = int(os.environ.get('SYNC_MAX_CHANGES', 1000))  # Acima disto devolve o estado completo
+SYNC_LOG_DAYS = int(os.environ.get('SYNC_LOG_DAYS', 7))  # Dias de registos de medicação no estado completo
+SYNC_OVERLAP_SECONDS = int(os.environ.get('SYNC_OVERLAP_SECONDS', 60))  # Alterações recentes reenviadas (commits fora de ordem)
+SYNC_RETENTION_DAYS = int(os.environ.get('SYNC_RETENTION_DAYS', 30))  # Tokens mais antigos recebem o estado completo
+SYNC_PRUNE_INTERVAL = int(os.environ.get('SYNC_PRUNE_INTERVAL', 3600))  # Segundos entre limpezas de sync_changes (0 = desligado)
+
+# Observabilidade (/metrics em formato Prometheus, por processo)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # Obrigatório: sem ele /metrics não existe (404)
+REQUEST_LOG = os.environ.get('REQUEST_LOG', 'off')  # off | json (uma linha JSON por pedido no stdout)
+
+# Deteção de N+1 e queries lentas (desenvolvimento): off | log | raise
+QUERY_DEBUG = os.environ.get('QUERY_DEBUG', 'off')
+QUERY_REPEAT_LIMIT = int(os.environ.get('QUERY_REPEAT_LIMIT', 5))  # Execuções da mesma query por pedido
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+
 # Configurar DATABASE_URL
 database_url = os.environ.get('DATABASE_URL', '')
 
@@ -77,6 +222,9 @@ migrate = Migrate(app, db)
 class User(db.Model):
     """Utilizador principal (idoso)"""
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_last_active', 'last_active'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -89,6 +237,10 @@ class User(db.Model):
     wake_time = db.Column(db.Time, default=datetime.strptime('07:00', '%H:%M').time())
     sleep_time = db.Column(db.Time, default=datetime.strptime('22:00', '%H:%M').time())
     language = db.Column(db.String(10), default='pt')
+    inactivity_threshold = db.Column(db.Integer)  # Minutos acordado sem atividade até alertar (null/0 = sem monitorização)
+    inactivity_monitored_since = db.Column(db.DateTime)  # Quando a monitorização foi ligada
+    inactivity_alerted_at = db.Column(db.DateTime)  # Último alerta de inatividade (um por período inativo)
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Sobe a cada alteração sincronizada (ETags)
     
     # Relações
     medications = db.relationship('Medication', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -98,11 +250,12 @@ class User(db.Model):
     mood_logs = db.relationship('MoodLog', backref='user', lazy=True, cascade='all, delete-orphan')
 
     def to_dict(self):
+        last_active = get_last_active(self)
         return {
             'id': self.id,
             'name': self.name,
             'phone': self.phone,
-            'last_active': self.last_active.isoformat() if self.last_active else None,
+            'last_active': last_active.isoformat() if last_active else None,
             'wake_time': self.wake_time.strftime('%H:%M') if self.wake_time else None,
             'sleep_time': self.sleep_time.strftime('%H:%M') if self.sleep_time else None,
         }
@@ -142,6 +295,9 @@ class Caregiver(db.Model):
 class CaregiverUser(db.Model):
     """Relação entre cuidadores e utilizadores"""
     __tablename__ = 'caregiver_users'
+    __table_args__ = (
+        db.Index('ix_caregiver_users_user_id_notify_alerts', 'user_id', 'notify_alerts'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     caregiver_id = db.Column(db.Integer, db.ForeignKey('caregivers.id'), nullable=False)
@@ -155,6 +311,9 @@ class CaregiverUser(db.Model):
 class Medication(db.Model):
     """Medicamentos e horários"""
     __tablename__ = 'medications'
+    __table_args__ = (
+        db.Index('ix_medications_user_id_is_active', 'user_id', 'is_active'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -169,16 +328,18 @@ class Medication(db.Model):
     schedules = db.relationship('MedicationSchedule', backref='medication', lazy=True, cascade='all, delete-orphan')
     logs = db.relationship('MedicationLog', backref='medication', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
-        return {
+    def to_dict(self, include_schedules=True):
+        data = {
             'id': self.id,
             'name': self.name,
             'dosage': self.dosage,
             'instructions': self.instructions,
             'icon': self.icon,
             'is_active': self.is_active,
-            'schedules': [s.to_dict() for s in self.schedules],
         }
+        if include_schedules:
+            data['schedules'] = [s.to_dict() for s in self.schedules]
+        return data
 
 
 class MedicationSchedule(db.Model):
@@ -201,6 +362,9 @@ class MedicationSchedule(db.Model):
 class MedicationLog(db.Model):
     """Registo de medicação tomada"""
     __tablename__ = 'medication_logs'
+    __table_args__ = (
+        db.Index('uq_medication_logs_dose', 'medication_id', 'schedule_id', 'scheduled_time', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     medication_id = db.Column(db.Integer, db.ForeignKey('medications.id'), nullable=False)
@@ -272,6 +436,9 @@ class Activity(db.Model):
 class Alert(db.Model):
     """Alertas e notificações"""
     __tablename__ = 'alerts'
+    __table_args__ = (
+        db.Index('ix_alerts_user_id_created_at', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -296,6 +463,9 @@ class Alert(db.Model):
 class MoodLog(db.Model):
     """Registo de estado emocional"""
     __tablename__ = 'mood_logs'
+    __table_args__ = (
+        db.Index('ix_mood_logs_user_id_created_at', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -317,17 +487,31 @@ class MoodLog(db.Model):
 class ChatMessage(db.Model):
     """Histórico de conversas com o assistente"""
     __tablename__ = 'chat_messages'
+    __table_args__ = (
+        db.Index('ix_chat_messages_user_id_created_at', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     role = db.Column(db.String(20), nullable=False)  # user, assistant
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'role': self.role,
+            'content': self.content,
+            'created_at': self.created_at.isoformat(),
+        }
 
 
 class Appointment(db.Model):
     """Consultas médicas"""
     __tablename__ = 'appointments'
+    __table_args__ = (
+        db.Index('ix_appointments_status_reminder_at', 'status', 'reminder_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -339,11 +523,17 @@ class Appointment(db.Model):
     appointment_time = db.Column(db.Time, nullable=False)
     notes = db.Column(db.Text)
     reminder_hours_before = db.Column(db.Integer, default=24)
+    reminder_at = db.Column(db.DateTime)  # Calculado: data/hora - reminder_hours_before
+    reminder_sent_at = db.Column(db.DateTime)  # Limpo quando data, hora ou antecedência mudam
     status = db.Column(db.String(20), default='scheduled')  # scheduled, completed, cancelled
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     user = db.relationship('User', backref=db.backref('appointments', lazy='dynamic'))
     
+    @property
+    def starts_at(self):
+        return datetime.combine(self.appointment_date, self.appointment_time)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -360,9 +550,23 @@ class Appointment(db.Model):
         }
 
 
+@event.listens_for(Appointment, 'before_insert')
+@event.listens_for(Appointment, 'before_update')
+def _set_appointment_reminder_at(mapper, connection, target):
+    hours = target.reminder_hours_before if target.reminder_hours_before is not None else 24
+    reminder_at = target.starts_at - timedelta(hours=hours)
+    if reminder_at != target.reminder_at:
+        target.reminder_at = reminder_at
+        target.reminder_sent_at = None
+
+
 class HealthReading(db.Model):
     """Medições de saúde (tensão, glicemia, peso, etc.)"""
     __tablename__ = 'health_readings'
+    __table_args__ = (
+        # Uma medição por instante: o lote e os reenvios dos dispositivos contam com isto
+        db.Index('uq_health_readings_user_type_measured_at', 'user_id', 'reading_type', 'measured_at', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -389,6 +593,42 @@ class HealthReading(db.Model):
         }
 
 
+class HealthReadingLatest(db.Model):
+    """Última medição de cada tipo por utilizador (projeção mantida na escrita)"""
+    __tablename__ = 'health_reading_latest'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    reading_type = db.Column(db.String(50), primary_key=True)
+    reading_id = db.Column(db.Integer, db.ForeignKey('health_readings.id'), nullable=False)
+    measured_at = db.Column(db.DateTime, nullable=False)
+
+
+class HealthReadingRollup(db.Model):
+    """Agregados de medições por hora/dia (para gráficos), atualizados na escrita"""
+    __tablename__ = 'health_reading_rollups'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    reading_type = db.Column(db.String(50), primary_key=True)
+    resolution = db.Column(db.String(10), primary_key=True)  # hour, day
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    sum_primary = db.Column(db.Float, nullable=False, default=0)
+    min_primary = db.Column(db.Float)
+    max_primary = db.Column(db.Float)
+    count_secondary = db.Column(db.Integer, nullable=False, default=0)
+    sum_secondary = db.Column(db.Float, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'bucket_start': self.bucket_start.isoformat(),
+            'count': self.count,
+            'average': round(self.sum_primary / self.count, 1) if self.count else None,
+            'min': self.min_primary,
+            'max': self.max_primary,
+            'average_secondary': round(self.sum_secondary / self.count_secondary, 1) if self.count_secondary else None,
+        }
+
+
 class MedicationAlertConfig(db.Model):
     """Configuração de alertas de medicação"""
     __tablename__ = 'medication_alert_configs'
@@ -438,9 +678,61 @@ class MedicationAlertConfig(db.Model):
         }
 
 
+class MedicationReminder(db.Model):
+    """Lembretes de medicação planeados pelo servidor (um por dose e nível de alerta)"""
+    __tablename__ = 'medication_reminders'
+    __table_args__ = (
+        db.UniqueConstraint('schedule_id', 'scheduled_time', 'alert_level', name='uq_medication_reminders_dose_level'),
+        db.Index('ix_medication_reminders_status_fire_at', 'status', 'fire_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    medication_id = db.Column(db.Integer, db.ForeignKey('medications.id'), nullable=False)
+    schedule_id = db.Column(db.Integer, db.ForeignKey('medication_schedules.id'), nullable=False)
+    scheduled_time = db.Column(db.DateTime, nullable=False)
+    alert_level = db.Column(db.String(20), nullable=False)  # first, second, escalation
+    fire_at = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, fired, skipped
+    fired_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'medication_id': self.medication_id,
+            'schedule_id': self.schedule_id,
+            'scheduled_time': self.scheduled_time.isoformat(),
+            'alert_level': self.alert_level,
+            'fire_at': self.fire_at.isoformat(),
+            'status': self.status,
+            'fired_at': self.fired_at.isoformat() if self.fired_at else None,
+        }
+
+
+class SyncChange(db.Model):
+    """Registo de alterações por utilizador (sincronização incremental da PWA)"""
+    __tablename__ = 'sync_changes'
+    __table_args__ = (
+        db.Index('ix_sync_changes_user_id_id', 'user_id', 'id'),
+        # Sem AUTOINCREMENT o SQLite reutiliza ids apagados pela limpeza e os tokens recuam
+        {'sqlite_autoincrement': True},
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)  # Sequência global usada como token de sincronização
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    entity = db.Column(db.String(30), nullable=False)  # medications, schedules, medication_logs, contacts, ...
+    entity_id = db.Column(db.Integer, nullable=False)
+    operation = db.Column(db.String(10), nullable=False)  # upsert, delete
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 class NotificationLog(db.Model):
     """Log de notificações enviadas"""
     __tablename__ = 'notification_logs'
+    __table_args__ = (
+        db.Index('ix_notification_logs_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_notification_logs_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -450,7 +742,10 @@ class NotificationLog(db.Model):
     message = db.Column(db.Text, nullable=False)
     channel = db.Column(db.String(20))  # push, sms, whatsapp, email
     sent_to = db.Column(db.String(200))  # user, caregiver_id, phone_number
-    status = db.Column(db.String(20), default='pending')  # pending, sent, delivered, failed
+    status = db.Column(db.String(20), default='pending')  # pending, sending, retry, sent, delivered, dead
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime)  # Próxima tentativa (retry) ou fim do prazo do envio (sending)
+    last_error = db.Column(db.Text)
     sent_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -463,6 +758,8 @@ class NotificationLog(db.Model):
             'message': self.message,
             'channel': self.channel,
             'status': self.status,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
             'sent_at': self.sent_at.isoformat() if self.sent_at else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
         }
@@ -470,28 +767,149 @@ class NotificationLog(db.Model):
 
 # ==================== AUTENTICAÇÃO ====================
 
+class TTLCache:
+    """Cache LRU limitada, com expiração por entrada (thread-safe)"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            return self._data.pop(key, (None, None))[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# token -> (tipo, id, exp) e (tipo, id) -> valores das colunas
+token_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+principal_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+
+
+def load_principal(principal_type, principal_id):
+    """
+    Obter o utilizador/cuidador autenticado, sem query se estiver em cache
+    
+    A instância devolvida é anexada à sessão atual (merge sem load), pelo que
+    continua a poder ser alterada e gravada normalmente.
+    """
+    model = User if principal_type == 'user' else Caregiver
+    values = principal_cache.get((principal_type, principal_id))
+    
+    if values is None:
+        principal = model.query.get(principal_id)
+        if principal:
+            principal_cache.set((principal_type, principal_id), {
+                attr.key: getattr(principal, attr.key) for attr in model.__mapper__.column_attrs
+            })
+        return principal
+    
+    principal = model(**values)
+    make_transient_to_detached(principal)
+    return db.session.merge(principal, load=False)
+
+
+def authenticate_token(token):
+    """
+    Validar um token JWT e devolver o utilizador/cuidador correspondente
+    
+    Raises:
+        jwt.ExpiredSignatureError, jwt.InvalidTokenError
+    """
+    claims = token_cache.get(token)
+    
+    if claims is None:
+        data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+        claims = ('user' if data.get('type') == 'user' else 'caregiver', data['id'], data.get('exp'))
+        ttl = AUTH_CACHE_TTL
+        if claims[2]:
+            ttl = min(ttl, claims[2] - time.time())
+        token_cache.set(token, claims, ttl)
+    
+    return load_principal(claims[0], claims[1])
+
+
+def invalidate_principal(principal_type, principal_id):
+    """Remover da cache os dados de um utilizador/cuidador"""
+    principal_cache.pop((principal_type, principal_id))
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user(mapper, connection, target):
+    invalidate_principal('user', target.id)
+
+
+@event.listens_for(Caregiver, 'after_update')
+@event.listens_for(Caregiver, 'after_delete')
+def _invalidate_caregiver(mapper, connection, target):
+    invalidate_principal('caregiver', target.id)
+
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
         token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        if not token and request.accept_mimetypes.best == 'text/event-stream':
+            # EventSource não permite enviar cabeçalhos
+            token = request.args.get('access_token', '')
         if not token:
             return jsonify({'error': 'Token em falta'}), 401
+        started = time.perf_counter()
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            if data.get('type') == 'user':
-                current_user = User.query.get(data['id'])
-            else:
-                current_user = Caregiver.query.get(data['id'])
+            current_user = authenticate_token(token)
             if not current_user:
                 return jsonify({'error': 'Utilizador não encontrado'}), 401
         except jwt.ExpiredSignatureError:
             return jsonify({'error': 'Token expirado'}), 401
         except jwt.InvalidTokenError:
             return jsonify({'error': 'Token inválido'}), 401
+        finally:
+            g.auth_ms = (time.perf_counter() - started) * 1000
         return f(current_user, *args, **kwargs)
     return decorated
 
 
+@app.after_request
+def add_server_timing(response):
+    """Expor o tempo do passo de autenticação (Server-Timing)"""
+    auth_ms = g.get('auth_ms')
+    if auth_ms is not None:
+        response.headers.add('Server-Timing', f'auth;dur={auth_ms:.2f}')
+    return response
+
+
 def generate_token(user_id, user_type='user', expires_hours=24*30):
     return jwt.encode({
         'id': user_id,
@@ -500,24 +918,278 @@ def generate_token(user_id, user_type='user', expires_hours=24*30):
     }, app.config['SECRET_KEY'], algorithm='HS256')
 
 
-# ==================== SERVIÇO DE NOTIFICAÇÕES WHATSAPP ====================
+# ==================== MÉTRICAS ====================
 
-def send_whatsapp_message(to_phone, message, user_id=None):
+class Metric:
+    """Métrica em memória deste processo, exposta em formato Prometheus"""
+    
+    type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        metrics_registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self):
+        """Lista de (sufixo, labels, valor)"""
+        with self._lock:
+            return [('', dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += 1
+            state[2] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        result = []
+        for key, counts, count, total in values:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                result.append(('_bucket', dict(labels, le=repr(float(bound))), cumulative))
+            result.append(('_bucket', dict(labels, le='+Inf'), count))
+            result.append(('_sum', labels, total))
+            result.append(('_count', labels, count))
+        return result
+
+
+class Gauge(Metric):
+    """Valor lido no momento da recolha: callback devolve um número ou {labels: valor}"""
+    
+    type = 'gauge'
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def samples(self):
+        value = self.callback()
+        if not isinstance(value, dict):
+            return [('', {}, value)]
+        return [('', dict(zip(self.labelnames, key if isinstance(key, tuple) else (key,))), v)
+                for key, v in value.items()]
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in labels.items()) + '}'
+
+
+def render_metrics():
+    """Todas as métricas no formato de texto do Prometheus (0.0.4)"""
+    lines = []
+    for metric in metrics_registry:
+        try:
+            samples = metric.samples()
+        except Exception as e:
+            print(f"Erro ao recolher a métrica {metric.name}: {e}")
+            continue
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for suffix, labels, value in samples:
+            lines.append(f'{metric.name}{suffix}{_format_labels(labels)} {float(value)!r}')
+    return '\n'.join(lines) + '\n'
+
+
+metrics_registry = []
+
+http_request_duration = Histogram(
+    'seniorcare_http_request_duration_seconds', 'Duração dos pedidos HTTP',
+    ('method', 'route', 'status'))
+http_request_queries = Histogram(
+    'seniorcare_http_request_db_queries', 'Queries SQL por pedido HTTP',
+    ('method', 'route'), buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
+http_request_db_duration = Histogram(
+    'seniorcare_http_request_db_seconds', 'Tempo em SQL por pedido HTTP',
+    ('method', 'route'))
+db_queries = Counter('seniorcare_db_queries_total', 'Queries SQL executadas (pedidos e serviços em background)')
+db_query_duration = Counter('seniorcare_db_query_seconds_total', 'Tempo total em queries SQL')
+twilio_request_duration = Histogram(
+    'seniorcare_twilio_request_duration_seconds', 'Duração das chamadas ao Twilio', ('channel',))
+twilio_errors = Counter('seniorcare_twilio_errors_total', 'Chamadas ao Twilio falhadas', ('channel', 'status'))
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started
+    db_queries.inc()
+    db_query_duration.inc(elapsed)
+    if has_request_context():
+        g.db_queries = g.get('db_queries', 0) + 1
+        g.db_seconds = g.get('db_seconds', 0.0) + elapsed
+        if QUERY_DEBUG != 'off':
+            check_query(statement, elapsed)
+
+
+_QUERY_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%\(\w+\)s|%s")
+_QUERY_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+
+
+def query_fingerprint(statement):
+    """SQL normalizado: literais e parâmetros como ?, listas IN como (...)"""
+    statement = _QUERY_LITERALS.sub('?', ' '.join(statement.split()))
+    return _QUERY_LISTS.sub('(...)', statement)
+
+
+def query_call_site():
+    """Última linha deste ficheiro na pilha fora da instrumentação (quem fez a query)"""
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename == __file__ and frame.name not in ('query_call_site', 'check_query', '_record_query'):
+            return f'{frame.name}:{frame.lineno}'
+    return '?'
+
+
+def short_sql(fingerprint, limit=300):
+    """Fingerprint para logs, sem a lista de colunas do SELECT"""
+    return re.sub(r'^SELECT .+? FROM ', 'SELECT … FROM ', fingerprint)[:limit]
+
+
+def check_query(statement, elapsed):
     """
-    Enviar mensagem WhatsApp via Twilio
+    QUERY_DEBUG: avisar (log) ou falhar (raise, RuntimeError) quando a mesma
+    query corre mais de QUERY_REPEAT_LIMIT vezes num pedido (N+1) ou demora
+    mais de SLOW_QUERY_MS
+    """
+    problems = []
+    if elapsed * 1000 > SLOW_QUERY_MS:
+        problems.append(f'Query lenta ({elapsed * 1000:.1f} ms)')
     
-    Args:
-        to_phone: Número de telefone (com código do país, ex: +351912345678)
-        message: Texto da mensagem
-        user_id: ID do utilizador (para logging)
+    fingerprint = query_fingerprint(statement)
+    counts = g.setdefault('query_fingerprints', {})
+    counts[fingerprint] = counts.get(fingerprint, 0) + 1
+    if counts[fingerprint] == QUERY_REPEAT_LIMIT + 1:
+        problems.append(f'Query repetida mais de {QUERY_REPEAT_LIMIT}x (N+1?)')
+    
+    for problem in problems:
+        message = f'{problem} em {request.method} {request.path} ({query_call_site()}): {short_sql(fingerprint)}'
+        if QUERY_DEBUG == 'raise':
+            raise RuntimeError(message)
+        print(message)
+
+
+def query_report():
+    """Queries repetidas no pedido atual: {fingerprint: execuções}, acima de QUERY_REPEAT_LIMIT"""
+    counts = g.get('query_fingerprints', {})
+    return {fingerprint: count for fingerprint, count in counts.items() if count > QUERY_REPEAT_LIMIT}
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Latência e SQL por rota (histogramas, Server-Timing e log JSON opcional)"""
+    started = g.get('request_started')
+    if started is None:
+        return response
+    duration = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    queries = g.get('db_queries', 0)
+    db_seconds = g.get('db_seconds', 0.0)
+    
+    http_request_duration.observe(duration, method=request.method, route=route, status=response.status_code)
+    http_request_queries.observe(queries, method=request.method, route=route)
+    http_request_db_duration.observe(db_seconds, method=request.method, route=route)
+    response.headers.add('Server-Timing', f'db;dur={db_seconds * 1000:.2f};desc="{queries} queries"')
+    if QUERY_DEBUG != 'off':
+        for fingerprint, count in query_report().items():
+            print(f'{request.method} {route}: {count}x {short_sql(fingerprint)}')
+    
+    if REQUEST_LOG == 'json':
+        print(json.dumps({
+            'ts': datetime.utcnow().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'route': route,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'db_queries': queries,
+            'db_ms': round(db_seconds * 1000, 2),
+            'auth_ms': round(g.auth_ms, 2) if g.get('auth_ms') is not None else None,
+        }), flush=True)
+    return response
+
+
+def metrics_token_required(f):
+    """Rotas operacionais: exigem Authorization: Bearer METRICS_TOKEN (404 se não estiver definido)"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not METRICS_TOKEN:
+            return jsonify({'error': 'Não encontrado'}), 404
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        if not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+            return jsonify({'error': 'Não autorizado'}), 401
+        return f(*args, **kwargs)
+    return decorated
+
+
+def observe_twilio(channel, started, error=None):
+    """Registar a duração (e o erro) de uma chamada ao Twilio"""
+    twilio_request_duration.observe(time.perf_counter() - started, channel=channel)
+    if error is not None:
+        twilio_errors.inc(channel=channel, status=getattr(error, 'status', None) or 'error')
+
+
+# ==================== SERVIÇO DE NOTIFICAÇÕES WHATSAPP ====================
+
+def deliver_whatsapp(to_phone, message):
+    """
+    Entregar uma mensagem WhatsApp ao Twilio (sem registo em NotificationLog)
     
     Returns:
         dict: {'success': bool, 'message_sid': str ou None, 'error': str ou None}
     """
     if not twilio_client:
         print(f"WhatsApp não configurado. Mensagem não enviada: {message}")
-        return {'success': False, 'error': 'Twilio não configurado'}
+        return {'success': False, 'error': 'Twilio não configurado', 'retryable': False}
     
+    started = time.perf_counter()
     try:
         # Formatar número para WhatsApp
         whatsapp_to = f"whatsapp:{to_phone}" if not to_phone.startswith('whatsapp:') else to_phone
@@ -529,196 +1201,2081 @@ def send_whatsapp_message(to_phone, message, user_id=None):
             to=whatsapp_to
         )
         
-        # Registar no log de notificações
-        if user_id:
-            try:
-                log = NotificationLog(
-                    user_id=user_id,
-                    notification_type='whatsapp',
-                    message=message,
-                    channel='whatsapp',
-                    sent_to=to_phone,
-                    status='sent',
-                    sent_at=datetime.utcnow()
-                )
-                db.session.add(log)
-                db.session.commit()
-            except Exception as e:
-                print(f"Erro ao registar log: {e}")
-        
+        observe_twilio('whatsapp', started)
         print(f"WhatsApp enviado para {to_phone}: {twilio_message.sid}")
         return {'success': True, 'message_sid': twilio_message.sid}
         
     except Exception as e:
+        observe_twilio('whatsapp', started, e)
         print(f"Erro ao enviar WhatsApp para {to_phone}: {e}")
-        
-        # Registar falha
-        if user_id:
-            try:
-                log = NotificationLog(
-                    user_id=user_id,
-                    notification_type='whatsapp',
-                    message=message,
-                    channel='whatsapp',
-                    sent_to=to_phone,
-                    status='failed',
-                )
-                db.session.add(log)
-                db.session.commit()
-            except:
-                pass
-        
-        return {'success': False, 'error': str(e)}
+        return {'success': False, 'error': str(e), 'retryable': is_retryable_error(e)}
 
 
-def notify_caregivers(user_id, notification_type, message):
+def deliver_sms(to_phone, message):
     """
-    Notificar todos os cuidadores de um utilizador
-    
-    Args:
-        user_id: ID do utilizador (idoso)
-        notification_type: 'medication_missed', 'emergency', 'appointment_reminder', etc.
-        message: Texto da notificação
+    Entregar uma mensagem SMS ao Twilio (failover do WhatsApp)
     
     Returns:
-        list: Lista de resultados de envio
+        dict: {'success': bool, 'message_sid': str ou None, 'error': str ou None}
     """
-    results = []
-    
-    # Obter cuidadores do utilizador
-    caregiver_users = CaregiverUser.query.filter_by(
-        user_id=user_id,
-        notify_alerts=True
-    ).all()
-    
-    for cu in caregiver_users:
-        caregiver = Caregiver.query.get(cu.caregiver_id)
-        if caregiver and caregiver.phone:
-            result = send_whatsapp_message(
-                to_phone=caregiver.phone,
-                message=message,
-                user_id=user_id
-            )
-            results.append({
-                'caregiver_id': caregiver.id,
-                'caregiver_name': caregiver.name,
-                **result
-            })
+    if not twilio_client or not TWILIO_SMS_FROM:
+        return {'success': False, 'error': 'SMS não configurado', 'retryable': False}
     
-    # Se não houver cuidadores registados, tentar contactos de emergência
-    if not results:
-        contacts = Contact.query.filter_by(
-            user_id=user_id,
-            is_emergency=True
-        ).all()
-        
-        for contact in contacts:
-            if contact.phone:
-                result = send_whatsapp_message(
-                    to_phone=contact.phone,
-                    message=message,
-                    user_id=user_id
-                )
-                results.append({
-                    'contact_id': contact.id,
-                    'contact_name': contact.name,
-                    **result
-                })
+    started = time.perf_counter()
+    try:
+        twilio_message = twilio_client.messages.create(
+            body=message,
+            from_=TWILIO_SMS_FROM,
+            to=to_phone.replace('whatsapp:', '')
+        )
+        observe_twilio('sms', started)
+        print(f"SMS enviado para {to_phone}: {twilio_message.sid}")
+        return {'success': True, 'message_sid': twilio_message.sid}
     
-    return results
+    except Exception as e:
+        observe_twilio('sms', started, e)
+        print(f"Erro ao enviar SMS para {to_phone}: {e}")
+        return {'success': False, 'error': str(e), 'retryable': is_retryable_error(e)}
 
 
-def send_medication_reminder(user_id, medication_name, scheduled_time, alert_level='first'):
+def is_retryable_error(error):
+    """Erros 4xx do Twilio (ex: número inválido) não melhoram com nova tentativa, exceto 429"""
+    status = getattr(error, 'status', None)
+    return not (isinstance(status, int) and 400 <= status < 500 and status != 429)
+
+
+# canal -> função de envio
+CHANNEL_SENDERS = {
+    'whatsapp': deliver_whatsapp,
+    'sms': deliver_sms,
+}
+
+
+def send_whatsapp_message(to_phone, message, user_id=None):
     """
-    Enviar lembrete de medicação
+    Enviar mensagem WhatsApp via Twilio (bloqueante, no próprio pedido)
     
     Args:
-        user_id: ID do utilizador
-        medication_name: Nome do medicamento
-        scheduled_time: Hora agendada
-        alert_level: 'first', 'second', 'escalation'
-    """
-    user = User.query.get(user_id)
-    if not user:
-        return
-    
-    # Obter configuração de alertas
-    config = MedicationAlertConfig.query.filter_by(
-        user_id=user_id,
-        medication_id=None
-    ).first()
-    
-    if not config or not config.is_active:
-        return
+        to_phone: Número de telefone (com código do país, ex: +351912345678)
+        message: Texto da mensagem
+        user_id: ID do utilizador (para logging)
     
-    # Mensagens por nível
-    if alert_level == 'first':
-        message = f"⏰ Lembrete: {user.name}, está na hora de tomar {medication_name} (agendado para {scheduled_time})."
-    elif alert_level == 'second':
-        message = f"⚠️ Segundo aviso: {user.name} ainda não tomou {medication_name}. Por favor, tome a medicação."
-    else:  # escalation
-        message = f"🚨 ALERTA: {user.name} não tomou a medicação {medication_name} (agendada para {scheduled_time}). Verifique se está tudo bem."
+    Returns:
+        dict: {'success': bool, 'message_sid': str ou None, 'error': str ou None}
+    """
+    started = time.perf_counter()
+    result = notification_dispatcher.deliver('whatsapp', to_phone, message)
+    if not twilio_client:
+        return result
     
-    # Para o utilizador (se tiver telefone)
-    if user.phone and config.notify_via_whatsapp:
-        send_whatsapp_message(user.phone, message, user_id)
+    # Registar no log de notificações (fora da sessão do pedido; uma falha fica para nova tentativa)
+    if user_id:
+        try:
+            log = NotificationLog(
+                user_id=user_id,
+                notification_type='whatsapp',
+                message=message,
+                channel='whatsapp',
+                sent_to=to_phone,
+                status='sending',
+                next_attempt_at=datetime.utcnow() + timedelta(seconds=notification_dispatcher.lease),
+            )
+            notification_writer.insert([log])
+            failover = notification_dispatcher.record(log, result, time.perf_counter() - started)
+            if failover:
+                notification_dispatcher.submit([failover.id])
+        except Exception as e:
+            print(f"Erro ao registar log: {e}")
     
-    # Para cuidadores (apenas na escalação ou se configurado)
-    if alert_level == 'escalation' and config.notify_caregivers:
-        notify_caregivers(user_id, 'medication_missed', message)
+    return result
 
 
-def send_emergency_alert(user_id, alert_type='emergency', custom_message=None):
+# ==================== LIMITE DE NOTIFICAÇÕES ====================
+
+class NotificationThrottle:
     """
-    Enviar alerta de emergência para todos os cuidadores
-    
-    Args:
-        user_id: ID do utilizador
-        alert_type: 'emergency', 'fall', 'inactivity'
-        custom_message: Mensagem personalizada (opcional)
+    Deduplicação e limite de envios por utilizador e (destinatário, tipo,
+    referência): um cuidador ligado a vários utilizadores tem um limite e um
+    resumo por utilizador, nos dois backends.
+    
+    Numa janela deslizante por chave: uma mensagem idêntica a outra enviada
+    há menos de dedup_window segundos é descartada; acima de rate_limit
+    envios em rate_window segundos a mensagem fica retida e as retidas seguem
+    depois num único resumo (due_digests). Emergências e quedas seguem
+    sempre, mesmo repetidas (um segundo pedido de ajuda é um pedido novo).
+    O histórico de envios vem da memória do processo (chaves sem envios na
+    janela são removidas) ou, com backend='database', de notification_logs
+    (partilhado entre workers; as mensagens retidas ficam sempre em memória).
     """
-    user = User.query.get(user_id)
-    if not user:
-        return []
-    
-    # Mensagens por tipo
-    messages = {
-        'emergency': f"🚨 EMERGÊNCIA: {user.name} ativou o botão de emergência! Por favor, contacte-o imediatamente.",
-        'fall': f"⚠️ ALERTA DE QUEDA: Foi detetada uma possível queda de {user.name}. Verifique se está bem.",
-        'inactivity': f"⚠️ INATIVIDADE: {user.name} não interage com a app há algum tempo. Pode verificar se está tudo bem?",
-    }
-    
-    message = custom_message or messages.get(alert_type, messages['emergency'])
+
+    def __init__(self, backend=NOTIFICATION_THROTTLE_BACKEND, dedup_window=NOTIFICATION_DEDUP_WINDOW,
+                 rate_limit=NOTIFICATION_RATE_LIMIT, rate_window=NOTIFICATION_RATE_WINDOW, clock=datetime.utcnow,
+                 always_send=CRITICAL_NOTIFICATION_TYPES):
+        self.backend = backend
+        self.dedup_window = timedelta(seconds=dedup_window)
+        self.rate_limit = rate_limit
+        self.rate_window = timedelta(seconds=rate_window)
+        self.clock = clock
+        self.always_send = set(always_send)
+        self.counts = {'send': 0, 'duplicate': 0, 'held': 0, 'digests': 0}
+        self._sent = {}
+        self._held = {}
+        self._pruned_at = clock()
+        self._lock = threading.Lock()
+
+    @property
+    def window(self):
+        return max(self.dedup_window, self.rate_window)
+
+    def _history(self, user_id, key, now):
+        """Envios da chave dentro da maior das janelas: [(quando, mensagem)]"""
+        since = now - self.window
+        if self.backend == 'database':
+            sent_to, notification_type, reference_type, reference_id = key
+            return NotificationLog.query.with_entities(
+                NotificationLog.created_at, NotificationLog.message
+            ).filter(
+                NotificationLog.user_id == user_id,
+                NotificationLog.created_at >= since,
+                NotificationLog.sent_to == sent_to,
+                NotificationLog.notification_type == notification_type,
+                NotificationLog.reference_type == reference_type,
+                NotificationLog.reference_id == reference_id,
+                NotificationLog.status != 'dead',
+            ).all()
+        
+        history = self._sent.get((user_id, key))
+        if not history:
+            return []
+        while history and history[0][0] < since:
+            history.popleft()
+        if not history:
+            del self._sent[(user_id, key)]
+        return list(history)
+
+    def _prune(self, now):
+        """Remover as chaves sem envios na janela (no máximo uma passagem por janela)"""
+        if now - self._pruned_at < self.window:
+            return
+        self._pruned_at = now
+        since = now - self.window
+        for key in [key for key, history in self._sent.items() if not history or history[-1][0] < since]:
+            del self._sent[key]
+
+    def _record(self, user_id, key, message, now):
+        if self.backend != 'database':
+            self._sent.setdefault((user_id, key), deque()).append((now, message))
+
+    def _over_limit(self, history, now):
+        if not self.rate_limit:
+            return False
+        return sum(1 for when, _ in history if when >= now - self.rate_window) >= self.rate_limit
+
+    def check(self, user_id, key, message):
+        """
+        Decidir o destino de uma mensagem
+        
+        Returns:
+            str: 'send', 'duplicate' (descartada) ou 'held' (vai no próximo resumo)
+        """
+        now = self.clock()
+        with self._lock:
+            self._prune(now)
+            if key[1] in self.always_send:
+                self._record(user_id, key, message, now)
+                self.counts['send'] += 1
+                return 'send'
+            
+            history = self._history(user_id, key, now)
+            held = self._held.get((user_id, key))
+            
+            if any(m == message and when >= now - self.dedup_window for when, m in history) or \
+                    (held and message in held):
+                decision = 'duplicate'
+            elif held or self._over_limit(history, now):
+                self._held.setdefault((user_id, key), []).append(message)
+                decision = 'held'
+            else:
+                self._record(user_id, key, message, now)
+                decision = 'send'
+            self.counts[decision] += 1
+        return decision
+
+    def due_digests(self):
+        """
+        Resumos cuja chave já voltou a ter envios disponíveis
+        
+        Returns:
+            list: [(user_id, key, mensagem)], já registados como enviados
+        """
+        now = self.clock()
+        due = []
+        with self._lock:
+            for (user_id, key), messages in list(self._held.items()):
+                history = self._history(user_id, key, now)
+                if self._over_limit(history, now):
+                    continue
+                del self._held[(user_id, key)]
+                digest = format_digest(messages)
+                self._record(user_id, key, digest, now)
+                self.counts['digests'] += 1
+                due.append((user_id, key, digest))
+        return due
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, holding=sum(len(messages) for messages in self._held.values()))
+
+
+def format_digest(messages, limit=5):
+    """Juntar várias notificações retidas numa só mensagem"""
+    if len(messages) == 1:
+        return messages[0]
+    lines = [f"📋 Resumo: {len(messages)} notificações"]
+    lines += [f"• {message}" for message in messages[:limit]]
+    if len(messages) > limit:
+        lines.append(f"… e mais {len(messages) - limit}")
+    return '\n'.join(lines)
+
+
+notification_throttle = NotificationThrottle()
+
+
+# ==================== FILA DE NOTIFICAÇÕES ====================
+
+class CircuitBreaker:
+    """
+    Disjuntor de um canal de envio (thread-safe).
+    
+    Após failure_threshold falhas seguidas abre durante reset_timeout
+    segundos; depois deixa passar tentativas e volta a fechar no primeiro
+    sucesso (uma nova falha reabre-o logo).
+    """
+
+    def __init__(self, failure_threshold=NOTIFICATION_BREAKER_THRESHOLD,
+                 reset_timeout=NOTIFICATION_BREAKER_RESET, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            return 'open' if self.clock() < self._opened_at + self.reset_timeout else 'half_open'
+
+    def allow(self):
+        return self.state != 'open'
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self._opened_at = self.clock()
+
+
+def retry_delay(attempts):
+    """Segundos até à próxima tentativa: backoff exponencial com jitter (metade fixa, metade aleatória)"""
+    delay = min(NOTIFICATION_RETRY_MAX, NOTIFICATION_RETRY_BASE * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class NotificationLogWriter:
+    """
+    Escrita de NotificationLog fora da sessão do pedido.
+    
+    insert() grava logo, numa transação própria e num único INSERT por
+    fan-out: uma notificação nunca fica só em memória. Os resultados dos
+    envios (update) ficam em buffer e são gravados em lote por flush(),
+    a cada flush_interval segundos ou no fim de um fan-out. Se o processo
+    morrer antes do flush, a linha continua 'sending' e volta a ser enviada
+    quando o prazo expirar; resultados de notificações críticas são
+    gravados de imediato.
+    """
+
+    INSERT_FIELDS = ('user_id', 'notification_type', 'reference_type', 'reference_id', 'message',
+                     'channel', 'sent_to', 'status', 'attempts', 'next_attempt_at', 'created_at')
+    UPDATE_FIELDS = ('status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at')
+
+    def __init__(self, flush_interval=NOTIFICATION_LOG_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.flush_count = 0
+        self.rows_written = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def __len__(self):
+        """Resultados de envio por gravar"""
+        with self._lock:
+            return len(self._pending)
+
+    def insert(self, logs):
+        """Gravar notificações novas (objetos NotificationLog transientes); atribui log.id"""
+        if not logs:
+            return []
+        now = datetime.utcnow()
+        for log in logs:
+            log.status = log.status or 'pending'
+            log.attempts = log.attempts or 0
+            log.created_at = log.created_at or now
+        
+        table = NotificationLog.__table__
+        with db.engine.begin() as connection:
+            ids = connection.execute(
+                table.insert().returning(table.c.id, sort_by_parameter_order=True),
+                [{field: getattr(log, field) for field in self.INSERT_FIELDS} for log in logs]
+            ).scalars().all()
+        
+        for log, notification_id in zip(logs, ids):
+            log.id = notification_id
+        return ids
+
+    def update(self, log, immediate=False):
+        """Registar o estado atual de uma notificação (gravado no próximo flush)"""
+        with self._lock:
+            self._pending[log.id] = {field: getattr(log, field) for field in self.UPDATE_FIELDS}
+        if immediate or self.flush_interval <= 0:
+            self.flush()
+
+    def flush(self):
+        """
+        Gravar os resultados em buffer (um UPDATE executemany)
+        
+        Returns:
+            int: Número de notificações gravadas
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        
+        table = NotificationLog.__table__
+        statement = table.update().where(table.c.id == db.bindparam('_id')).values(
+            {field: db.bindparam(field) for field in self.UPDATE_FIELDS}
+        )
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(statement, [dict(values, _id=notification_id) for notification_id, values in pending.items()])
+        except Exception as e:
+            print(f"Erro ao gravar resultados de notificações: {e}")
+            # Devolver ao buffer sem sobrepor estados mais recentes
+            with self._lock:
+                for notification_id, values in pending.items():
+                    self._pending.setdefault(notification_id, values)
+            return 0
+        
+        self.flush_count += 1
+        self.rows_written += len(pending)
+        return len(pending)
+
+    def start(self):
+        """Arrancar a thread de escrita periódica (idempotente)"""
+        with self._lock:
+            if self._thread or self.flush_interval <= 0:
+                return
+            self._thread = threading.Thread(target=self._run, name='notification-log-flush', daemon=True)
+            self._thread.start()
+        atexit.register(self._flush_in_context)
+
+    def _flush_in_context(self):
+        try:
+            with app.app_context():
+                self.flush()
+        except Exception as e:
+            print(f"Erro ao gravar resultados de notificações: {e}")
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self._flush_in_context()
+
+
+notification_writer = NotificationLogWriter()
+
+
+class NotificationDispatcher:
+    """
+    Envio assíncrono das notificações pendentes em NotificationLog.
+    
+    Os pedidos HTTP apenas inserem linhas com status 'pending'; um pool de
+    threads envia-as em paralelo. Cada linha é reclamada com um UPDATE
+    condicional (-> sending, com prazo em next_attempt_at), pelo que vários
+    workers gunicorn podem partilhar a mesma fila sem envios duplicados.
+    
+    Um envio falhado volta a 'retry' com backoff exponencial; esgotadas as
+    tentativas passa a 'dead' (dead-letter) e, se permitido, é copiado para
+    SMS. Um poller periódico recolhe as linhas pendentes, as tentativas que
+    já chegaram à hora e os envios cujo prazo expirou (ex: reinício do
+    processo a meio de um envio).
+    """
+
+    def __init__(self, workers=NOTIFICATION_WORKERS, poll_interval=NOTIFICATION_POLL_INTERVAL, clock=datetime.utcnow):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.lease = max(60, NOTIFICATION_SEND_TIMEOUT * 3)
+        self.breakers = {channel: CircuitBreaker() for channel in CHANNEL_SENDERS}
+        self.sent_count = 0
+        self.failed_count = 0
+        self.dead_count = 0
+        self._latencies = deque(maxlen=1000)
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._executor = None
+        self._poller = None
+        # Envios do modo async; um envio que exceda o tempo limite não bloqueia o pedido
+        self._inline_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='notifications-inline')
+
+    def start(self):
+        """Arrancar o pool e o poller (idempotente)"""
+        with self._lock:
+            if self._executor:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='notifications')
+            self._poller = threading.Thread(target=self._poll_loop, name='notifications-poller', daemon=True)
+            self._poller.start()
+
+    def submit(self, notification_ids):
+        """Agendar o envio de notificações já gravadas como pendentes"""
+        if NOTIFICATION_MODE == 'sync':
+            for notification_id in notification_ids:
+                self.process(notification_id)
+            notification_writer.flush()
+            return
+        if NOTIFICATION_MODE == 'async':
+            self.process_concurrently(notification_ids)
+            return
+        
+        self.enqueue(notification_ids)
+
+    def enqueue(self, notification_ids):
+        """Entregar notificações ao pool de envio (modo queue)"""
+        self.start()
+        for notification_id in notification_ids:
+            with self._lock:
+                if notification_id in self._queued:
+                    continue
+                self._queued.add(notification_id)
+            self._executor.submit(self._run, notification_id)
+
+    @staticmethod
+    def due(now):
+        """Filtro das notificações a enviar agora (pendentes, tentativas na hora, prazos expirados)"""
+        return db.and_(
+            NotificationLog.status.in_(('pending', 'retry', 'sending')),
+            db.or_(NotificationLog.next_attempt_at.is_(None), NotificationLog.next_attempt_at <= now)
+        )
+
+    def claim_many(self, notification_ids):
+        """
+        Reclamar notificações a enviar (-> sending) num único UPDATE, numa transação própria
+        
+        Returns:
+            list: cópias transientes (fora da sessão) das que estavam disponíveis
+        """
+        now = self.clock()
+        table = NotificationLog.__table__
+        with db.engine.begin() as connection:
+            rows = connection.execute(
+                table.update().where(table.c.id.in_(notification_ids), self.due(now)).values(
+                    status='sending',
+                    next_attempt_at=now + timedelta(seconds=self.lease),
+                ).returning(*table.c)
+            ).all()
+        return sorted((NotificationLog(**row._mapping) for row in rows), key=lambda log: log.id)
+
+    def claim(self, notification_id):
+        """Reclamar uma notificação a enviar; None se não estiver disponível"""
+        claimed = self.claim_many([notification_id])
+        return claimed[0] if claimed else None
+
+    def deliver(self, channel, to_phone, message):
+        """Enviar por um canal, respeitando o disjuntor desse canal"""
+        sender = CHANNEL_SENDERS.get(channel)
+        if not sender:
+            return {'success': False, 'error': f'Canal não suportado: {channel}', 'retryable': False}
+        
+        breaker = self.breakers[channel]
+        if not breaker.allow():
+            return {'success': False, 'error': f'Canal {channel} indisponível (circuito aberto)', 'circuit_open': True}
+        
+        result = sender(to_phone, message)
+        if result['success']:
+            breaker.success()
+        elif result.get('retryable', True):
+            breaker.failure()
+        return result
+
+    def record(self, log, result, latency):
+        """
+        Guardar o resultado de um envio (via notification_writer)
+        
+        Returns:
+            NotificationLog: cópia noutro canal, já gravada, a submeter; ou None
+        """
+        now = self.clock()
+        critical = log.notification_type in CRITICAL_NOTIFICATION_TYPES
+        with self._lock:
+            self._latencies.append(latency)
+            if result['success']:
+                self.sent_count += 1
+            else:
+                self.failed_count += 1
+        
+        if result['success']:
+            log.status = 'sent'
+            log.sent_at = now
+            log.next_attempt_at = None
+            log.last_error = None
+            notification_writer.update(log, immediate=critical)
+            return None
+        
+        log.attempts = (log.attempts or 0) + 1
+        log.last_error = result.get('error')
+        
+        # Emergências não esperam que o circuito feche: passam logo para o outro canal
+        if result.get('retryable', True) and log.attempts < NOTIFICATION_MAX_ATTEMPTS and \
+                not (critical and result.get('circuit_open')):
+            log.status = 'retry'
+            log.next_attempt_at = now + timedelta(seconds=retry_delay(log.attempts))
+            notification_writer.update(log, immediate=critical)
+            return None
+        
+        log.status = 'dead'
+        log.next_attempt_at = None
+        notification_writer.update(log, immediate=critical)
+        with self._lock:
+            self.dead_count += 1
+        print(f"Notificação {log.id} sem entrega após {log.attempts} tentativa(s): {log.last_error}")
+        return self.failover(log)
+
+    def failover(self, log):
+        """Copiar uma notificação esgotada para o canal alternativo (WhatsApp -> SMS), se permitido"""
+        if log.channel != 'whatsapp' or not TWILIO_SMS_FROM:
+            return None
+        
+        if log.notification_type not in CRITICAL_NOTIFICATION_TYPES:
+            config = MedicationAlertConfig.query.filter_by(
+                user_id=log.user_id,
+                medication_id=None
+            ).first()
+            if not config or not config.notify_via_sms:
+                return None
+        
+        copy = NotificationLog(
+            user_id=log.user_id,
+            notification_type=log.notification_type,
+            reference_type='notification',
+            reference_id=log.id,
+            message=log.message,
+            channel='sms',
+            sent_to=log.sent_to.replace('whatsapp:', ''),
+            status='pending',
+        )
+        notification_writer.insert([copy])
+        return copy
+
+    def process(self, notification_id):
+        """
+        Reclamar e enviar uma notificação pendente
+        
+        Returns:
+            str: estado final ('sent', 'retry' ou 'dead') ou None se já foi reclamada
+        """
+        log = self.claim(notification_id)
+        if not log:
+            return None
+        
+        started = time.perf_counter()
+        result = self.deliver(log.channel or 'whatsapp', log.sent_to, log.message)
+        failover = self.record(log, result, time.perf_counter() - started)
+        
+        if failover:
+            self.submit([failover.id])
+        return log.status
+
+    def process_concurrently(self, notification_ids):
+        """
+        Enviar várias notificações no próprio pedido, em paralelo (asyncio.gather)
+        
+        O pedido espera no máximo NOTIFICATION_SEND_TIMEOUT segundos por
+        envio. Um envio que exceda esse tempo continua na sua thread e pode
+        ainda ser entregue, pelo que a linha fica 'sending' (sob o prazo
+        self.lease, maior que o timeout HTTP do Twilio) e o resultado real é
+        gravado quando o envio terminar; só então pode haver nova tentativa.
+        A BD só é usada nesta thread, antes e depois dos envios (um único
+        UPDATE em lote com os resultados).
+        
+        Returns:
+            list: estado final de cada notificação reclamada ('sending' se ainda em curso)
+        """
+        logs = self.claim_many(notification_ids)
+        if not logs:
+            return []
+        
+        started = time.perf_counter()
+        results = asyncio.run(self._deliver_all([
+            (log.channel or 'whatsapp', log.sent_to, log.message) for log in logs
+        ]))
+        failovers = []
+        for log, (result, latency, future) in zip(logs, results):
+            if result is None:
+                future.add_done_callback(partial(self._record_late, log, started))
+                continue
+            failovers.append(self.record(log, result, latency))
+        notification_writer.flush()
+        
+        failovers = [log.id for log in failovers if log]
+        if failovers:
+            self.submit(failovers)
+        return [log.status for log in logs]
+
+    async def _deliver_all(self, messages):
+        loop = asyncio.get_running_loop()
+        
+        async def deliver(channel, to_phone, message):
+            started = time.perf_counter()
+            future = self._inline_executor.submit(self.deliver, channel, to_phone, message)
+            try:
+                # shield: o timeout não cancela o envio, só deixa de esperar por ele
+                result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future, loop=loop)), NOTIFICATION_SEND_TIMEOUT)
+            except asyncio.TimeoutError:
+                if future.cancel():
+                    # Ainda não tinha começado: nada foi enviado, pode ser repetido
+                    result = {'success': False, 'error': 'Tempo limite excedido'}
+                else:
+                    print(f"Tempo limite excedido ao enviar para {to_phone}; resultado gravado quando o envio terminar")
+                    result = None
+            return result, time.perf_counter() - started, future
+        
+        return await asyncio.gather(*(deliver(*item) for item in messages))
+
+    def _record_late(self, log, started, future):
+        """Gravar o resultado de um envio que terminou depois do tempo limite do pedido"""
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        try:
+            with app.app_context():
+                failover = self.record(log, result, time.perf_counter() - started)
+                notification_writer.flush()
+        except Exception as e:
+            print(f"Erro ao gravar notificação {log.id}: {e}")
+            return
+        if failover:
+            self.enqueue([failover.id])
+
+    def due_ids(self, limit):
+        return [row.id for row in NotificationLog.query.with_entities(NotificationLog.id).filter(
+            self.due(self.clock())
+        ).order_by(NotificationLog.id).limit(limit).all()]
+
+    def process_pending(self, limit=100):
+        """Enviar de forma síncrona as notificações a enviar (testes/manutenção)"""
+        statuses = [self.process(notification_id) for notification_id in self.due_ids(limit)]
+        notification_writer.flush()
+        return statuses
+
+    def wake(self):
+        """Forçar uma recolha imediata de pendentes"""
+        self._wakeup.set()
+
+    def stats(self):
+        """Profundidade da fila, tentativas, dead-letter e latência de envio"""
+        by_status = dict(db.session.query(NotificationLog.status, db.func.count()).filter(
+            NotificationLog.status.in_(('pending', 'retry', 'dead'))
+        ).group_by(NotificationLog.status).all())
+        with self._lock:
+            latencies = sorted(self._latencies)
+            in_flight = len(self._queued)
+            sent, failed = self.sent_count, self.failed_count
+        
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1)
+        
+        return {
+            'pending': by_status.get('pending', 0),
+            'retry': by_status.get('retry', 0),
+            'dead': by_status.get('dead', 0),
+            'in_flight': in_flight,
+            'sent': sent,
+            'failed': failed,
+            'workers': self.workers,
+            'circuits': {channel: breaker.state for channel, breaker in self.breakers.items()},
+            'latency_ms': {
+                'avg': round(sum(latencies) / len(latencies) * 1000, 1) if latencies else None,
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'max': round(latencies[-1] * 1000, 1) if latencies else None,
+            },
+        }
+
+    def _run(self, notification_id):
+        try:
+            with app.app_context():
+                self.process(notification_id)
+        except Exception as e:
+            print(f"Erro ao processar notificação {notification_id}: {e}")
+        finally:
+            with self._lock:
+                self._queued.discard(notification_id)
+
+    def _poll_loop(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                with app.app_context():
+                    ids = self.due_ids(500)
+                    if ids:
+                        self.submit(ids)
+                    send_due_digests()
+            except Exception as e:
+                print(f"Erro no poller de notificações: {e}")
+
+
+notification_dispatcher = NotificationDispatcher()
+
+
+def enqueue_notifications(user_id, recipients, message, notification_type='whatsapp',
+                          reference_type=None, reference_id=None, channel='whatsapp', throttle=True):
+    """
+    Gravar notificações como pendentes (um único INSERT) e agendar o envio
+    
+    Args:
+        user_id: ID do utilizador (idoso)
+        recipients: Lista de números de telefone
+        message: Texto da mensagem
+        throttle: Aplicar deduplicação e limite (ver NotificationThrottle)
+    
+    Returns:
+        list: IDs das notificações criadas (pela ordem de recipients);
+              None para destinatários em que a mensagem foi descartada ou retida
+    """
+    logs = []
+    for phone in recipients:
+        if throttle and notification_throttle.check(
+            user_id, (phone, notification_type, reference_type, reference_id), message
+        ) != 'send':
+            logs.append(None)
+            continue
+        logs.append(NotificationLog(
+            user_id=user_id,
+            notification_type=notification_type,
+            reference_type=reference_type,
+            reference_id=reference_id,
+            message=message,
+            channel=channel,
+            sent_to=phone,
+            status='pending',
+        ))
+    
+    # Gravadas já (transação própria, um INSERT) para não se perderem num crash
+    created = [log for log in logs if log]
+    if created:
+        notification_dispatcher.submit(notification_writer.insert(created))
+    
+    return [log.id if log else None for log in logs]
+
+
+def send_due_digests():
+    """Enviar os resumos das notificações retidas pelo limite"""
+    for user_id, (phone, notification_type, reference_type, reference_id), digest in notification_throttle.due_digests():
+        enqueue_notifications(user_id, [phone], digest, notification_type=notification_type,
+                              reference_type=reference_type, reference_id=reference_id, throttle=False)
+
+
+# user_id -> destinatários dos alertas (invalidada por alterações a ligações, cuidadores e contactos)
+recipient_cache = TTLCache(AUTH_CACHE_SIZE, RECIPIENT_CACHE_TTL)
+
+
+def resolve_recipients(user_id):
+    """
+    Destinatários dos alertas de um utilizador, numa só query (UNION ALL)
+    
+    Cuidadores com notify_alerts (principais primeiro) ou, se não houver,
+    contactos de emergência (por prioridade). Em cache por utilizador.
+    
+    Returns:
+        tuple: ((telefone, info), ...) com info = {'caregiver_id', 'caregiver_name'}
+               ou {'contact_id', 'contact_name'}
+    """
+    recipients = recipient_cache.get(user_id)
+    if recipients is not None:
+        return recipients
+    
+    caregivers = db.select(
+        db.literal('caregiver').label('kind'),
+        Caregiver.id,
+        Caregiver.name,
+        Caregiver.phone,
+        db.case((CaregiverUser.is_primary.is_(True), 1), else_=0).label('rank'),
+    ).join(
+        CaregiverUser, CaregiverUser.caregiver_id == Caregiver.id
+    ).where(
+        CaregiverUser.user_id == user_id,
+        CaregiverUser.notify_alerts.is_(True),
+        Caregiver.phone.isnot(None),
+        Caregiver.phone != '',
+    )
+    contacts = db.select(
+        db.literal('contact').label('kind'),
+        Contact.id,
+        Contact.name,
+        Contact.phone,
+        db.func.coalesce(Contact.priority, 0).label('rank'),
+    ).where(
+        Contact.user_id == user_id,
+        Contact.is_emergency.is_(True),
+        Contact.phone != '',
+    )
+    rows = db.session.execute(db.union_all(caregivers, contacts)).all()
+    
+    # Se não houver cuidadores registados, usar os contactos de emergência
+    kind = 'caregiver' if any(row.kind == 'caregiver' for row in rows) else 'contact'
+    recipients = tuple(
+        (row.phone, {f'{kind}_id': row.id, f'{kind}_name': row.name})
+        for row in sorted((row for row in rows if row.kind == kind), key=lambda row: (-row.rank, row.id))
+    )
+    recipient_cache.set(user_id, recipients)
+    return recipients
+
+
+def invalidate_recipients(session, user_ids):
+    """Remover da cache os destinatários de utilizadores (agora e de novo após o commit)"""
+    for user_id in user_ids:
+        recipient_cache.pop(user_id)
+    # Um pedido concorrente pode voltar a ler o estado antigo antes do commit
+    if session is not None:
+        session.info.setdefault('recipient_invalidations', set()).update(user_ids)
+
+
+@event.listens_for(CaregiverUser, 'after_insert')
+@event.listens_for(CaregiverUser, 'after_update')
+@event.listens_for(CaregiverUser, 'after_delete')
+@event.listens_for(Contact, 'after_insert')
+@event.listens_for(Contact, 'after_update')
+@event.listens_for(Contact, 'after_delete')
+def _invalidate_user_recipients(mapper, connection, target):
+    invalidate_recipients(object_session(target), [target.user_id])
+
+
+@event.listens_for(Caregiver, 'after_update')
+@event.listens_for(Caregiver, 'after_delete')
+def _invalidate_caregiver_recipients(mapper, connection, target):
+    user_ids = connection.execute(
+        db.select(CaregiverUser.user_id).where(CaregiverUser.caregiver_id == target.id)
+    ).scalars().all()
+    invalidate_recipients(object_session(target), user_ids)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_recipients_after_commit(session):
+    for user_id in session.info.pop('recipient_invalidations', ()):
+        recipient_cache.pop(user_id)
+
+
+def notify_caregivers(user_id, notification_type, message, reference_type=None, reference_id=None):
+    """
+    Notificar todos os cuidadores de um utilizador (envio em fila)
+    
+    Args:
+        user_id: ID do utilizador (idoso)
+        notification_type: 'medication_missed', 'emergency', 'appointment_reminder', etc.
+        message: Texto da notificação
+        reference_type, reference_id: Origem da notificação (ex: 'medication', 42)
+    
+    Returns:
+        list: Um item por destinatário com o ID da notificação em fila
+              (queued=False se foi descartada ou retida para resumo)
+    """
+    recipients = resolve_recipients(user_id)
+    
+    notification_ids = enqueue_notifications(
+        user_id,
+        [phone for phone, _ in recipients],
+        message,
+        notification_type=notification_type,
+        reference_type=reference_type,
+        reference_id=reference_id
+    )
+    
+    return [
+        {**info, 'queued': notification_id is not None, 'notification_id': notification_id}
+        for (_, info), notification_id in zip(recipients, notification_ids)
+    ]
+
+
+def send_medication_reminder(user_id, medication_name, scheduled_time, alert_level='first', medication_id=None):
+    """
+    Enviar lembrete de medicação
+    
+    Args:
+        user_id: ID do utilizador
+        medication_name: Nome do medicamento
+        scheduled_time: Hora agendada
+        alert_level: 'first', 'second', 'escalation'
+        medication_id: ID do medicamento (referência para deduplicação)
+    """
+    user = User.query.get(user_id)
+    if not user:
+        return
+    
+    # Obter configuração de alertas
+    config = MedicationAlertConfig.query.filter_by(
+        user_id=user_id,
+        medication_id=None
+    ).first()
+    
+    if not config or not config.is_active:
+        return
+    
+    reference_type = 'medication' if medication_id else None
+    
+    # Mensagens por nível
+    if alert_level == 'first':
+        message = f"⏰ Lembrete: {user.name}, está na hora de tomar {medication_name} (agendado para {scheduled_time})."
+    elif alert_level == 'second':
+        message = f"⚠️ Segundo aviso: {user.name} ainda não tomou {medication_name}. Por favor, tome a medicação."
+    else:  # escalation
+        message = f"🚨 ALERTA: {user.name} não tomou a medicação {medication_name} (agendada para {scheduled_time}). Verifique se está tudo bem."
+    
+    # Para o utilizador (se tiver telefone)
+    if user.phone and config.notify_via_whatsapp:
+        enqueue_notifications(user_id, [user.phone], message, notification_type='medication_reminder',
+                              reference_type=reference_type, reference_id=medication_id)
+    
+    # Para cuidadores (apenas na escalação ou se configurado)
+    if alert_level == 'escalation' and config.notify_caregivers:
+        notify_caregivers(user_id, 'medication_missed', message,
+                          reference_type=reference_type, reference_id=medication_id)
+
+
+def send_emergency_alert(user_id, alert_type='emergency', custom_message=None):
+    """
+    Enviar alerta de emergência para todos os cuidadores
+    
+    Args:
+        user_id: ID do utilizador
+        alert_type: 'emergency', 'fall', 'inactivity'
+        custom_message: Mensagem personalizada (opcional)
+    """
+    user = User.query.get(user_id)
+    if not user:
+        return []
+    
+    # Mensagens por tipo
+    messages = {
+        'emergency': f"🚨 EMERGÊNCIA: {user.name} ativou o botão de emergência! Por favor, contacte-o imediatamente.",
+        'fall': f"⚠️ ALERTA DE QUEDA: Foi detetada uma possível queda de {user.name}. Verifique se está bem.",
+        'inactivity': f"⚠️ INATIVIDADE: {user.name} não interage com a app há algum tempo. Pode verificar se está tudo bem?",
+    }
+    
+    message = custom_message or messages.get(alert_type, messages['emergency'])
     
     return notify_caregivers(user_id, alert_type, message)
 
 
-def send_appointment_reminder(user_id, appointment):
+def appointment_day_label(appointment_date, today):
+    """'hoje', 'amanhã' ou 'a dd/mm/aaaa', relativo a today"""
+    days = (appointment_date - today).days
+    if days == 0:
+        return 'hoje'
+    if days == 1:
+        return 'amanhã'
+    return f"a {appointment_date.strftime('%d/%m/%Y')}"
+
+
+def send_appointment_reminder(user_id, appointment, now=None):
+    """
+    Enviar lembrete de consulta
+    
+    Args:
+        user_id: ID do utilizador
+        appointment: Objeto Appointment
+        now: Momento do envio (para o dia relativo na mensagem dos cuidadores)
+    """
+    user = User.query.get(user_id)
+    if not user:
+        return
+    
+    date_str = appointment.appointment_date.strftime('%d/%m/%Y')
+    time_str = appointment.appointment_time.strftime('%H:%M')
+    
+    message = f"📅 Lembrete de consulta:\n\n{appointment.title}\n📍 {appointment.location or 'Local não especificado'}\n🗓️ {date_str} às {time_str}"
+    
+    if appointment.notes:
+        message += f"\n📝 {appointment.notes}"
+    
+    # Enviar para o utilizador
+    if user.phone:
+        enqueue_notifications(user_id, [user.phone], message, notification_type='appointment_reminder',
+                              reference_type='appointment', reference_id=appointment.id)
+    
+    # Enviar também para cuidadores
+    day_label = appointment_day_label(appointment.appointment_date, (now or datetime.utcnow()).date())
+    notify_caregivers(user_id, 'appointment_reminder', f"Lembrete: {user.name} tem consulta {day_label} - {appointment.title} às {time_str}",
+                      reference_type='appointment', reference_id=appointment.id)
+
+
+# ==================== EVENTOS EM TEMPO REAL ====================
+
+class Subscription:
+    """Fila de eventos de uma ligação SSE"""
+
+    def __init__(self, topics, maxsize):
+        self.topics = frozenset(topics)
+        self.closed = False
+        self._queue = queue.Queue(maxsize)
+
+    def put(self, event):
+        self._queue.put_nowait(event)
+
+    def get(self, timeout):
+        """Próximo evento, ou None ao fim de timeout segundos"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBroker:
+    """
+    Pub/sub em memória para os eventos enviados aos painéis (SSE).
+    
+    publish() nunca bloqueia: um subscritor com a fila cheia é desligado e
+    o cliente volta a ligar com Last-Event-ID, recuperando do histórico
+    recente. Só entrega eventos publicados no próprio processo; com vários
+    workers substituir por um broker local (ex: Redis pub/sub ou LISTEN/NOTIFY
+    do PostgreSQL) com a mesma interface publish/subscribe/unsubscribe.
+    """
+
+    def __init__(self, queue_size=SSE_QUEUE_SIZE, replay_size=SSE_REPLAY_SIZE):
+        self.queue_size = queue_size
+        self.published = 0
+        self.dropped = 0
+        self._next_id = 0
+        self._subscribers = {}
+        self._recent = deque(maxlen=replay_size)
+        self._lock = threading.Lock()
+
+    def publish(self, topic, event_type, data):
+        """
+        Publicar um evento num tópico
+        
+        Returns:
+            int: ID do evento (crescente, usado como id SSE)
+        """
+        with self._lock:
+            self._next_id += 1
+            event = (self._next_id, topic, event_type, data)
+            self._recent.append(event)
+            self.published += 1
+            subscribers = list(self._subscribers.get(topic, ()))
+        
+        for subscription in subscribers:
+            try:
+                subscription.put(event)
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+                self.unsubscribe(subscription)
+        return event[0]
+
+    def subscribe(self, topics, last_event_id=None):
+        """
+        Subscrever tópicos
+        
+        Returns:
+            tuple: (Subscription, eventos recentes com id > last_event_id)
+        """
+        subscription = Subscription(topics, self.queue_size)
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscribers.setdefault(topic, set()).add(subscription)
+            backlog = []
+            if last_event_id is not None:
+                backlog = [e for e in self._recent if e[0] > last_event_id and e[1] in subscription.topics]
+        return subscription, backlog
+
+    def unsubscribe(self, subscription):
+        subscription.closed = True
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscribers.get(topic)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[topic]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len({s for subs in self._subscribers.values() for s in subs}),
+                'published': self.published,
+                'dropped': self.dropped,
+            }
+
+
+event_broker = EventBroker()
+
+# Evita publicar um last_active em cada heartbeat
+_activity_published = TTLCache(AUTH_CACHE_SIZE, ACTIVITY_PUBLISH_INTERVAL)
+
+
+def user_topic(user_id):
+    return f'user:{user_id}'
+
+
+def publish_last_active(user_id, when):
+    """Publicar a atividade de um utilizador (no máximo uma vez por intervalo)"""
+    if _activity_published.get(user_id):
+        return
+    _activity_published.set(user_id, True)
+    event_broker.publish(user_topic(user_id), 'last_active', {
+        'user_id': user_id,
+        'last_active': when.isoformat(),
+    })
+
+
+@event.listens_for(Alert, 'after_insert')
+def _queue_alert_event(mapper, connection, target):
+    # Só publicar depois do commit (um rollback descarta o evento)
+    session = object_session(target)
+    session.info.setdefault('realtime_events', []).append(
+        (user_topic(target.user_id), 'alert', dict(target.to_dict(), user_id=target.user_id))
+    )
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_session_events(session):
+    for topic, event_type, data in session.info.pop('realtime_events', ()):
+        event_broker.publish(topic, event_type, data)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_session_events(session, previous_transaction):
+    session.info.pop('realtime_events', None)
+
+
+# ==================== AGENDADOR DE LEMBRETES DE MEDICAÇÃO ====================
+
+class MedicationReminderScheduler:
+    """
+    Dispara send_medication_reminder nos níveis first/second/escalation
+    segundo os atrasos de MedicationAlertConfig.
+    
+    Uma vez por dia as doses do dia são planeadas em linhas MedicationReminder
+    (chave única por dose e nível, pelo que replanear é idempotente) e
+    carregadas num heap ordenado por fire_at. Cada tick só olha para o topo
+    do heap; cada lembrete é reclamado com um UPDATE condicional
+    (pending -> fired), o que permite vários workers e reinícios sem envios
+    duplicados. A recolha periódica lê a janela de fire_at até à próxima
+    recolha (índice status, fire_at); lembretes com mais de
+    MEDICATION_REMINDER_GRACE minutos de atraso (ex: servidor parado) são
+    marcados 'skipped' em vez de enviados. O relógio é injetável para testes.
+    """
+
+    LEVELS = (
+        ('first', 'first_alert_delay'),
+        ('second', 'second_alert_delay'),
+        ('escalation', 'escalation_delay'),
+    )
+
+    def __init__(self, clock=datetime.utcnow, interval=MEDICATION_SCHEDULER_INTERVAL,
+                 refresh_interval=MEDICATION_SCHEDULER_REFRESH):
+        self.clock = clock
+        self.interval = interval
+        self.refresh_interval = refresh_interval
+        self.planned_day = None
+        self._heap = []
+        self._loaded = set()  # IDs no heap
+        self._last_refresh = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def plan_day(self, day=None, medication_ids=None, user_id=None):
+        """
+        Criar os lembretes em falta para as doses de um dia
+        
+        Returns:
+            int: Número de lembretes criados
+        """
+        now = self.clock()
+        day = day or now.date()
+        day_of_week = str(day.weekday())
+        grace = timedelta(minutes=MEDICATION_REMINDER_GRACE)
+        
+        query = db.session.query(
+            MedicationSchedule.id,
+            MedicationSchedule.time,
+            MedicationSchedule.days_of_week,
+            Medication.id,
+            Medication.user_id,
+        ).join(Medication, MedicationSchedule.medication_id == Medication.id).filter(
+            Medication.is_active == True
+        )
+        if medication_ids is not None:
+            query = query.filter(Medication.id.in_(medication_ids))
+        if user_id is not None:
+            query = query.filter(Medication.user_id == user_id)
+        doses = [d for d in query.all() if day_of_week in (d[2] or '')]
+        if not doses:
+            return 0
+        
+        # Configurações ativas: específica do medicamento ou global do utilizador
+        user_ids = {d[4] for d in doses}
+        configs = {}
+        for config in MedicationAlertConfig.query.filter(
+            MedicationAlertConfig.user_id.in_(user_ids),
+            MedicationAlertConfig.is_active == True
+        ).all():
+            configs[(config.user_id, config.medication_id)] = config
+        
+        day_start = datetime.combine(day, datetime.min.time())
+        existing = {
+            (r.schedule_id, r.alert_level)
+            for r in MedicationReminder.query.with_entities(
+                MedicationReminder.schedule_id, MedicationReminder.alert_level
+            ).filter(
+                MedicationReminder.scheduled_time >= day_start,
+                MedicationReminder.scheduled_time < day_start + timedelta(days=1),
+                MedicationReminder.schedule_id.in_([d[0] for d in doses])
+            ).all()
+        }
+        
+        reminders = []
+        for schedule_id, schedule_time, _, medication_id, dose_user_id in doses:
+            config = configs.get((dose_user_id, medication_id)) or configs.get((dose_user_id, None))
+            if not config:
+                continue
+            scheduled_time = datetime.combine(day, schedule_time)
+            for level, delay_field in self.LEVELS:
+                fire_at = scheduled_time + timedelta(minutes=getattr(config, delay_field) or 0)
+                if (schedule_id, level) in existing or fire_at < now - grace:
+                    continue
+                reminders.append(MedicationReminder(
+                    user_id=dose_user_id,
+                    medication_id=medication_id,
+                    schedule_id=schedule_id,
+                    scheduled_time=scheduled_time,
+                    alert_level=level,
+                    fire_at=fire_at,
+                ))
+        
+        if not reminders:
+            return 0
+        
+        try:
+            db.session.add_all(reminders)
+            db.session.commit()
+        except Exception:
+            # Outro worker planeou as mesmas doses em simultâneo
+            db.session.rollback()
+            return 0
+        
+        self.push(reminders)
+        return len(reminders)
+
+    def cancel_user(self, user_id, day=None):
+        """Remover lembretes pendentes de um utilizador (ex: atrasos alterados)"""
+        day_start = datetime.combine(day or self.clock().date(), datetime.min.time())
+        ids = [r.id for r in MedicationReminder.query.with_entities(MedicationReminder.id).filter(
+            MedicationReminder.user_id == user_id,
+            MedicationReminder.status == 'pending',
+            MedicationReminder.scheduled_time >= day_start
+        ).all()]
+        if not ids:
+            return 0
+        deleted = MedicationReminder.query.filter(
+            MedicationReminder.id.in_(ids),
+            MedicationReminder.status == 'pending'
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        
+        # Tirar também do heap: o id pode ser reutilizado por um lembrete replaneado
+        removed = set(ids)
+        with self._lock:
+            self._loaded -= removed
+            self._heap = [entry for entry in self._heap if entry[1] not in removed]
+            heapq.heapify(self._heap)
+        return deleted
+
+    def push(self, reminders):
+        """Adicionar lembretes ao heap (ignora os que já lá estão)"""
+        with self._lock:
+            for reminder in reminders:
+                if reminder.id not in self._loaded:
+                    self._loaded.add(reminder.id)
+                    heapq.heappush(self._heap, (reminder.fire_at, reminder.id))
+
+    def refresh(self):
+        """
+        Carregar os lembretes pendentes que vencem até à próxima recolha
+        (incluindo os criados por outros workers/pedidos) e descartar os
+        que ficaram para trás
+        """
+        now = self.clock()
+        stale_before = now - timedelta(minutes=MEDICATION_REMINDER_GRACE)
+        MedicationReminder.query.filter(
+            MedicationReminder.status == 'pending',
+            MedicationReminder.fire_at < stale_before
+        ).update({'status': 'skipped'}, synchronize_session=False)
+        db.session.commit()
+        
+        reminders = MedicationReminder.query.with_entities(
+            MedicationReminder.id, MedicationReminder.fire_at
+        ).filter(
+            MedicationReminder.status == 'pending',
+            MedicationReminder.fire_at >= stale_before,
+            MedicationReminder.fire_at <= now + timedelta(seconds=self.refresh_interval + self.interval)
+        ).all()
+        self.push(reminders)
+        self._last_refresh = now
+        return len(reminders)
+
+    def tick(self):
+        """
+        Planear o dia se necessário e disparar os lembretes vencidos
+        
+        Returns:
+            int: Número de lembretes disparados
+        """
+        now = self.clock()
+        if self.planned_day != now.date():
+            self.plan_day(now.date())
+            self.planned_day = now.date()
+        if self._last_refresh is None or (now - self._last_refresh).total_seconds() >= self.refresh_interval:
+            self.refresh()
+        
+        fired = 0
+        while True:
+            with self._lock:
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                _, reminder_id = heapq.heappop(self._heap)
+                self._loaded.discard(reminder_id)
+            if self.fire(reminder_id, now):
+                fired += 1
+        return fired
+
+    def next_fire_at(self):
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def queue_size(self):
+        with self._lock:
+            return len(self._heap)
+
+    def fire(self, reminder_id, now=None):
+        """Reclamar e disparar um lembrete. Devolve True se foi enviado."""
+        now = now or self.clock()
+        claimed = MedicationReminder.query.filter(
+            MedicationReminder.id == reminder_id,
+            MedicationReminder.status == 'pending',
+            MedicationReminder.fire_at <= now
+        ).update({'status': 'fired', 'fired_at': now}, synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            return False
+        
+        reminder = MedicationReminder.query.get(reminder_id)
+        if reminder.fire_at < now - timedelta(minutes=MEDICATION_REMINDER_GRACE):
+            # Atrasado demais (ex: servidor parado): não enviar em rajada
+            reminder.status = 'skipped'
+            db.session.commit()
+            return False
+        
+        medication = Medication.query.get(reminder.medication_id)
+        taken = MedicationLog.query.filter_by(
+            medication_id=reminder.medication_id,
+            schedule_id=reminder.schedule_id,
+            scheduled_time=reminder.scheduled_time,
+            status='taken'
+        ).first()
+        
+        if taken or not medication or not medication.is_active:
+            reminder.status = 'skipped'
+            db.session.commit()
+            return False
+        
+        if reminder.alert_level == 'escalation':
+            db.session.add(Alert(
+                user_id=reminder.user_id,
+                type='medication_missed',
+                severity='high',
+                message=f"{medication.name} não tomado (agendado para {reminder.scheduled_time.strftime('%H:%M')})",
+            ))
+            db.session.commit()
+        
+        send_medication_reminder(
+            user_id=reminder.user_id,
+            medication_name=medication.name,
+            scheduled_time=reminder.scheduled_time.strftime('%H:%M'),
+            alert_level=reminder.alert_level,
+            medication_id=medication.id
+        )
+        return True
+
+    def start(self):
+        """Arrancar a thread do agendador (idempotente)"""
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(target=self.run_forever, name='medication-scheduler', daemon=True)
+            self._thread.start()
+
+    def run_forever(self):
+        """Ciclo do agendador (também pode correr num processo worker separado)"""
+        while True:
+            try:
+                with app.app_context():
+                    self.tick()
+            except Exception as e:
+                print(f"Erro no agendador de medicação: {e}")
+            
+            # Dormir até ao próximo lembrete, no máximo um intervalo
+            wait = self.interval
+            next_fire = self.next_fire_at()
+            if next_fire:
+                wait = max(0.5, min(wait, (next_fire - self.clock()).total_seconds()))
+            time.sleep(wait)
+
+
+medication_scheduler = MedicationReminderScheduler()
+
+
+# ==================== AGENDADOR DE LEMBRETES DE CONSULTAS ====================
+
+class AppointmentReminderScheduler:
+    """
+    Dispara send_appointment_reminder reminder_hours_before horas antes de
+    cada consulta marcada.
+    
+    Appointment.reminder_at é calculado ao gravar (ver
+    _set_appointment_reminder_at), com índice em (status, reminder_at). O heap
+    guarda (reminder_at, id) das consultas que vencem até à próxima recolha:
+    as rotas de consultas atualizam-no diretamente (schedule/cancel) e a
+    recolha periódica é uma leitura por intervalo no índice, que apanha as
+    alterações feitas noutros workers. Entradas obsoletas no heap são
+    ignoradas ao sair. Cada lembrete é reclamado com um UPDATE condicional
+    (reminder_sent_at nulo -> agora), pelo que dispara uma só vez por consulta,
+    mesmo com vários workers. O relógio é injetável para testes.
+    """
+
+    def __init__(self, clock=datetime.utcnow, interval=APPOINTMENT_SCHEDULER_INTERVAL,
+                 refresh_interval=APPOINTMENT_SCHEDULER_REFRESH):
+        self.clock = clock
+        self.interval = interval
+        self.refresh_interval = refresh_interval
+        self._heap = []
+        self._due = {}  # appointment_id -> reminder_at em vigor no heap
+        self._horizon = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def schedule(self, appointment):
+        """Indexar (ou reindexar) uma consulta após create/update"""
+        with self._lock:
+            # Fora do horizonte carregado: a próxima recolha trata dela
+            if (appointment.status != 'scheduled' or appointment.reminder_sent_at
+                    or appointment.reminder_at is None or self._horizon is None
+                    or appointment.reminder_at > self._horizon):
+                self._due.pop(appointment.id, None)
+                return
+            if self._due.get(appointment.id) == appointment.reminder_at:
+                return
+            self._due[appointment.id] = appointment.reminder_at
+            heapq.heappush(self._heap, (appointment.reminder_at, appointment.id))
+
+    def cancel(self, appointment_id):
+        """Retirar uma consulta (a entrada no heap é descartada ao sair)"""
+        with self._lock:
+            self._due.pop(appointment_id, None)
+
+    def refresh(self):
+        """Carregar as consultas cujo lembrete vence até à próxima recolha"""
+        now = self.clock()
+        horizon = now + timedelta(seconds=self.refresh_interval + self.interval)
+        appointments = Appointment.query.with_entities(
+            Appointment.id, Appointment.reminder_at
+        ).filter(
+            Appointment.status == 'scheduled',
+            Appointment.reminder_at <= horizon,
+            Appointment.reminder_sent_at.is_(None),
+            Appointment.appointment_date >= now.date() - timedelta(days=1)
+        ).all()
+        with self._lock:
+            for appointment_id, reminder_at in appointments:
+                if self._due.get(appointment_id) != reminder_at:
+                    self._due[appointment_id] = reminder_at
+                    heapq.heappush(self._heap, (reminder_at, appointment_id))
+        self._horizon = horizon
+        return len(appointments)
+
+    def tick(self):
+        """
+        Disparar os lembretes vencidos
+        
+        Returns:
+            int: Número de lembretes enviados
+        """
+        now = self.clock()
+        if self._horizon is None or now + timedelta(seconds=self.interval) >= self._horizon:
+            self.refresh()
+        
+        fired = 0
+        while True:
+            with self._lock:
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                reminder_at, appointment_id = heapq.heappop(self._heap)
+                if self._due.get(appointment_id) != reminder_at:
+                    continue
+                del self._due[appointment_id]
+            if self.fire(appointment_id, reminder_at, now):
+                fired += 1
+        return fired
+
+    def next_fire_at(self):
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def queue_size(self):
+        with self._lock:
+            return len(self._due)
+
+    def fire(self, appointment_id, reminder_at, now=None):
+        """Reclamar e enviar um lembrete. Devolve True se foi enviado."""
+        now = now or self.clock()
+        claimed = Appointment.query.filter(
+            Appointment.id == appointment_id,
+            Appointment.status == 'scheduled',
+            Appointment.reminder_at == reminder_at,
+            Appointment.reminder_sent_at.is_(None)
+        ).update({'reminder_sent_at': now}, synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            return False
+        
+        appointment = Appointment.query.get(appointment_id)
+        if appointment.starts_at <= now:
+            # Consulta já passou (ex: servidor parado): marcada, mas sem envio
+            return False
+        send_appointment_reminder(appointment.user_id, appointment, now=now)
+        return True
+
+    def start(self):
+        """Arrancar a thread do agendador (idempotente)"""
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(target=self.run_forever, name='appointment-scheduler', daemon=True)
+            self._thread.start()
+
+    def run_forever(self):
+        while True:
+            try:
+                with app.app_context():
+                    self.tick()
+            except Exception as e:
+                print(f"Erro no agendador de consultas: {e}")
+            
+            wait = self.interval
+            next_fire = self.next_fire_at()
+            if next_fire:
+                wait = max(0.5, min(wait, (next_fire - self.clock()).total_seconds()))
+            time.sleep(wait)
+
+
+appointment_scheduler = AppointmentReminderScheduler()
+
+
+# ==================== ATIVIDADE (HEARTBEATS) ====================
+
+class ActivityBuffer:
+    """
+    Buffer em memória de User.last_active.
+    
+    Os heartbeats apenas atualizam um dicionário; uma thread escreve os
+    valores em lote a cada ACTIVITY_FLUSH_INTERVAL segundos com um único
+    UPDATE ... SET last_active = CASE id WHEN ... END por lote. As leituras
+    combinam o valor da BD com o do buffer (ver get_last_active).
+    """
+
+    def __init__(self, interval=ACTIVITY_FLUSH_INTERVAL, batch_size=ACTIVITY_FLUSH_BATCH):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.flush_count = 0
+        self.rows_written = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def __len__(self):
+        """Utilizadores com atividade por gravar"""
+        with self._lock:
+            return len(self._pending)
+
+    def touch(self, user_id, when=None):
+        """Registar atividade de um utilizador"""
+        when = when or datetime.utcnow()
+        with self._lock:
+            current = self._pending.get(user_id)
+            if not current or when > current:
+                self._pending[user_id] = when
+
+    def get(self, user_id):
+        with self._lock:
+            return self._pending.get(user_id)
+
+    def flush(self):
+        """
+        Escrever os valores pendentes na BD
+        
+        Returns:
+            int: Número de utilizadores atualizados
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        
+        items = list(pending.items())
+        try:
+            for i in range(0, len(items), self.batch_size):
+                batch = dict(items[i:i + self.batch_size])
+                db.session.execute(
+                    db.update(User)
+                    .where(User.id.in_(batch.keys()))
+                    .values(last_active=db.case(batch, value=User.id))
+                )
+                self.flush_count += 1
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Erro ao gravar atividade: {e}")
+            # Devolver ao buffer sem sobrepor valores mais recentes
+            for user_id, when in items:
+                self.touch(user_id, when)
+            return 0
+        
+        # O UPDATE em lote não passa pelos eventos do ORM
+        for user_id, _ in items:
+            invalidate_principal('user', user_id)
+        
+        self.rows_written += len(items)
+        return len(items)
+
+    def start(self):
+        """Arrancar a thread de escrita periódica (idempotente)"""
+        with self._lock:
+            if self._thread or self.interval <= 0:
+                return
+            self._thread = threading.Thread(target=self._run, name='activity-flush', daemon=True)
+            self._thread.start()
+        atexit.register(self._flush_in_context)
+
+    def _flush_in_context(self):
+        try:
+            with app.app_context():
+                self.flush()
+        except Exception as e:
+            print(f"Erro ao gravar atividade: {e}")
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self._flush_in_context()
+
+
+activity_buffer = ActivityBuffer()
+
+
+def get_last_active(user):
+    """Última atividade de um utilizador (BD ou heartbeat ainda em buffer)"""
+    buffered = activity_buffer.get(user.id)
+    if buffered and (not user.last_active or buffered > user.last_active):
+        return buffered
+    return user.last_active
+
+
+# ==================== DETEÇÃO DE INATIVIDADE ====================
+
+def inactivity_deadline(last_active, wake_time, sleep_time, threshold):
+    """
+    Instante em que se acumulam threshold minutos acordado sem atividade
+    
+    Só conta o tempo entre wake_time e sleep_time (a janela pode passar a
+    meia-noite, ex: 20:00-04:00). Sem janela definida conta o dia inteiro.
+    """
+    remaining = timedelta(minutes=threshold)
+    if not wake_time or not sleep_time or wake_time == sleep_time:
+        return last_active + remaining
+    
+    day = last_active.date() - timedelta(days=1)
+    while True:
+        start = datetime.combine(day, wake_time)
+        end = datetime.combine(day, sleep_time)
+        if end <= start:
+            end += timedelta(days=1)
+        start = max(start, last_active)
+        if end > start:
+            if remaining <= end - start:
+                return start + remaining
+            remaining -= end - start
+        day += timedelta(days=1)
+
+
+class InactivityDetector:
+    """
+    Cria um Alert 'inactivity' e avisa os cuidadores quando um utilizador
+    passa inactivity_threshold minutos acordado sem atividade.
+    
+    Só são monitorizados os utilizadores com inactivity_threshold definido e
+    com atividade depois de inactivity_monitored_since (um utilizador parado
+    desde antes de a monitorização ser ligada não gera alerta). Cada
+    utilizador tem um prazo (inactivity_deadline desde last_active) num
+    heap; cada tick só olha para o topo. Os heartbeats e logins deste processo
+    atualizam o prazo (touch) e os dos outros workers chegam pela recolha
+    periódica, uma leitura por intervalo em ix_users_last_active. Entradas
+    obsoletas são descartadas ao sair do heap. Antes de alertar o prazo é
+    confirmado com o utilizador atual da BD e o alerta é reclamado com um
+    UPDATE condicional em inactivity_alerted_at, pelo que há um só alerta por
+    período inativo, mesmo com vários workers. O relógio é injetável para
+    testes.
+    """
+
+    def __init__(self, clock=datetime.utcnow, interval=INACTIVITY_CHECK_INTERVAL,
+                 refresh_interval=INACTIVITY_REFRESH):
+        self.clock = clock
+        self.interval = interval
+        self.refresh_interval = refresh_interval
+        self.alerts = 0
+        self._heap = []
+        self._deadlines = {}  # user_id -> (prazo, last_active) em vigor no heap
+        self._last_refresh = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @staticmethod
+    def monitored(last_active, threshold, monitored_since):
+        return bool(last_active and threshold and threshold > 0
+                    and monitored_since and last_active >= monitored_since)
+
+    def _push(self, user_id, last_active, wake_time, sleep_time, threshold, monitored_since, force=False):
+        """Atualizar o prazo de um utilizador (com self._lock)"""
+        if not self.monitored(last_active, threshold, monitored_since):
+            self._deadlines.pop(user_id, None)
+            return
+        current = self._deadlines.get(user_id)
+        if current and current[1] >= last_active and not force:
+            return
+        deadline = inactivity_deadline(last_active, wake_time, sleep_time, threshold)
+        self._deadlines[user_id] = (deadline, last_active)
+        heapq.heappush(self._heap, (deadline, user_id))
+
+    def touch(self, user, when):
+        """Atividade de um utilizador neste processo (heartbeat, login)"""
+        if self._last_refresh is None:
+            return
+        with self._lock:
+            self._push(user.id, when, user.wake_time, user.sleep_time, user.inactivity_threshold,
+                       user.inactivity_monitored_since)
+
+    def update_user(self, user):
+        """Reindexar um utilizador após alterar o limite ou o horário"""
+        if self._last_refresh is None:
+            return
+        with self._lock:
+            self._push(user.id, get_last_active(user), user.wake_time, user.sleep_time,
+                       user.inactivity_threshold, user.inactivity_monitored_since, force=True)
+
+    def load(self, since=None):
+        """
+        Carregar prazos da BD: todos os utilizadores monitorizados, ou só os
+        ativos desde since
+        
+        Returns:
+            int: Número de utilizadores lidos
+        """
+        query = db.session.query(
+            User.id, User.last_active, User.wake_time, User.sleep_time,
+            User.inactivity_threshold, User.inactivity_monitored_since, User.inactivity_alerted_at
+        ).filter(
+            User.inactivity_threshold > 0,
+            User.last_active >= User.inactivity_monitored_since
+        )
+        if since is not None:
+            query = query.filter(User.last_active >= since)
+        rows = query.all()
+        with self._lock:
+            for user_id, last_active, wake_time, sleep_time, threshold, monitored_since, alerted_at in rows:
+                if alerted_at and last_active and alerted_at >= last_active:
+                    continue  # Já alertado neste período inativo
+                self._push(user_id, last_active, wake_time, sleep_time, threshold, monitored_since)
+        return len(rows)
+
+    def tick(self):
+        """
+        Carregar/recolher se necessário e verificar os prazos vencidos
+        
+        Returns:
+            int: Número de alertas criados
+        """
+        now = self.clock()
+        if self._last_refresh is None:
+            self.load()
+            self._last_refresh = now
+        elif (now - self._last_refresh).total_seconds() >= self.refresh_interval:
+            # Heartbeats de outros workers chegam à BD até ACTIVITY_FLUSH_INTERVAL depois
+            self.load(since=self._last_refresh - timedelta(seconds=ACTIVITY_FLUSH_INTERVAL + self.interval))
+            self._last_refresh = now
+        
+        alerted = 0
+        while True:
+            with self._lock:
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                deadline, user_id = heapq.heappop(self._heap)
+                current = self._deadlines.get(user_id)
+                if not current or current[0] != deadline:
+                    continue
+                del self._deadlines[user_id]
+            if self.check(user_id, now):
+                alerted += 1
+        return alerted
+
+    def next_deadline(self):
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def check(self, user_id, now=None):
+        """Confirmar a inatividade de um utilizador e alertar. Devolve True se alertou."""
+        now = now or self.clock()
+        user = User.query.get(user_id)
+        if not user:
+            return False
+        last_active = get_last_active(user)
+        if not self.monitored(last_active, user.inactivity_threshold, user.inactivity_monitored_since):
+            return False
+        
+        deadline = inactivity_deadline(last_active, user.wake_time, user.sleep_time, user.inactivity_threshold)
+        if deadline > now:
+            # Atividade noutro worker ou limite alterado entretanto
+            with self._lock:
+                self._push(user_id, last_active, user.wake_time, user.sleep_time,
+                           user.inactivity_threshold, user.inactivity_monitored_since)
+            return False
+        
+        claimed = User.query.filter(
+            User.id == user_id,
+            db.or_(User.inactivity_alerted_at.is_(None), User.inactivity_alerted_at < last_active)
+        ).update({'inactivity_alerted_at': now}, synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            return False
+        invalidate_principal('user', user_id)
+        
+        since = last_active.strftime('%H:%M de %d/%m')
+        db.session.add(Alert(
+            user_id=user_id,
+            type='inactivity',
+            severity='high',
+            message=f"Sem atividade na app desde as {since}",
+        ))
+        db.session.commit()
+        send_emergency_alert(
+            user_id, 'inactivity',
+            f"⚠️ INATIVIDADE: {user.name} não interage com a app desde as {since}. Pode verificar se está tudo bem?"
+        )
+        self.alerts += 1
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tracked': len(self._deadlines),
+                'next_deadline': self._heap[0][0].isoformat() if self._heap else None,
+                'alerts': self.alerts,
+            }
+
+    def start(self):
+        """Arrancar a thread do detetor (idempotente)"""
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(target=self.run_forever, name='inactivity-detector', daemon=True)
+            self._thread.start()
+
+    def run_forever(self):
+        while True:
+            try:
+                with app.app_context():
+                    self.tick()
+            except Exception as e:
+                print(f"Erro no detetor de inatividade: {e}")
+            
+            wait = self.interval
+            next_deadline = self.next_deadline()
+            if next_deadline:
+                wait = max(0.5, min(wait, (next_deadline - self.clock()).total_seconds()))
+            time.sleep(wait)
+
+
+inactivity_detector = InactivityDetector()
+
+
+# ==================== PAGINAÇÃO ====================
+
+def parse_datetime(value):
+    """
+    Converter um instante para datetime UTC (sem tzinfo)
+    
+    Aceita ISO 8601 (com ou sem segundos/fuso, 'Z') e epoch em segundos.
+    
+    Raises:
+        ValueError
+    """
+    if isinstance(value, bool):
+        raise ValueError(f'Data inválida: {value}')
+    if isinstance(value, (int, float)):
+        return datetime.utcfromtimestamp(value)
+    parsed = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_datetime_arg(name):
+    """Ler um parâmetro ISO 8601 da query string (None se ausente)"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return parse_datetime(value)
+    except ValueError:
+        raise ValueError(f'Data inválida em {name}: {value}')
+
+
+def encode_cursor(timestamp, row_id):
+    """Cursor opaco para a posição (timestamp, id) de uma linha"""
+    raw = json.dumps([timestamp.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Raises:
+        ValueError: cursor inválido
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError('Cursor inválido')
+
+
+def paginate(query, time_column, id_column, default_limit=50):
     """
-    Enviar lembrete de consulta
+    Paginação por keyset sobre (time_column, id), do mais recente para o mais antigo
     
-    Args:
-        user_id: ID do utilizador
-        appointment: Objeto Appointment
+    Query: limit (máx. PAGE_SIZE_MAX), cursor (devolvido em X-Next-Cursor),
+    since e until (ISO 8601) sobre time_column.
+    
+    Returns:
+        tuple: (linhas, próximo cursor ou None)
+    
+    Raises:
+        ValueError: parâmetros inválidos
     """
-    user = User.query.get(user_id)
-    if not user:
-        return
+    limit = request.args.get('limit', default_limit, type=int)
+    limit = max(1, min(limit, PAGE_SIZE_MAX))
     
-    date_str = appointment.appointment_date.strftime('%d/%m/%Y')
-    time_str = appointment.appointment_time.strftime('%H:%M')
+    since = parse_datetime_arg('since')
+    until = parse_datetime_arg('until')
+    if since:
+        query = query.filter(time_column >= since)
+    if until:
+        query = query.filter(time_column < until)
     
-    message = f"📅 Lembrete de consulta:\n\n{appointment.title}\n📍 {appointment.location or 'Local não especificado'}\n🗓️ {date_str} às {time_str}"
+    cursor = request.args.get('cursor')
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.filter(db.or_(
+            time_column < timestamp,
+            db.and_(time_column == timestamp, id_column < row_id)
+        ))
     
-    if appointment.notes:
-        message += f"\n📝 {appointment.notes}"
+    rows = query.order_by(time_column.desc(), id_column.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, time_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
+
+
+def paginated_response(payload, next_cursor):
+    """Resposta JSON com o cursor da página seguinte no cabeçalho X-Next-Cursor"""
+    response = jsonify(payload)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+
+# ==================== PEDIDOS CONDICIONAIS (ETag) ====================
+
+def data_version(user_id):
+    """Versão dos dados de um utilizador (User.data_version, sobe a cada alteração sincronizada)"""
+    return db.session.query(User.data_version).filter(User.id == user_id).scalar() or 0
+
+
+def conditional_get(*entities, daily=False):
+    """
+    ETag por utilizador calculada a partir da versão dos dados (sem serializar)
     
-    # Enviar para o utilizador
-    if user.phone:
-        send_whatsapp_message(user.phone, message, user_id)
+    entities documenta as entidades de que a resposta depende; a versão é
+    única por utilizador, pelo que qualquer alteração sincronizada muda a ETag.
     
-    # Enviar também para cuidadores
-    notify_caregivers(user_id, 'appointment_reminder', f"Lembrete: {user.name} tem consulta amanhã - {appointment.title} às {time_str}")
+    Responde 304 a If-None-Match antes de executar a rota. Usar depois de
+    @token_required. daily=True para respostas que dependem do dia atual.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(current_user, *args, **kwargs):
+            parts = [ETAG_SALT, f.__name__, str(current_user.id), str(data_version(current_user.id)),
+                     request.query_string.decode()]
+            if daily:
+                parts.append(datetime.utcnow().date().isoformat())
+            etag = hashlib.sha1(':'.join(parts).encode()).hexdigest()
+            
+            if request.if_none_match.contains(etag):
+                response = app.response_class(status=304)
+            else:
+                response = app.make_response(f(current_user, *args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated
+    return decorator
 
 
 # ==================== ROTAS - FRONTEND ====================
@@ -747,6 +3304,36 @@ def health_check():
     return jsonify({'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()})
 
 
+def _notification_queue_depths():
+    stats = notification_dispatcher.stats()
+    return {state: stats[state] for state in ('pending', 'retry', 'dead', 'in_flight')}
+
+
+Gauge('seniorcare_notification_queue', 'Notificações por estado (in_flight: em envio neste processo)',
+      _notification_queue_depths, ('state',))
+Gauge('seniorcare_notification_circuit_open', 'Circuit breaker aberto por canal (1 = aberto)',
+      lambda: {channel: int(breaker.state == 'open') for channel, breaker in notification_dispatcher.breakers.items()},
+      ('channel',))
+Gauge('seniorcare_notifications_held', 'Notificações retidas pelo limite (a aguardar resumo)',
+      lambda: notification_throttle.stats()['holding'])
+Gauge('seniorcare_buffered_writes', 'Escritas em buffer por gravar',
+      lambda: {'notification_logs': len(notification_writer), 'last_active': len(activity_buffer)}, ('buffer',))
+Gauge('seniorcare_scheduler_queue', 'Entradas nos heaps dos agendadores',
+      lambda: {
+          'medication': medication_scheduler.queue_size(),
+          'appointment': appointment_scheduler.queue_size(),
+          'inactivity': inactivity_detector.stats()['tracked'],
+      }, ('scheduler',))
+Gauge('seniorcare_sse_subscribers', 'Ligações SSE abertas', lambda: event_broker.stats()['subscribers'])
+
+
+@app.route('/metrics')
+@metrics_token_required
+def metrics():
+    """Métricas deste processo em formato Prometheus"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
 # ==================== ROTAS - API ====================
 
 @app.route('/api/auth/register', methods=['POST'])
@@ -798,6 +3385,8 @@ def login_user():
     # Atualizar última atividade
     user.last_active = datetime.utcnow()
     db.session.commit()
+    publish_last_active(user.id, user.last_active)
+    inactivity_detector.touch(user, user.last_active)
     
     token = generate_token(user.id, 'user')
     
@@ -818,15 +3407,65 @@ def get_profile(current_user):
 @token_required
 def update_activity(current_user):
     """Atualizar última atividade (heartbeat)"""
-    current_user.last_active = datetime.utcnow()
-    db.session.commit()
+    now = datetime.utcnow()
+    if ACTIVITY_FLUSH_INTERVAL > 0:
+        activity_buffer.touch(current_user.id, now)
+    else:
+        current_user.last_active = now
+        db.session.commit()
+    publish_last_active(current_user.id, now)
+    inactivity_detector.touch(current_user, now)
     return jsonify({'status': 'ok'})
 
 
+BOOTSTRAP_SECTIONS = ('profile', 'medications', 'contacts', 'activities', 'chat')
+
+
+@app.route('/api/bootstrap', methods=['GET'])
+@token_required
+def bootstrap(current_user):
+    """
+    Dados do ecrã inicial num só pedido
+    
+    Query: include=profile,medications,contacts,activities,chat (por omissão,
+    todas). Equivale a /user/profile, /medications/today, /contacts,
+    /activities e à primeira página de /chat/messages (mesmos limit, since e
+    until; cursor da página seguinte em chat_cursor).
+    """
+    include = request.args.get('include')
+    sections = [section.strip() for section in include.split(',')] if include else list(BOOTSTRAP_SECTIONS)
+    unknown = [section for section in sections if section not in BOOTSTRAP_SECTIONS]
+    if unknown:
+        return jsonify({'error': f"Secções desconhecidas: {', '.join(unknown)}"}), 400
+    
+    result = {}
+    if 'profile' in sections:
+        result['profile'] = current_user.to_dict()
+    if 'medications' in sections:
+        result['medications'] = today_medications(current_user.id)
+    if 'contacts' in sections:
+        result['contacts'] = list_contacts(current_user.id)
+    if 'activities' in sections:
+        result['activities'] = today_activities(current_user.id)
+    if 'chat' in sections:
+        try:
+            messages, next_cursor = paginate(
+                ChatMessage.query.filter_by(user_id=current_user.id),
+                ChatMessage.created_at, ChatMessage.id, default_limit=50
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        result['chat'] = [m.to_dict() for m in reversed(messages)]
+        result['chat_cursor'] = next_cursor
+    
+    return jsonify(result)
+
+
 # ==================== MEDICAÇÃO ====================
 
 @app.route('/api/medications', methods=['GET'])
 @token_required
+@conditional_get('medications', 'schedules')
 def get_medications(current_user):
     """Listar medicamentos do utilizador"""
     medications = Medication.query.filter_by(
@@ -863,47 +3502,74 @@ def add_medication(current_user):
         db.session.add(med_schedule)
     
     db.session.commit()
+    
+    # Planear já os lembretes de hoje para o novo medicamento
+    medication_scheduler.plan_day(medication_ids=[medication.id])
+    
     return jsonify(medication.to_dict()), 201
 
 
-@app.route('/api/medications/today', methods=['GET'])
-@token_required
-def get_today_medications(current_user):
-    """Obter medicações de hoje com estado"""
+def today_medications(user_id):
+    """Doses de hoje com estado (uma query), ordenadas por hora"""
     today = datetime.utcnow().date()
     day_of_week = str(today.weekday())
-    
-    medications = Medication.query.filter_by(
-        user_id=current_user.id,
-        is_active=True
+    day_start = datetime.combine(today, datetime.min.time())
+    
+    # Uma única query: horários de hoje + registo do dia (LEFT JOIN)
+    rows = db.session.query(
+        Medication.id,
+        Medication.name,
+        Medication.dosage,
+        Medication.icon,
+        MedicationSchedule.id,
+        MedicationSchedule.time,
+        MedicationSchedule.days_of_week,
+        MedicationLog.scheduled_time,
+        MedicationLog.status,
+        MedicationLog.taken_at,
+    ).join(
+        MedicationSchedule, MedicationSchedule.medication_id == Medication.id
+    ).outerjoin(
+        MedicationLog, db.and_(
+            MedicationLog.medication_id == Medication.id,
+            MedicationLog.schedule_id == MedicationSchedule.id,
+            MedicationLog.scheduled_time >= day_start,
+            MedicationLog.scheduled_time < day_start + timedelta(days=1),
+        )
+    ).filter(
+        Medication.user_id == user_id,
+        Medication.is_active == True
     ).all()
     
-    result = []
-    for med in medications:
-        for schedule in med.schedules:
-            if day_of_week in schedule.days_of_week:
-                # Verificar se já foi tomado
-                scheduled_datetime = datetime.combine(today, schedule.time)
-                log = MedicationLog.query.filter_by(
-                    medication_id=med.id,
-                    schedule_id=schedule.id,
-                    scheduled_time=scheduled_datetime
-                ).first()
-                
-                result.append({
-                    'id': med.id,
-                    'schedule_id': schedule.id,
-                    'name': med.name,
-                    'dosage': med.dosage,
-                    'time': schedule.time.strftime('%H:%M'),
-                    'icon': med.icon,
-                    'taken': log.status == 'taken' if log else False,
-                    'taken_at': log.taken_at.isoformat() if log and log.taken_at else None,
-                })
+    doses = {}
+    for med_id, name, dosage, icon, schedule_id, schedule_time, days_of_week, log_time, log_status, taken_at in rows:
+        if day_of_week not in (days_of_week or ''):
+            continue
+        # Verificar se já foi tomado (registo da hora agendada)
+        scheduled_datetime = datetime.combine(today, schedule_time)
+        has_log = log_time == scheduled_datetime
+        if schedule_id in doses and not has_log:
+            continue
+        doses[schedule_id] = {
+            'id': med_id,
+            'schedule_id': schedule_id,
+            'name': name,
+            'dosage': dosage,
+            'time': schedule_time.strftime('%H:%M'),
+            'icon': icon,
+            'taken': log_status == 'taken' if has_log else False,
+            'taken_at': taken_at.isoformat() if has_log and taken_at else None,
+        }
     
     # Ordenar por hora
-    result.sort(key=lambda x: x['time'])
-    return jsonify(result)
+    return sorted(doses.values(), key=lambda x: x['time'])
+
+
+@app.route('/api/medications/today', methods=['GET'])
+@token_required
+def get_today_medications(current_user):
+    """Obter medicações de hoje com estado"""
+    return jsonify(today_medications(current_user.id))
 
 
 @app.route('/api/medications/<int:med_id>/take', methods=['POST'])
@@ -930,12 +3596,21 @@ def take_medication(current_user, med_id):
     ).first()
     
     if not log:
-        log = MedicationLog(
-            medication_id=med_id,
-            schedule_id=schedule_id,
-            scheduled_time=scheduled_datetime
-        )
-        db.session.add(log)
+        try:
+            with db.session.begin_nested():
+                log = MedicationLog(
+                    medication_id=med_id,
+                    schedule_id=schedule_id,
+                    scheduled_time=scheduled_datetime
+                )
+                db.session.add(log)
+        except IntegrityError:
+            # Pedido concorrente já criou o registo desta dose (índice único)
+            log = MedicationLog.query.filter_by(
+                medication_id=med_id,
+                schedule_id=schedule_id,
+                scheduled_time=scheduled_datetime
+            ).first()
     
     log.taken_at = datetime.utcnow()
     log.status = 'taken'
@@ -948,10 +3623,15 @@ def take_medication(current_user, med_id):
 
 @app.route('/api/contacts', methods=['GET'])
 @token_required
+@conditional_get('contacts')
 def get_contacts(current_user):
     """Listar contactos"""
-    contacts = Contact.query.filter_by(user_id=current_user.id).order_by(Contact.priority.desc()).all()
-    return jsonify([c.to_dict() for c in contacts])
+    return jsonify(list_contacts(current_user.id))
+
+
+def list_contacts(user_id):
+    contacts = Contact.query.filter_by(user_id=user_id).order_by(Contact.priority.desc()).all()
+    return [c.to_dict() for c in contacts]
 
 
 @app.route('/api/contacts', methods=['POST'])
@@ -979,12 +3659,17 @@ def add_contact(current_user):
 
 @app.route('/api/activities', methods=['GET'])
 @token_required
+@conditional_get('activities', daily=True)
 def get_activities(current_user):
     """Listar atividades de hoje"""
+    return jsonify(today_activities(current_user.id))
+
+
+def today_activities(user_id):
     today = datetime.utcnow().date()
     day_of_week = str(today.weekday())
     
-    activities = Activity.query.filter_by(user_id=current_user.id).all()
+    activities = Activity.query.filter_by(user_id=user_id).all()
     
     result = []
     for activity in activities:
@@ -993,7 +3678,7 @@ def get_activities(current_user):
     
     # Ordenar por hora
     result.sort(key=lambda x: x['time'] or '23:59')
-    return jsonify(result)
+    return result
 
 
 @app.route('/api/activities', methods=['POST'])
@@ -1038,7 +3723,7 @@ def create_emergency(current_user):
     db.session.add(alert)
     db.session.commit()
     
-    # Enviar notificações WhatsApp para cuidadores
+    # Colocar notificações WhatsApp para cuidadores em fila (envio em background)
     notification_results = send_emergency_alert(
         user_id=current_user.id,
         alert_type='emergency',
@@ -1047,16 +3732,23 @@ def create_emergency(current_user):
     
     return jsonify({
         'alert': alert.to_dict(),
-        'notifications_sent': len([r for r in notification_results if r.get('success')])
+        'notifications_queued': sum(1 for r in notification_results if r['queued']),
+        'notification_ids': [r['notification_id'] for r in notification_results if r['queued']],
     }), 201
 
 
 @app.route('/api/alerts', methods=['GET'])
 @token_required
 def get_alerts(current_user):
-    """Listar alertas recentes"""
-    alerts = Alert.query.filter_by(user_id=current_user.id).order_by(Alert.created_at.desc()).limit(50).all()
-    return jsonify([a.to_dict() for a in alerts])
+    """Listar alertas recentes (paginação: cursor, limit, since, until)"""
+    try:
+        alerts, next_cursor = paginate(
+            Alert.query.filter_by(user_id=current_user.id),
+            Alert.created_at, Alert.id, default_limit=50
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return paginated_response([a.to_dict() for a in alerts], next_cursor)
 
 
 # ==================== HUMOR/BEM-ESTAR ====================
@@ -1082,9 +3774,15 @@ def log_mood(current_user):
 @app.route('/api/mood/recent', methods=['GET'])
 @token_required
 def get_recent_mood(current_user):
-    """Obter registos de humor recentes"""
-    logs = MoodLog.query.filter_by(user_id=current_user.id).order_by(MoodLog.created_at.desc()).limit(30).all()
-    return jsonify([l.to_dict() for l in logs])
+    """Obter registos de humor recentes (paginação: cursor, limit, since, until)"""
+    try:
+        logs, next_cursor = paginate(
+            MoodLog.query.filter_by(user_id=current_user.id),
+            MoodLog.created_at, MoodLog.id, default_limit=30
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return paginated_response([l.to_dict() for l in logs], next_cursor)
 
 
 # ==================== CHAT/COMPANHIA ====================
@@ -1092,14 +3790,15 @@ def get_recent_mood(current_user):
 @app.route('/api/chat/messages', methods=['GET'])
 @token_required
 def get_chat_history(current_user):
-    """Obter histórico de mensagens"""
-    messages = ChatMessage.query.filter_by(user_id=current_user.id).order_by(ChatMessage.created_at.desc()).limit(50).all()
-    return jsonify([{
-        'id': m.id,
-        'role': m.role,
-        'content': m.content,
-        'created_at': m.created_at.isoformat()
-    } for m in reversed(messages)])
+    """Obter histórico de mensagens (paginação: cursor, limit, since, until)"""
+    try:
+        messages, next_cursor = paginate(
+            ChatMessage.query.filter_by(user_id=current_user.id),
+            ChatMessage.created_at, ChatMessage.id, default_limit=50
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return paginated_response([m.to_dict() for m in reversed(messages)], next_cursor)
 
 
 @app.route('/api/chat/send', methods=['POST'])
@@ -1202,51 +3901,139 @@ def login_caregiver():
     })
 
 
+def build_user_summaries(caregiver_id, user_id=None):
+    """
+    Resumos dos utilizadores acompanhados por um cuidador numa única query
+    
+    Agrega no SQL a medicação de hoje (SUM condicional sobre um intervalo de
+    scheduled_time, que pode usar índices), os alertas pendentes e o último
+    humor. Só devolve utilizadores a que o cuidador tem acesso.
+    
+    Returns:
+        list: Um dict por utilizador, ordenado por nome
+    """
+    day_start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    followed = db.select(CaregiverUser.user_id).where(CaregiverUser.caregiver_id == caregiver_id)
+    if user_id is not None:
+        followed = followed.where(CaregiverUser.user_id == user_id)
+    
+    med_stats = db.select(
+        Medication.user_id.label('user_id'),
+        db.func.count(MedicationLog.id).label('total'),
+        db.func.sum(db.case((MedicationLog.status == 'taken', 1), else_=0)).label('taken'),
+    ).join(Medication, MedicationLog.medication_id == Medication.id).where(
+        Medication.user_id.in_(followed),
+        MedicationLog.scheduled_time >= day_start,
+        MedicationLog.scheduled_time < day_start + timedelta(days=1)
+    ).group_by(Medication.user_id).subquery()
+    
+    pending_alerts = db.select(db.func.count(Alert.id)).where(
+        Alert.user_id == User.id,
+        Alert.resolved_at.is_(None)
+    ).scalar_subquery()
+    
+    mood = db.aliased(MoodLog)
+    last_mood_id = db.select(mood.id).where(
+        mood.user_id == User.id
+    ).order_by(mood.created_at.desc(), mood.id.desc()).limit(1).correlate(User).scalar_subquery()
+    
+    rows = db.session.query(
+        User,
+        med_stats.c.taken,
+        med_stats.c.total,
+        pending_alerts,
+        MoodLog,
+    ).outerjoin(
+        med_stats, med_stats.c.user_id == User.id
+    ).outerjoin(
+        MoodLog, MoodLog.id == last_mood_id
+    ).filter(
+        User.id.in_(followed)
+    ).order_by(User.name).all()
+    
+    summaries = []
+    for user, taken, total, alerts, last_mood in rows:
+        last_active = get_last_active(user)
+        summaries.append({
+            'user': user.to_dict(),
+            'last_active': last_active.isoformat() if last_active else None,
+            'medications_today': {
+                'taken': int(taken or 0),
+                'total': int(total or 0),
+            },
+            'pending_alerts': alerts,
+            'last_mood': last_mood.to_dict() if last_mood else None,
+        })
+    return summaries
+
+
 @app.route('/api/caregiver/users/<int:user_id>/summary', methods=['GET'])
 @token_required
 def get_user_summary(current_caregiver, user_id):
     """Obter resumo do estado do utilizador (para cuidador)"""
-    # Verificar se tem acesso
-    access = CaregiverUser.query.filter_by(
-        caregiver_id=current_caregiver.id,
-        user_id=user_id
-    ).first()
+    summaries = build_user_summaries(current_caregiver.id, user_id)
     
-    if not access:
+    # Sem linha = sem acesso a este utilizador
+    if not summaries:
         return jsonify({'error': 'Sem acesso a este utilizador'}), 403
     
-    user = User.query.get_or_404(user_id)
+    return jsonify(summaries[0])
+
+
+@app.route('/api/caregiver/users/summary', methods=['GET'])
+@token_required
+def get_users_summary(current_caregiver):
+    """Obter resumo de todos os utilizadores do cuidador (painel)"""
+    if not isinstance(current_caregiver, Caregiver):
+        return jsonify({'error': 'Apenas para cuidadores'}), 403
     
-    # Estatísticas
-    today = datetime.utcnow().date()
+    return jsonify(build_user_summaries(current_caregiver.id))
+
+
+@app.route('/api/caregiver/stream', methods=['GET'])
+@token_required
+def caregiver_stream(current_caregiver):
+    """
+    Eventos em tempo real dos utilizadores seguidos (Server-Sent Events)
     
-    # Medicação de hoje
-    med_logs = MedicationLog.query.join(Medication).filter(
-        Medication.user_id == user_id,
-        db.func.date(MedicationLog.scheduled_time) == today
-    ).all()
+    Eventos: alert (inclui medication_missed), last_active. Aceita o token
+    em ?access_token= (EventSource) e retoma a partir de Last-Event-ID.
+    """
+    if not isinstance(current_caregiver, Caregiver):
+        return jsonify({'error': 'Apenas para cuidadores'}), 403
     
-    meds_taken = len([l for l in med_logs if l.status == 'taken'])
-    meds_total = len(med_logs)
+    user_ids = [user_id for (user_id,) in db.session.query(CaregiverUser.user_id).filter_by(
+        caregiver_id=current_caregiver.id
+    )]
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    subscription, backlog = event_broker.subscribe([user_topic(u) for u in user_ids], last_event_id)
     
-    # Alertas não resolvidos
-    pending_alerts = Alert.query.filter_by(
-        user_id=user_id,
-        resolved_at=None
-    ).count()
+    # A ligação fica aberta: libertar já a ligação à BD
+    db.session.remove()
     
-    # Último humor registado
-    last_mood = MoodLog.query.filter_by(user_id=user_id).order_by(MoodLog.created_at.desc()).first()
+    def format_event(event):
+        event_id, _, event_type, data = event
+        return f'id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n'
     
-    return jsonify({
-        'user': user.to_dict(),
-        'last_active': user.last_active.isoformat() if user.last_active else None,
-        'medications_today': {
-            'taken': meds_taken,
-            'total': meds_total,
-        },
-        'pending_alerts': pending_alerts,
-        'last_mood': last_mood.to_dict() if last_mood else None,
+    def generate():
+        try:
+            yield f'retry: 3000\nevent: ready\ndata: {json.dumps({"user_ids": user_ids})}\n\n'
+            for event in backlog:
+                yield format_event(event)
+            while True:
+                event = subscription.get(SSE_KEEPALIVE)
+                if event:
+                    yield format_event(event)
+                elif subscription.closed:
+                    return
+                else:
+                    yield ': keep-alive\n\n'
+        finally:
+            event_broker.unsubscribe(subscription)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
     })
 
 
@@ -1254,6 +4041,7 @@ def get_user_summary(current_caregiver, user_id):
 
 @app.route('/api/appointments', methods=['GET'])
 @token_required
+@conditional_get('appointments')
 def get_appointments(current_user):
     """Listar consultas"""
     status = request.args.get('status', 'scheduled')
@@ -1285,6 +4073,7 @@ def create_appointment(current_user):
     )
     db.session.add(appointment)
     db.session.commit()
+    appointment_scheduler.schedule(appointment)
     
     return jsonify(appointment.to_dict()), 201
 
@@ -1316,6 +4105,7 @@ def update_appointment(current_user, appointment_id):
         appointment.reminder_hours_before = data['reminder_hours_before']
     
     db.session.commit()
+    appointment_scheduler.schedule(appointment)
     return jsonify(appointment.to_dict())
 
 
@@ -1326,6 +4116,7 @@ def delete_appointment(current_user, appointment_id):
     appointment = Appointment.query.filter_by(id=appointment_id, user_id=current_user.id).first_or_404()
     db.session.delete(appointment)
     db.session.commit()
+    appointment_scheduler.cancel(appointment_id)
     return jsonify({'message': 'Consulta eliminada'})
 
 
@@ -1344,26 +4135,227 @@ def get_upcoming_appointments(current_user):
 
 # ==================== MEDIÇÕES DE SAÚDE ====================
 
+HEALTH_READING_TYPES = ['blood_pressure', 'glucose', 'weight', 'temperature', 'heart_rate', 'oxygen']
+
+
+def note_latest_reading(reading):
+    """
+    Atualizar health_reading_latest após inserir uma medição (sem commit)
+    
+    A medição tem de já ter ID (flush feito).
+    """
+    latest = HealthReadingLatest.query.get((reading.user_id, reading.reading_type))
+    
+    if latest is None:
+        try:
+            with db.session.begin_nested():
+                db.session.add(HealthReadingLatest(
+                    user_id=reading.user_id,
+                    reading_type=reading.reading_type,
+                    reading_id=reading.id,
+                    measured_at=reading.measured_at,
+                ))
+            return
+        except IntegrityError:
+            # Inserção concorrente para o mesmo tipo: comparar com a que ganhou
+            latest = HealthReadingLatest.query.get((reading.user_id, reading.reading_type))
+    
+    if (reading.measured_at, reading.id) > (latest.measured_at, latest.reading_id):
+        latest.reading_id = reading.id
+        latest.measured_at = reading.measured_at
+
+
+def refresh_latest_reading(user_id, reading_type):
+    """Recalcular a última medição de um tipo (ex: após eliminar a atual, sem commit)"""
+    reading = HealthReading.query.filter_by(
+        user_id=user_id,
+        reading_type=reading_type
+    ).order_by(HealthReading.measured_at.desc(), HealthReading.id.desc()).first()
+    latest = HealthReadingLatest.query.get((user_id, reading_type))
+    
+    if reading is None:
+        if latest:
+            db.session.delete(latest)
+    elif latest is None:
+        db.session.add(HealthReadingLatest(
+            user_id=user_id,
+            reading_type=reading_type,
+            reading_id=reading.id,
+            measured_at=reading.measured_at,
+        ))
+    else:
+        latest.reading_id = reading.id
+        latest.measured_at = reading.measured_at
+
+
+ROLLUP_RESOLUTIONS = ('hour', 'day')
+
+
+def rollup_bucket(resolution, when):
+    """Início do intervalo (hora ou dia) a que pertence um instante"""
+    if resolution == 'hour':
+        return when.replace(minute=0, second=0, microsecond=0)
+    return when.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def increment_rollup(user_id, reading_type, resolution, bucket_start, values):
+    """
+    Somar medições a um intervalo de agregados (sem commit)
+    
+    Args:
+        values: Lista de pares (value_primary, value_secondary)
+    """
+    primaries = [v[0] for v in values]
+    secondaries = [v[1] for v in values if v[1] is not None]
+    low, high = min(primaries), max(primaries)
+    key = dict(
+        user_id=user_id,
+        reading_type=reading_type,
+        resolution=resolution,
+        bucket_start=bucket_start,
+    )
+    
+    # Incremento atómico no SQL; se o intervalo ainda não existe, inserir
+    for _ in range(2):
+        updated = HealthReadingRollup.query.filter_by(**key).update({
+            'count': HealthReadingRollup.count + len(primaries),
+            'sum_primary': HealthReadingRollup.sum_primary + sum(primaries),
+            'min_primary': db.case((HealthReadingRollup.min_primary < low, HealthReadingRollup.min_primary), else_=low),
+            'max_primary': db.case((HealthReadingRollup.max_primary > high, HealthReadingRollup.max_primary), else_=high),
+            'count_secondary': HealthReadingRollup.count_secondary + len(secondaries),
+            'sum_secondary': HealthReadingRollup.sum_secondary + sum(secondaries),
+        }, synchronize_session=False)
+        if updated:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(HealthReadingRollup(
+                    count=len(primaries),
+                    sum_primary=sum(primaries),
+                    min_primary=low,
+                    max_primary=high,
+                    count_secondary=len(secondaries),
+                    sum_secondary=sum(secondaries),
+                    **key
+                ))
+            return
+        except IntegrityError:
+            # Criado em simultâneo por outro pedido: repetir o UPDATE
+            continue
+
+
+def add_to_rollups(reading):
+    """Somar uma medição nova aos agregados hora/dia (sem commit)"""
+    for resolution in ROLLUP_RESOLUTIONS:
+        increment_rollup(
+            reading.user_id,
+            reading.reading_type,
+            resolution,
+            rollup_bucket(resolution, reading.measured_at),
+            [(reading.value_primary, reading.value_secondary)]
+        )
+
+
+def rebuild_rollups(user_id, reading_type, measured_at):
+    """Recalcular a partir das medições os intervalos que contêm um instante (ex: após eliminar)"""
+    for resolution in ROLLUP_RESOLUTIONS:
+        bucket_start = rollup_bucket(resolution, measured_at)
+        bucket_end = bucket_start + (timedelta(hours=1) if resolution == 'hour' else timedelta(days=1))
+        
+        count, sum_primary, min_primary, max_primary, count_secondary, sum_secondary = db.session.query(
+            db.func.count(HealthReading.id),
+            db.func.sum(HealthReading.value_primary),
+            db.func.min(HealthReading.value_primary),
+            db.func.max(HealthReading.value_primary),
+            db.func.count(HealthReading.value_secondary),
+            db.func.sum(HealthReading.value_secondary),
+        ).filter(
+            HealthReading.user_id == user_id,
+            HealthReading.reading_type == reading_type,
+            HealthReading.measured_at >= bucket_start,
+            HealthReading.measured_at < bucket_end
+        ).one()
+        
+        rollup = HealthReadingRollup.query.get((user_id, reading_type, resolution, bucket_start))
+        if not count:
+            if rollup:
+                db.session.delete(rollup)
+            continue
+        if not rollup:
+            rollup = HealthReadingRollup(
+                user_id=user_id,
+                reading_type=reading_type,
+                resolution=resolution,
+                bucket_start=bucket_start,
+            )
+            db.session.add(rollup)
+        rollup.count = count
+        rollup.sum_primary = sum_primary
+        rollup.min_primary = min_primary
+        rollup.max_primary = max_primary
+        rollup.count_secondary = count_secondary
+        rollup.sum_secondary = sum_secondary or 0
+
+
 @app.route('/api/health/readings', methods=['GET'])
 @token_required
 def get_health_readings(current_user):
-    """Listar medições de saúde"""
+    """
+    Listar medições de saúde
+    
+    Query: type, from, to (ISO 8601) e resolution (raw, hour, day).
+    Com resolution=hour/day os dados vêm dos agregados e não das medições;
+    em raw a lista é paginada (cursor, limit, since, until) sobre measured_at.
+    """
     reading_type = request.args.get('type')
-    limit = request.args.get('limit', 50, type=int)
+    resolution = request.args.get('resolution', 'raw')
+    
+    try:
+        date_from = parse_datetime_arg('from')
+        date_to = parse_datetime_arg('to')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if resolution in ROLLUP_RESOLUTIONS:
+        if not reading_type:
+            return jsonify({'error': 'type é obrigatório com resolution'}), 400
+        
+        query = HealthReadingRollup.query.filter_by(
+            user_id=current_user.id,
+            reading_type=reading_type,
+            resolution=resolution
+        )
+        if date_from:
+            query = query.filter(HealthReadingRollup.bucket_start >= rollup_bucket(resolution, date_from))
+        if date_to:
+            query = query.filter(HealthReadingRollup.bucket_start < date_to)
+        
+        buckets = query.order_by(HealthReadingRollup.bucket_start).all()
+        return jsonify([b.to_dict() for b in buckets])
+    
+    if resolution != 'raw':
+        return jsonify({'error': f'Resolução desconhecida: {resolution}'}), 400
     
     query = HealthReading.query.filter_by(user_id=current_user.id)
     
     if reading_type:
         query = query.filter_by(reading_type=reading_type)
+    if date_from:
+        query = query.filter(HealthReading.measured_at >= date_from)
+    if date_to:
+        query = query.filter(HealthReading.measured_at < date_to)
     
-    readings = query.order_by(HealthReading.measured_at.desc()).limit(limit).all()
-    return jsonify([r.to_dict() for r in readings])
+    try:
+        readings, next_cursor = paginate(query, HealthReading.measured_at, HealthReading.id, default_limit=50)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return paginated_response([r.to_dict() for r in readings], next_cursor)
 
 
 @app.route('/api/health/readings', methods=['POST'])
 @token_required
 def create_health_reading(current_user):
-    """Registar nova medição de saúde"""
+    """Registar nova medição de saúde (repetida: devolve a já gravada)"""
     data = request.get_json()
     
     reading = HealthReading(
@@ -1373,20 +4365,185 @@ def create_health_reading(current_user):
         value_secondary=data.get('value_secondary'),
         unit=data.get('unit'),
         notes=data.get('notes'),
-        measured_at=datetime.strptime(data['measured_at'], '%Y-%m-%dT%H:%M') if data.get('measured_at') else datetime.utcnow(),
+        measured_at=parse_datetime(data['measured_at']) if data.get('measured_at') else datetime.utcnow(),
     )
-    db.session.add(reading)
+    try:
+        with db.session.begin_nested():
+            db.session.add(reading)
+    except IntegrityError:
+        # Mesmo tipo e measured_at já gravados (índice único)
+        existing = HealthReading.query.filter_by(
+            user_id=current_user.id,
+            reading_type=reading.reading_type,
+            measured_at=reading.measured_at
+        ).first()
+        return jsonify(existing.to_dict()), 200
+    
+    note_latest_reading(reading)
+    add_to_rollups(reading)
     db.session.commit()
     
     return jsonify(reading.to_dict()), 201
 
 
+def insert_health_readings(rows):
+    """
+    Inserir medições num único executemany, ignorando as já gravadas (sem commit)
+    
+    Se um pedido concorrente gravou entretanto alguma delas (índice único
+    em user_id, reading_type, measured_at), repete linha a linha, cada uma
+    no seu savepoint, e salta as repetidas.
+    
+    Returns:
+        list: As linhas efetivamente inseridas
+    """
+    try:
+        with db.session.begin_nested():
+            db.session.execute(db.insert(HealthReading), rows)
+        return rows
+    except IntegrityError:
+        inserted = []
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(db.insert(HealthReading), [row])
+                inserted.append(row)
+            except IntegrityError:
+                pass
+        return inserted
+
+
+@app.route('/api/health/readings/batch', methods=['POST'])
+@token_required
+def create_health_readings_batch(current_user):
+    """
+    Registar várias medições de uma vez (sincronização de dispositivos)
+    
+    Corpo: lista JSON (ou {"readings": [...]}) ou NDJSON
+    (Content-Type application/x-ndjson), uma medição por linha. Medições
+    repetidas (mesmo tipo e measured_at, no lote, já gravadas ou gravadas
+    em simultâneo por outro pedido) são ignoradas e as válidas são inseridas
+    num único executemany (ver insert_health_readings).
+    """
+    errors = []
+    
+    if request.mimetype in ('application/x-ndjson', 'application/ndjson'):
+        items = []
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                errors.append({'index': len(items), 'error': 'JSON inválido'})
+                items.append(None)
+            if len(items) > HEALTH_BATCH_MAX:
+                break
+    else:
+        data = request.get_json(silent=True)
+        items = data.get('readings') if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            return jsonify({'error': 'Esperada uma lista de medições'}), 400
+    
+    if len(items) > HEALTH_BATCH_MAX:
+        return jsonify({'error': f'Máximo de {HEALTH_BATCH_MAX} medições por pedido'}), 413
+    
+    # Validação e normalização
+    now = datetime.utcnow()
+    rows = {}
+    for index, item in enumerate(items):
+        if item is None:
+            continue
+        try:
+            field = 'reading_type'
+            reading_type = item['reading_type']
+            if not isinstance(reading_type, str) or not reading_type or len(reading_type) > 50:
+                raise ValueError()
+            field = 'value_primary'
+            value_primary = float(item['value_primary'])
+            field = 'value_secondary'
+            value_secondary = item.get('value_secondary')
+            value_secondary = float(value_secondary) if value_secondary is not None else None
+            field = 'measured_at'
+            measured_at = parse_datetime(item['measured_at']) if item.get('measured_at') else now
+        except KeyError as e:
+            errors.append({'index': index, 'error': f'{e.args[0]} é obrigatório'})
+            continue
+        except (TypeError, ValueError, AttributeError):
+            errors.append({'index': index, 'error': f'{field} inválido'})
+            continue
+        
+        # Duplicados dentro do próprio lote: fica a última ocorrência
+        rows[(reading_type, measured_at)] = {
+            'user_id': current_user.id,
+            'reading_type': reading_type,
+            'value_primary': value_primary,
+            'value_secondary': value_secondary,
+            'unit': item.get('unit'),
+            'notes': item.get('notes'),
+            'measured_at': measured_at,
+            'created_at': now,
+        }
+    
+    if not rows:
+        status = 400 if errors else 200
+        return jsonify({'inserted': 0, 'duplicates': 0, 'errors': errors}), status
+    
+    # Duplicados já gravados (uma query sobre o intervalo do lote)
+    keys = list(rows.keys())
+    existing = db.session.query(HealthReading.reading_type, HealthReading.measured_at).filter(
+        HealthReading.user_id == current_user.id,
+        HealthReading.reading_type.in_({k[0] for k in keys}),
+        HealthReading.measured_at >= min(k[1] for k in keys),
+        HealthReading.measured_at <= max(k[1] for k in keys)
+    ).all()
+    for key in existing:
+        rows.pop(tuple(key), None)
+    
+    new_rows = insert_health_readings(list(rows.values())) if rows else []
+    duplicates = len(items) - len(errors) - len(new_rows)
+    if new_rows:
+        # Agregados (só das linhas inseridas): um incremento por intervalo (não por medição)
+        buckets = {}
+        for row in new_rows:
+            for resolution in ROLLUP_RESOLUTIONS:
+                key = (row['reading_type'], resolution, rollup_bucket(resolution, row['measured_at']))
+                buckets.setdefault(key, []).append((row['value_primary'], row['value_secondary']))
+        for (reading_type, resolution, bucket_start), values in buckets.items():
+            increment_rollup(current_user.id, reading_type, resolution, bucket_start, values)
+        
+        for reading_type in {row['reading_type'] for row in new_rows}:
+            refresh_latest_reading(current_user.id, reading_type)
+        
+        db.session.commit()
+    
+    return jsonify({
+        'inserted': len(new_rows),
+        'duplicates': duplicates,
+        'errors': errors,
+    }), 201
+
+
 @app.route('/api/health/readings/<int:reading_id>', methods=['DELETE'])
 @token_required
 def delete_health_reading(current_user, reading_id):
     """Eliminar medição de saúde"""
     reading = HealthReading.query.filter_by(id=reading_id, user_id=current_user.id).first_or_404()
-    db.session.delete(reading)
+    latest = HealthReadingLatest.query.get((reading.user_id, reading.reading_type))
+    
+    if latest and latest.reading_id == reading.id:
+        # Era a última deste tipo: apontar para a anterior antes de eliminar
+        db.session.delete(latest)
+        db.session.flush()
+        db.session.delete(reading)
+        db.session.flush()
+        refresh_latest_reading(reading.user_id, reading.reading_type)
+    else:
+        db.session.delete(reading)
+        db.session.flush()
+    
+    rebuild_rollups(reading.user_id, reading.reading_type, reading.measured_at)
     db.session.commit()
     return jsonify({'message': 'Medição eliminada'})
 
@@ -1395,49 +4552,67 @@ def delete_health_reading(current_user, reading_id):
 @token_required
 def get_latest_readings(current_user):
     """Obter última medição de cada tipo"""
-    types = ['blood_pressure', 'glucose', 'weight', 'temperature', 'heart_rate', 'oxygen']
-    latest = {}
-    
-    for t in types:
-        reading = HealthReading.query.filter_by(
-            user_id=current_user.id,
-            reading_type=t
-        ).order_by(HealthReading.measured_at.desc()).first()
-        
-        if reading:
-            latest[t] = reading.to_dict()
+    readings = HealthReading.query.join(
+        HealthReadingLatest, HealthReadingLatest.reading_id == HealthReading.id
+    ).filter(
+        HealthReadingLatest.user_id == current_user.id,
+        HealthReadingLatest.reading_type.in_(HEALTH_READING_TYPES)
+    ).all()
     
-    return jsonify(latest)
+    return jsonify({r.reading_type: r.to_dict() for r in readings})
 
 
 @app.route('/api/health/readings/summary', methods=['GET'])
 @token_required
 def get_health_summary(current_user):
     """Obter resumo de saúde (médias, últimas medições)"""
-    from sqlalchemy import func
-    
     # Últimos 30 dias
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
     
-    summary = {}
-    types = ['blood_pressure', 'glucose', 'weight', 'temperature', 'heart_rate', 'oxygen']
+    filters = (
+        HealthReading.user_id == current_user.id,
+        HealthReading.reading_type.in_(HEALTH_READING_TYPES),
+        HealthReading.measured_at >= thirty_days_ago,
+    )
     
-    for t in types:
-        readings = HealthReading.query.filter(
-            HealthReading.user_id == current_user.id,
-            HealthReading.reading_type == t,
-            HealthReading.measured_at >= thirty_days_ago
-        ).all()
-        
-        if readings:
-            values = [r.value_primary for r in readings]
-            summary[t] = {
-                'count': len(readings),
-                'average': round(sum(values) / len(values), 1),
-                'min': min(values),
-                'max': max(values),
-                'latest': readings[-1].to_dict() if readings else None,
-            }
+    # Agregados por tipo (GROUP BY) e última medição por tipo (ROW_NUMBER)
+    aggregates = db.select(
+        HealthReading.reading_type.label('reading_type'),
+        db.func.count(HealthReading.id).label('count'),
+        db.func.avg(HealthReading.value_primary).label('average'),
+        db.func.min(HealthReading.value_primary).label('min'),
+        db.func.max(HealthReading.value_primary).label('max'),
+    ).where(*filters).group_by(HealthReading.reading_type).subquery()
+    
+    ranked = db.select(
+        HealthReading.id.label('id'),
+        db.func.row_number().over(
+            partition_by=HealthReading.reading_type,
+            order_by=(HealthReading.measured_at.desc(), HealthReading.id.desc())
+        ).label('rn'),
+    ).where(*filters).subquery()
+    
+    rows = db.session.query(
+        HealthReading,
+        aggregates.c.count,
+        aggregates.c.average,
+        aggregates.c.min,
+        aggregates.c.max,
+    ).join(
+        ranked, ranked.c.id == HealthReading.id
+    ).join(
+        aggregates, aggregates.c.reading_type == HealthReading.reading_type
+    ).filter(ranked.c.rn == 1).all()
+    
+    summary = {}
+    for latest, count, average, min_value, max_value in rows:
+        summary[latest.reading_type] = {
+            'count': count,
+            'average': round(average, 1),
+            'min': min_value,
+            'max': max_value,
+            'latest': latest.to_dict(),
+        }
     
     return jsonify(summary)
 
@@ -1462,8 +4637,9 @@ def get_alert_config(current_user):
         )
         db.session.add(config)
         db.session.commit()
+        medication_scheduler.plan_day(user_id=current_user.id)
     
-    return jsonify(config.to_dict())
+    return jsonify({**config.to_dict(), 'inactivity_threshold': current_user.inactivity_threshold})
 
 
 @app.route('/api/alerts/config', methods=['PUT'])
@@ -1508,20 +4684,35 @@ def update_alert_config(current_user):
         config.caregiver_ids = ','.join(str(x) for x in data['caregiver_ids']) if data['caregiver_ids'] else None
     if 'is_active' in data:
         config.is_active = data['is_active']
+    if 'inactivity_threshold' in data:
+        if data['inactivity_threshold'] and not current_user.inactivity_threshold:
+            # Só conta a inatividade a partir de agora
+            current_user.inactivity_monitored_since = datetime.utcnow()
+        current_user.inactivity_threshold = data['inactivity_threshold']
     
     db.session.commit()
-    return jsonify(config.to_dict())
+    
+    # Replanear os lembretes pendentes com os novos atrasos
+    medication_scheduler.cancel_user(current_user.id)
+    medication_scheduler.plan_day(user_id=current_user.id)
+    if 'inactivity_threshold' in data:
+        inactivity_detector.update_user(current_user)
+    
+    return jsonify({**config.to_dict(), 'inactivity_threshold': current_user.inactivity_threshold})
 
 
 @app.route('/api/notifications/log', methods=['GET'])
 @token_required
 def get_notification_log(current_user):
-    """Obter histórico de notificações"""
-    limit = request.args.get('limit', 50, type=int)
-    notifications = NotificationLog.query.filter_by(
-        user_id=current_user.id
-    ).order_by(NotificationLog.created_at.desc()).limit(limit).all()
-    return jsonify([n.to_dict() for n in notifications])
+    """Obter histórico de notificações (paginação: cursor, limit, since, until)"""
+    try:
+        notifications, next_cursor = paginate(
+            NotificationLog.query.filter_by(user_id=current_user.id),
+            NotificationLog.created_at, NotificationLog.id, default_limit=50
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return paginated_response([n.to_dict() for n in notifications], next_cursor)
 
 
 # ==================== NOTIFICAÇÕES WHATSAPP ====================
@@ -1587,7 +4778,8 @@ def send_whatsapp_notification(current_user):
         return jsonify({
             'success': True,
             'type': 'emergency',
-            'notifications_sent': len([r for r in results if r.get('success')])
+            'notifications_queued': sum(1 for r in results if r['queued']),
+            'notification_ids': [r['notification_id'] for r in results if r['queued']],
         })
     
     elif notification_type == 'custom':
@@ -1627,91 +4819,321 @@ def notify_all_caregivers(current_user):
     
     return jsonify({
         'success': True,
-        'notifications_sent': len([r for r in results if r.get('success')]),
+        'notifications_queued': sum(1 for r in results if r['queued']),
+        'notification_ids': [r['notification_id'] for r in results if r['queued']],
         'details': results
     })
 
 
+@app.route('/api/notifications/queue', methods=['GET'])
+@metrics_token_required
+def notification_queue_status():
+    """Estado global da fila de notificações (profundidade, latência e envios suprimidos), só para operação"""
+    return jsonify(dict(notification_dispatcher.stats(), throttle=notification_throttle.stats()))
+
+
+# ==================== SINCRONIZAÇÃO INCREMENTAL ====================
+
+def _medication_owner(connection, medication_id):
+    return connection.execute(
+        db.select(Medication.user_id).where(Medication.id == medication_id)
+    ).scalar()
+
+
+# entidade -> (modelo, dono da linha, serialização)
+SYNC_ENTITIES = {
+    'medications': (
+        Medication,
+        lambda connection, target: target.user_id,
+        lambda m: m.to_dict(include_schedules=False),
+    ),
+    'schedules': (
+        MedicationSchedule,
+        lambda connection, target: _medication_owner(connection, target.medication_id),
+        lambda s: {**s.to_dict(), 'medication_id': s.medication_id},
+    ),
+    'medication_logs': (
+        MedicationLog,
+        lambda connection, target: _medication_owner(connection, target.medication_id),
+        lambda l: {**l.to_dict(), 'schedule_id': l.schedule_id},
+    ),
+    'contacts': (Contact, lambda connection, target: target.user_id, lambda c: c.to_dict()),
+    'activities': (
+        Activity,
+        lambda connection, target: target.user_id,
+        lambda a: {**a.to_dict(), 'days_of_week': a.days_of_week},
+    ),
+    'appointments': (Appointment, lambda connection, target: target.user_id, lambda a: a.to_dict()),
+    'chat': (ChatMessage, lambda connection, target: target.user_id, lambda m: m.to_dict()),
+}
+
+
+def _register_sync_listeners(entity, model, owner):
+    def record(operation):
+        def listener(mapper, connection, target):
+            user_id = owner(connection, target)
+            if user_id is None:
+                return
+            connection.execute(SyncChange.__table__.insert().values(
+                user_id=user_id,
+                entity=entity,
+                entity_id=target.id,
+                operation=operation,
+                created_at=datetime.utcnow(),
+            ))
+            # Ao contrário de sync_changes, este contador nunca é limpo
+            users = User.__table__
+            connection.execute(users.update().where(users.c.id == user_id).values(
+                data_version=users.c.data_version + 1
+            ))
+        return listener
+    
+    event.listen(model, 'after_insert', record('upsert'))
+    event.listen(model, 'after_update', record('upsert'))
+    event.listen(model, 'after_delete', record('delete'))
+
+
+for _entity, (_model, _owner, _) in SYNC_ENTITIES.items():
+    _register_sync_listeners(_entity, _model, _owner)
+
+
+def _sync_query(entity, user_id):
+    """Query das linhas de uma entidade pertencentes a um utilizador"""
+    model = SYNC_ENTITIES[entity][0]
+    if model in (MedicationSchedule, MedicationLog):
+        return model.query.join(Medication, model.medication_id == Medication.id).filter(Medication.user_id == user_id)
+    return model.query.filter(model.user_id == user_id)
+
+
+def build_sync_snapshot(user_id):
+    """Estado completo das entidades sincronizadas de um utilizador"""
+    log_window = datetime.utcnow() - timedelta(days=SYNC_LOG_DAYS)
+    changes = {}
+    for entity, (model, _, serialize) in SYNC_ENTITIES.items():
+        query = _sync_query(entity, user_id)
+        if model is MedicationLog:
+            query = query.filter(MedicationLog.scheduled_time >= log_window)
+        elif model is ChatMessage:
+            query = query.order_by(ChatMessage.created_at.desc()).limit(50)
+        changes[entity] = {'upserted': [serialize(row) for row in query.all()], 'deleted': []}
+    return changes
+
+
+def build_sync_changes(user_id, since, now=None):
+    """
+    Alterações desde um token (None se forem demasiadas e for melhor um snapshot)
+    
+    Os ids vêm de uma sequência e, com transações concorrentes, um id mais
+    baixo pode ficar visível depois de um mais alto já ter sido servido.
+    Por isso as alterações dos últimos SYNC_OVERLAP_SECONDS segundos são
+    sempre reenviadas, mesmo abaixo do token (aplicá-las de novo é inócuo:
+    o cliente substitui ou apaga pelo id).
+    
+    Returns:
+        tuple: (dict por entidade, token mais recente)
+    """
+    overlap_since = (now or datetime.utcnow()) - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+    rows = db.session.query(
+        SyncChange.id, SyncChange.entity, SyncChange.entity_id, SyncChange.operation
+    ).filter(
+        SyncChange.user_id == user_id,
+        db.or_(SyncChange.id > since, SyncChange.created_at >= overlap_since)
+    ).order_by(SyncChange.id).limit(SYNC_MAX_CHANGES + 1).all()
+    
+    if len(rows) > SYNC_MAX_CHANGES:
+        return None, since
+    
+    # Última operação por linha
+    latest = {}
+    for _, entity, entity_id, operation in rows:
+        latest[(entity, entity_id)] = operation
+    token = max(rows[-1][0], since) if rows else since
+    
+    changes = {}
+    for entity, (model, _, serialize) in SYNC_ENTITIES.items():
+        upserted_ids = [i for (e, i), op in latest.items() if e == entity and op == 'upsert']
+        deleted_ids = [i for (e, i), op in latest.items() if e == entity and op == 'delete']
+        if not upserted_ids and not deleted_ids:
+            continue
+        upserted = _sync_query(entity, user_id).filter(model.id.in_(upserted_ids)).all() if upserted_ids else []
+        changes[entity] = {'upserted': [serialize(row) for row in upserted], 'deleted': deleted_ids}
+    
+    return changes, token
+
+
+@app.route('/api/sync', methods=['GET'])
+@token_required
+def sync(current_user):
+    """
+    Sincronização incremental para a PWA
+    
+    Sem since (ou com um token inválido, ou anterior às alterações já
+    apagadas por prune_sync_changes) devolve o estado completo; com
+    since=<token> devolve apenas as linhas criadas/alteradas/eliminadas
+    desde então. O token seguinte vem em 'token'.
+    """
+    since = request.args.get('since', type=int)
+    # Tokens da sequência global: um utilizador sem alterações recentes continua
+    # a receber tokens acima do que a limpeza já apagou
+    oldest_token, latest_token = db.session.query(
+        db.func.min(SyncChange.id), db.func.max(SyncChange.id)
+    ).one()
+    latest_token = latest_token or 0
+    # A limpeza apaga por prefixo de id: abaixo do mais antigo que resta pode faltar histórico
+    oldest_token = (oldest_token or 1) - 1
+    
+    changes = None
+    if since is not None and oldest_token <= since <= latest_token:
+        changes, token = build_sync_changes(current_user.id, since)
+    
+    if changes is None:
+        return jsonify({'full': True, 'token': latest_token, 'changes': build_sync_snapshot(current_user.id)})
+    
+    return jsonify({'full': False, 'token': max(token, latest_token), 'changes': changes})
+
+
+def prune_sync_changes(retention_days=SYNC_RETENTION_DAYS, now=None):
+    """
+    Apagar o registo de alterações com mais de retention_days dias
+    
+    Apaga tudo até ao maior id antigo (um prefixo da sequência), para que
+    /api/sync saiba, pelo menor id que resta, que tokens já não servem. A
+    alteração mais recente nunca é apagada: guarda esse limite mesmo quando
+    todo o histórico é antigo.
+    
+    Returns:
+        int: Número de alterações apagadas
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    table = SyncChange.__table__
+    with db.engine.begin() as connection:
+        cutoff_id = connection.execute(
+            db.select(db.func.max(table.c.id)).where(table.c.created_at < cutoff)
+        ).scalar()
+        if cutoff_id is None:
+            return 0
+        latest_id = connection.execute(db.select(db.func.max(table.c.id))).scalar()
+        return connection.execute(table.delete().where(table.c.id <= min(cutoff_id, latest_id - 1))).rowcount
+
+
+class SyncChangePruner:
+    """Limpeza periódica de sync_changes (prune_sync_changes) numa thread"""
+
+    def __init__(self, interval=SYNC_PRUNE_INTERVAL):
+        self.interval = interval
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Arrancar a thread de limpeza (idempotente)"""
+        with self._lock:
+            if self._thread or self.interval <= 0:
+                return
+            self._thread = threading.Thread(target=self._run, name='sync-prune', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                with app.app_context():
+                    removed = prune_sync_changes()
+                if removed:
+                    print(f"Sincronização: {removed} alterações antigas apagadas")
+            except Exception as e:
+                print(f"Erro ao limpar sync_changes: {e}")
+            time.sleep(self.interval)
+
+
+sync_pruner = SyncChangePruner()
+
+
 # ==================== TIPOS DE MEDIÇÕES (para o frontend) ====================
 
+HEALTH_READING_TYPE_CATALOG = [
+    {
+        'id': 'blood_pressure',
+        'name': 'Tensão Arterial',
+        'name_en': 'Blood Pressure',
+        'icon': '❤️',
+        'unit': 'mmHg',
+        'has_secondary': True,
+        'primary_label': 'Sistólica',
+        'secondary_label': 'Diastólica',
+        'normal_range': {'primary': [90, 120], 'secondary': [60, 80]},
+    },
+    {
+        'id': 'glucose',
+        'name': 'Glicemia',
+        'name_en': 'Blood Glucose',
+        'icon': '🩸',
+        'unit': 'mg/dL',
+        'has_secondary': False,
+        'primary_label': 'Valor',
+        'normal_range': {'primary': [70, 100]},
+    },
+    {
+        'id': 'weight',
+        'name': 'Peso',
+        'name_en': 'Weight',
+        'icon': '⚖️',
+        'unit': 'kg',
+        'has_secondary': False,
+        'primary_label': 'Peso',
+    },
+    {
+        'id': 'temperature',
+        'name': 'Temperatura',
+        'name_en': 'Temperature',
+        'icon': '🌡️',
+        'unit': '°C',
+        'has_secondary': False,
+        'primary_label': 'Temperatura',
+        'normal_range': {'primary': [36, 37.5]},
+    },
+    {
+        'id': 'heart_rate',
+        'name': 'Frequência Cardíaca',
+        'name_en': 'Heart Rate',
+        'icon': '💓',
+        'unit': 'bpm',
+        'has_secondary': False,
+        'primary_label': 'Batimentos',
+        'normal_range': {'primary': [60, 100]},
+    },
+    {
+        'id': 'oxygen',
+        'name': 'Saturação de Oxigénio',
+        'name_en': 'Oxygen Saturation',
+        'icon': '💨',
+        'unit': '%',
+        'has_secondary': False,
+        'primary_label': 'SpO2',
+        'normal_range': {'primary': [95, 100]},
+    },
+]
+
+
 @app.route('/api/health/types', methods=['GET'])
 def get_health_reading_types():
-    """Obter tipos de medições disponíveis"""
-    types = [
-        {
-            'id': 'blood_pressure',
-            'name': 'Tensão Arterial',
-            'name_en': 'Blood Pressure',
-            'icon': '❤️',
-            'unit': 'mmHg',
-            'has_secondary': True,
-            'primary_label': 'Sistólica',
-            'secondary_label': 'Diastólica',
-            'normal_range': {'primary': [90, 120], 'secondary': [60, 80]},
-        },
-        {
-            'id': 'glucose',
-            'name': 'Glicemia',
-            'name_en': 'Blood Glucose',
-            'icon': '🩸',
-            'unit': 'mg/dL',
-            'has_secondary': False,
-            'primary_label': 'Valor',
-            'normal_range': {'primary': [70, 100]},
-        },
-        {
-            'id': 'weight',
-            'name': 'Peso',
-            'name_en': 'Weight',
-            'icon': '⚖️',
-            'unit': 'kg',
-            'has_secondary': False,
-            'primary_label': 'Peso',
-        },
-        {
-            'id': 'temperature',
-            'name': 'Temperatura',
-            'name_en': 'Temperature',
-            'icon': '🌡️',
-            'unit': '°C',
-            'has_secondary': False,
-            'primary_label': 'Temperatura',
-            'normal_range': {'primary': [36, 37.5]},
-        },
-        {
-            'id': 'heart_rate',
-            'name': 'Frequência Cardíaca',
-            'name_en': 'Heart Rate',
-            'icon': '💓',
-            'unit': 'bpm',
-            'has_secondary': False,
-            'primary_label': 'Batimentos',
-            'normal_range': {'primary': [60, 100]},
-        },
-        {
-            'id': 'oxygen',
-            'name': 'Saturação de Oxigénio',
-            'name_en': 'Oxygen Saturation',
-            'icon': '💨',
-            'unit': '%',
-            'has_secondary': False,
-            'primary_label': 'SpO2',
-            'normal_range': {'primary': [95, 100]},
-        },
-    ]
-    return jsonify(types)
+    """Obter tipos de medições disponíveis (catálogo estático, em cache no cliente)"""
+    response = jsonify(HEALTH_READING_TYPE_CATALOG)
+    response.add_etag()
+    response.headers['Cache-Control'] = f'public, max-age={HEALTH_TYPES_MAX_AGE}'
+    return response.make_conditional(request)
 
 
 # ==================== INICIALIZAÇÃO ====================
 
 def init_db():
-    """Criar tabelas na base de dados"""
+    """
+    Criar as tabelas em falta e aplicar as migrações (colunas e índices novos
+    em tabelas que já existem). Corre no arranque, antes do gunicorn; um erro
+    interrompe o arranque em vez de servir pedidos com o esquema antigo.
+    """
     with app.app_context():
-        try:
-            db.create_all()
-            print("Base de dados inicializada!")
-        except Exception as e:
-            print(f"Aviso: Não foi possível inicializar BD: {e}")
+        db.create_all()
+        upgrade_db(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
+        print("Base de dados inicializada!")
 
 
 # Inicializar BD automaticamente no primeiro request
@@ -1730,6 +5152,22 @@ def ensure_db_initialized():
             except Exception as e:
                 print(f"Aviso BD: {e}")
         app._db_initialized = True
+        start_background_services()
+
+
+def start_background_services():
+    """Arrancar os serviços em background deste processo"""
+    if MEDICATION_SCHEDULER_ENABLED:
+        medication_scheduler.start()
+    if APPOINTMENT_SCHEDULER_ENABLED:
+        appointment_scheduler.start()
+    if INACTIVITY_DETECTOR_ENABLED:
+        inactivity_detector.start()
+    activity_buffer.start()
+    notification_writer.start()
+    sync_pruner.start()
+    # Novas tentativas e resumos dependem do poller, em qualquer NOTIFICATION_MODE
+    notification_dispatcher.start()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,70 @@
+"""
+Utilitários dos benchmarks: app numa BD temporária (ou BENCH_DATABASE_URL),
+utilizadores de teste e contagem de statements SQL.
+"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def bench_database_url():
+    """BD do benchmark: BENCH_DATABASE_URL (as tabelas são apagadas) ou um SQLite temporário"""
+    return os.environ.get('BENCH_DATABASE_URL') or \
+        'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='seniorcare-bench-'), 'bench.db')
+
+
+def load_app(**env):
+    """
+    Importar app.py com uma BD vazia e sem serviços em background
+    
+    As variáveis de env são lidas na importação (ex: NOTIFICATION_MODE).
+    """
+    os.environ.update({
+        'DATABASE_URL': bench_database_url(),
+        'MEDICATION_SCHEDULER_ENABLED': '0',
+        'APPOINTMENT_SCHEDULER_ENABLED': '0',
+        'INACTIVITY_DETECTOR_ENABLED': '0',
+    })
+    os.environ.update({key: str(value) for key, value in env.items()})
+    sys.path.insert(0, ROOT)
+    import app as module
+    
+    with module.app.app_context():
+        module.db.drop_all()
+        module.db.create_all()
+    # Não arrancar schedulers/threads no primeiro pedido
+    module.app._db_initialized = True
+    return module
+
+
+def register_users(client, count, prefix='+3519'):
+    """Registar count utilizadores; devolve os cabeçalhos Authorization de cada um"""
+    headers = []
+    for i in range(count):
+        response = client.post('/api/auth/register', json={'name': f'Utilizador {i}', 'phone': f'{prefix}{i:08d}'})
+        headers.append({'Authorization': f"Bearer {response.get_json()['token']}"})
+    return headers
+
+
+@contextmanager
+def count_statements(module, kind):
+    """Contar os statements SQL de um tipo (ex: 'UPDATE', 'INSERT') executados no bloco"""
+    from sqlalchemy import event
+    
+    counts = {'statements': 0, 'rows': 0}
+    
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(kind):
+            counts['statements'] += 1
+            counts['rows'] += len(parameters) if executemany else 1
+    
+    with module.app.app_context():
+        engine = module.db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        yield counts
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
@@ -0,0 +1,60 @@
+"""
+Ingestão de medições: /api/health/readings/batch vs um POST por medição
+
+    python benchmarks/health_batch.py --readings 10000
+
+O caminho por linha faz um pedido e um commit por medição; o batch valida
+tudo de uma vez e insere com um único executemany. --per-row limita quantas
+medições passam pelo caminho por linha (o tempo é extrapolado).
+"""
+import argparse
+import contextlib
+import io
+import time
+from datetime import datetime, timedelta
+
+from common import count_statements, load_app, register_users
+
+
+def readings(count, start):
+    return [
+        {'reading_type': 'heart_rate', 'value_primary': 60 + i % 40, 'measured_at': (start + timedelta(minutes=i)).isoformat()}
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readings', type=int, default=10000)
+    parser.add_argument('--per-row', type=int, default=None, help='medições enviadas uma a uma (omissão: todas)')
+    args = parser.parse_args()
+    per_row = min(args.per_row or args.readings, args.readings)
+    
+    module = load_app(HEALTH_BATCH_MAX=max(args.readings, 10000))
+    client = module.app.test_client()
+    headers = register_users(client, 1)[0]
+    
+    items = readings(args.readings, datetime(2026, 1, 1))
+    with count_statements(module, 'INSERT') as inserts:
+        started = time.perf_counter()
+        response = client.post('/api/health/readings/batch', json=items, headers=headers)
+        batch = time.perf_counter() - started
+    assert response.status_code < 400, response.get_json()
+    print(f"batch     {args.readings} medições em {batch:6.2f}s ({args.readings / batch:7.0f}/s), "
+          f"{inserts['statements']} INSERTs, inseridas: {response.get_json()['inserted']}")
+    
+    items = readings(per_row, datetime(2026, 6, 1))
+    with count_statements(module, 'INSERT') as inserts, contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        for item in items:
+            client.post('/api/health/readings', json=item, headers=headers)
+        elapsed = time.perf_counter() - started
+    total = elapsed * args.readings / per_row
+    estimate = '' if per_row == args.readings else f' (extrapolado de {per_row})'
+    print(f"por linha {args.readings} medições em {total:6.2f}s ({args.readings / total:7.0f}/s){estimate}, "
+          f"{inserts['statements']} INSERTs")
+    print(f"batch {total / batch:.0f}x mais rápido")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Heartbeats (/api/user/activity): escrita por pedido vs ActivityBuffer
+
+    python benchmarks/heartbeats.py --users 500 --rounds 10
+
+Compara o caminho antigo (ACTIVITY_FLUSH_INTERVAL=0: um UPDATE + commit por
+heartbeat) com o buffer (um UPDATE ... CASE por lote no flush). Cada ronda
+simula um minuto: todos os utilizadores enviam um heartbeat e, no modo
+buffer, há um flush no fim da ronda.
+"""
+import argparse
+import time
+
+from common import count_statements, load_app, register_users
+
+
+def run(module, client, headers, rounds, buffered):
+    module.ACTIVITY_FLUSH_INTERVAL = 30 if buffered else 0
+    with count_statements(module, 'UPDATE') as updates:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for user_headers in headers:
+                client.post('/api/user/activity', headers=user_headers)
+            if buffered:
+                with module.app.app_context():
+                    module.activity_buffer.flush()
+        elapsed = time.perf_counter() - started
+    return elapsed, updates['statements']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=10)
+    args = parser.parse_args()
+    
+    module = load_app()
+    client = module.app.test_client()
+    headers = register_users(client, args.users)
+    heartbeats = args.users * args.rounds
+    
+    print(f'{heartbeats} heartbeats ({args.users} utilizadores x {args.rounds} rondas)')
+    for label, buffered in (('por pedido', False), ('buffer', True)):
+        elapsed, updates = run(module, client, headers, args.rounds, buffered)
+        print(f'{label:11} {heartbeats / elapsed:8.0f} heartbeats/s  {updates:6} UPDATEs  '
+              f'{updates / args.rounds:8.1f} escritas por minuto simulado')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Notificações a cuidadores: NOTIFICATION_MODE sync vs async vs queue
+
+    python benchmarks/notifications.py --caregivers 5 --latency 0.5
+
+Usa o cliente Twilio local (TWILIO_FAKE=1) com TWILIO_FAKE_LATENCY segundos
+por envio e mede o tempo de resposta de cada endpoint que notifica todos os
+cuidadores. Cada modo corre num processo próprio (o modo é lido na
+importação de app.py).
+"""
+import argparse
+import contextlib
+import io
+import subprocess
+import sys
+import time
+
+from common import load_app, register_users
+
+ENDPOINTS = [
+    ('/api/alerts/emergency', {}),
+    ('/api/notifications/caregivers', {'message': 'Olá'}),
+    ('/api/notifications/whatsapp/send', {'type': 'emergency'}),
+]
+
+
+def measure(args):
+    module = load_app(
+        TWILIO_FAKE=1,
+        TWILIO_FAKE_LATENCY=args.latency,
+        NOTIFICATION_MODE=args.mode,
+        NOTIFICATION_SEND_TIMEOUT=args.timeout,
+    )
+    client = module.app.test_client()
+    headers = register_users(client, 1)[0]
+    with module.app.app_context():
+        user_id = module.User.query.one().id
+        for i in range(args.caregivers):
+            caregiver = module.Caregiver(email=f'cuidador{i}@example.com', name=f'Cuidador {i}', phone=f'+3519100000{i:02d}')
+            caregiver.set_password('segredo')
+            module.db.session.add(caregiver)
+            module.db.session.flush()
+            module.db.session.add(module.CaregiverUser(caregiver_id=caregiver.id, user_id=user_id))
+        module.db.session.commit()
+    
+    for path, body in ENDPOINTS:
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            response = client.post(path, json=body, headers=headers)
+            elapsed = time.perf_counter() - started
+        assert response.status_code < 400, response.get_json()
+        print(f'{args.mode:6} {path:34} {elapsed * 1000:7.0f} ms', flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--caregivers', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.5, help='segundos por envio no cliente Twilio local')
+    parser.add_argument('--timeout', type=float, default=10, help='NOTIFICATION_SEND_TIMEOUT')
+    parser.add_argument('--mode', choices=('sync', 'async', 'queue'), help='medir só este modo (neste processo)')
+    args = parser.parse_args()
+    
+    if args.mode:
+        measure(args)
+        return
+    
+    print(f'{args.caregivers} cuidadores, {args.latency * 1000:.0f} ms por envio')
+    for mode in ('sync', 'async', 'queue'):
+        result = subprocess.run([
+            sys.executable, __file__, '--mode', mode, '--caregivers', str(args.caregivers),
+            '--latency', str(args.latency), '--timeout', str(args.timeout),
+        ], check=True, capture_output=True, text=True)
+        # Só as medições (sem os logs de arranque e de envio da app)
+        print(''.join(line for line in result.stdout.splitlines(keepends=True) if line.startswith(mode)), end='')
+
+
+if __name__ == '__main__':
+    main()
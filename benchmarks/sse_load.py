@@ -0,0 +1,130 @@
+"""
+Teste de carga de /api/caregiver/stream (SSE) num worker gevent
+
+    python benchmarks/sse_load.py --connections 3000
+
+Arranca gunicorn -k gevent (um worker) numa BD temporária, abre N streams
+idle do mesmo cuidador, mede a memória do worker e o tempo até um alerta de
+emergência chegar a todos. Precisa de gunicorn e gevent (requirements.txt)
+e de um limite de ficheiros abertos acima de N (ulimit -n).
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import urllib.request
+
+from common import ROOT, load_app
+
+
+def post(base_url, path, body, token=None):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    request = urllib.request.Request(base_url + path, data=json.dumps(body).encode(), headers=headers)
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+def wait_until_up(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base_url + '/healthz')
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn não arrancou')
+
+
+def worker_rss_mb(master_pid):
+    """Memória residente (MB) do worker gunicorn (Linux)"""
+    children = subprocess.run(['pgrep', '-P', str(master_pid)], capture_output=True, text=True).stdout.split()
+    with open(f'/proc/{children[0]}/status') as status:
+        return int(status.read().split('VmRSS:')[1].split()[0]) // 1024
+
+
+async def stream(port, token, ready, delivered, connecting):
+    # Abrir aos poucos: milhares de connect() de uma vez transbordam o backlog do socket
+    async with connecting:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(f'GET /api/caregiver/stream?access_token={token} HTTP/1.1\r\n'
+                     f'Host: localhost\r\nAccept: text/event-stream\r\n\r\n'.encode())
+        await writer.drain()
+        buffer = b''
+        while b'event: ready' not in buffer:
+            buffer += await reader.read(4096)
+    ready.append(time.perf_counter())
+    while b'event: alert' not in buffer:
+        buffer += await reader.read(4096)
+    delivered.append(time.perf_counter())
+    writer.close()
+
+
+async def run(args, base_url, caregiver_token, user_token, master_pid):
+    ready, delivered = [], []
+    connecting = asyncio.Semaphore(100)
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(stream(args.port, caregiver_token, ready, delivered, connecting))
+             for _ in range(args.connections)]
+    while len(ready) < args.connections:
+        failed = [task for task in tasks if task.done() and task.exception()]
+        if failed:
+            raise RuntimeError(f'{len(failed)} streams falharam: {failed[0].exception()!r}')
+        await asyncio.sleep(0.1)
+    print(f'{args.connections} streams abertos em {time.perf_counter() - started:.1f}s')
+    
+    await asyncio.sleep(args.idle)
+    print(f'worker após {args.idle:.0f}s idle: {worker_rss_mb(master_pid)} MB RSS')
+    
+    sent = time.perf_counter()
+    await asyncio.to_thread(post, base_url, '/api/alerts/emergency', {}, user_token)
+    await asyncio.gather(*tasks)
+    latencies = sorted(when - sent for when in delivered)
+    print(f'alerta entregue a {len(latencies)} streams: p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, '
+          f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:.0f} ms, max {latencies[-1] * 1000:.0f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=3000)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--idle', type=float, default=5, help='segundos com os streams parados antes do alerta')
+    args = parser.parse_args()
+    
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = args.connections + 1000
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+    
+    module = load_app(TWILIO_FAKE=1, NOTIFICATION_MODE='queue')
+    client = module.app.test_client()
+    user = client.post('/api/auth/register', json={'name': 'Maria', 'phone': '+351912345678'}).get_json()
+    caregiver = client.post('/api/caregiver/register', json={
+        'email': 'filha@example.com', 'name': 'Filha', 'password': 'segredo',
+    }).get_json()
+    with module.app.app_context():
+        module.db.session.add(module.CaregiverUser(caregiver_id=caregiver['caregiver']['id'], user_id=user['user']['id']))
+        module.db.session.commit()
+    
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-k', 'gevent', '-w', '1',
+         '--worker-connections', str(wanted), '--backlog', '8192',
+         '-b', f'127.0.0.1:{args.port}', '--chdir', ROOT, 'app:app'],
+        env=dict(os.environ), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f'http://127.0.0.1:{args.port}'
+    try:
+        wait_until_up(base_url)
+        asyncio.run(run(args, base_url, caregiver['token'], user['token'], server.pid))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Tabela medication_reminders (agendador de lembretes de medicação)
+
+Revision ID: 1d4e7a9b3c20
+Revises:
+Create Date: 2026-10-18 14:35:00.000000
+
+As restantes tabelas foram criadas com db.create_all() (sem migração
+inicial); esta migração só cria a tabela se ainda não existir.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1d4e7a9b3c20'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'medication_reminders' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table(
+        'medication_reminders',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('medication_id', sa.Integer(), sa.ForeignKey('medications.id'), nullable=False),
+        sa.Column('schedule_id', sa.Integer(), sa.ForeignKey('medication_schedules.id'), nullable=False),
+        sa.Column('scheduled_time', sa.DateTime(), nullable=False),
+        sa.Column('alert_level', sa.String(length=20), nullable=False),
+        sa.Column('fire_at', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('fired_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('schedule_id', 'scheduled_time', 'alert_level', name='uq_medication_reminders_dose_level'),
+    )
+    op.create_index('ix_medication_reminders_status_fire_at', 'medication_reminders', ['status', 'fire_at'])
+
+
+def downgrade():
+    op.drop_index('ix_medication_reminders_status_fire_at', table_name='medication_reminders')
+    op.drop_table('medication_reminders')
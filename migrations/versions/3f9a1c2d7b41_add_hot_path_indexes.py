@@ -0,0 +1,66 @@
+"""Índices compostos para as consultas mais frequentes
+
+Revision ID: 3f9a1c2d7b41
+Revises: 1d4e7a9b3c20
+Create Date: 2026-10-18 14:40:00.000000
+
+As tabelas foram criadas com db.create_all() (sem migração inicial), por
+isso esta migração só cria índices em tabelas que já existem e ignora os
+que já existam (ex: BD nova criada com os modelos atuais).
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c2d7b41'
+down_revision = '1d4e7a9b3c20'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_caregiver_users_user_id_notify_alerts', 'caregiver_users', ['user_id', 'notify_alerts'], False),
+    ('ix_medications_user_id_is_active', 'medications', ['user_id', 'is_active'], False),
+    ('uq_medication_logs_dose', 'medication_logs', ['medication_id', 'schedule_id', 'scheduled_time'], True),
+    ('ix_alerts_user_id_created_at', 'alerts', ['user_id', 'created_at'], False),
+    ('ix_mood_logs_user_id_created_at', 'mood_logs', ['user_id', 'created_at'], False),
+    ('ix_chat_messages_user_id_created_at', 'chat_messages', ['user_id', 'created_at'], False),
+    ('ix_health_readings_user_type_measured_at', 'health_readings', ['user_id', 'reading_type', 'measured_at'], False),
+    ('ix_notification_logs_user_id_created_at', 'notification_logs', ['user_id', 'created_at'], False),
+    ('ix_notification_logs_status', 'notification_logs', ['status'], False),
+]
+
+
+def _existing_indexes(inspector, table):
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+
+    if 'medication_logs' in tables:
+        # Remover registos duplicados da mesma dose antes do índice único,
+        # mantendo o registo 'taken' (se houver) e, entre esses, o mais recente
+        op.execute(
+            'DELETE FROM medication_logs WHERE id NOT IN ('
+            "SELECT COALESCE(MAX(CASE WHEN status = 'taken' THEN id END), MAX(id)) FROM medication_logs "
+            'GROUP BY medication_id, schedule_id, scheduled_time)'
+        )
+
+    for name, table, columns, unique in INDEXES:
+        if table in tables and name not in _existing_indexes(inspector, table):
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+
+    for name, table, _, _ in reversed(INDEXES):
+        if table in tables and name in _existing_indexes(inspector, table):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,44 @@
+"""Projeção health_reading_latest (última medição por utilizador e tipo)
+
+Revision ID: 6b2f8e0c4a17
+Revises: 3f9a1c2d7b41
+Create Date: 2026-10-18 14:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b2f8e0c4a17'
+down_revision = '3f9a1c2d7b41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if 'health_reading_latest' not in sa.inspect(bind).get_table_names():
+        op.create_table(
+            'health_reading_latest',
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('reading_type', sa.String(length=50), nullable=False),
+            sa.Column('reading_id', sa.Integer(), sa.ForeignKey('health_readings.id'), nullable=False),
+            sa.Column('measured_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('user_id', 'reading_type'),
+        )
+
+    # Preencher a partir das medições existentes
+    if not bind.execute(sa.text('SELECT COUNT(*) FROM health_reading_latest')).scalar():
+        op.execute(
+            'INSERT INTO health_reading_latest (user_id, reading_type, reading_id, measured_at) '
+            'SELECT user_id, reading_type, id, measured_at FROM ('
+            'SELECT id, user_id, reading_type, measured_at, ROW_NUMBER() OVER ('
+            'PARTITION BY user_id, reading_type ORDER BY measured_at DESC, id DESC) AS rn '
+            'FROM health_readings WHERE measured_at IS NOT NULL) ranked '
+            'WHERE rn = 1'
+        )
+
+
+def downgrade():
+    op.drop_table('health_reading_latest')
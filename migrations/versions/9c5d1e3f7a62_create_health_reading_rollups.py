@@ -0,0 +1,67 @@
+"""Agregados health_reading_rollups (hora/dia)
+
+Revision ID: 9c5d1e3f7a62
+Revises: 6b2f8e0c4a17
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c5d1e3f7a62'
+down_revision = '6b2f8e0c4a17'
+branch_labels = None
+depends_on = None
+
+
+BUCKETS = {
+    'postgresql': {
+        'hour': "date_trunc('hour', measured_at)",
+        'day': "date_trunc('day', measured_at)",
+    },
+    'sqlite': {
+        'hour': "strftime('%Y-%m-%d %H:00:00.000000', measured_at)",
+        'day': "strftime('%Y-%m-%d 00:00:00.000000', measured_at)",
+    },
+}
+
+
+def upgrade():
+    bind = op.get_bind()
+    if 'health_reading_rollups' not in sa.inspect(bind).get_table_names():
+        op.create_table(
+            'health_reading_rollups',
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('reading_type', sa.String(length=50), nullable=False),
+            sa.Column('resolution', sa.String(length=10), nullable=False),
+            sa.Column('bucket_start', sa.DateTime(), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False),
+            sa.Column('sum_primary', sa.Float(), nullable=False),
+            sa.Column('min_primary', sa.Float(), nullable=True),
+            sa.Column('max_primary', sa.Float(), nullable=True),
+            sa.Column('count_secondary', sa.Integer(), nullable=False),
+            sa.Column('sum_secondary', sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint('user_id', 'reading_type', 'resolution', 'bucket_start'),
+        )
+
+    # Preencher a partir das medições existentes
+    buckets = BUCKETS.get(bind.dialect.name)
+    if not buckets or bind.execute(sa.text('SELECT COUNT(*) FROM health_reading_rollups')).scalar():
+        return
+
+    for resolution, bucket in buckets.items():
+        op.execute(
+            'INSERT INTO health_reading_rollups (user_id, reading_type, resolution, bucket_start, count, '
+            'sum_primary, min_primary, max_primary, count_secondary, sum_secondary) '
+            f"SELECT user_id, reading_type, '{resolution}', {bucket}, COUNT(id), "
+            'SUM(value_primary), MIN(value_primary), MAX(value_primary), '
+            'COUNT(value_secondary), COALESCE(SUM(value_secondary), 0) '
+            'FROM health_readings WHERE measured_at IS NOT NULL '
+            f'GROUP BY user_id, reading_type, {bucket}'
+        )
+
+
+def downgrade():
+    op.drop_table('health_reading_rollups')
@@ -0,0 +1,35 @@
+"""sync_changes com AUTOINCREMENT no SQLite (ids apagados não são reutilizados)
+
+Revision ID: a3c8e5f2d190
+Revises: f5a3d8c1e607
+Create Date: 2026-10-18 21:00:00.000000
+
+Os tokens de /api/sync são ids de sync_changes. Sem AUTOINCREMENT o SQLite
+volta a usar ids apagados pela limpeza e os tokens recuam. Em PostgreSQL a
+sequência nunca reutiliza ids, pelo que nada muda.
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c8e5f2d190'
+down_revision = 'f5a3d8c1e607'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('sync_changes', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': True}):
+        pass
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('sync_changes', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': False}):
+        pass
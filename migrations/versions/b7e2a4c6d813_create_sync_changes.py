@@ -0,0 +1,38 @@
+"""Tabela sync_changes (sincronização incremental da PWA)
+
+Revision ID: b7e2a4c6d813
+Revises: 9c5d1e3f7a62
+Create Date: 2026-10-18 15:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2a4c6d813'
+down_revision = '9c5d1e3f7a62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'sync_changes' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table(
+        'sync_changes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('entity', sa.String(length=30), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('operation', sa.String(length=10), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_sync_changes_user_id_id', 'sync_changes', ['user_id', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_sync_changes_user_id_id', table_name='sync_changes')
+    op.drop_table('sync_changes')
@@ -0,0 +1,39 @@
+"""Versão dos dados por utilizador (users.data_version, para ETags)
+
+Revision ID: c6f1d9b3e742
+Revises: a3c8e5f2d190
+Create Date: 2026-10-18 21:30:00.000000
+
+As ETags usavam o maior id de sync_changes, que a limpeza apaga; o
+contador em users só sobe. Começa no maior id de sync_changes do utilizador,
+para que nenhuma ETag antiga volte a coincidir.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6f1d9b3e742'
+down_revision = 'a3c8e5f2d190'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('users')}
+    if 'data_version' in columns:
+        return
+
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('data_version', sa.Integer(), nullable=False, server_default='0'))
+
+    op.execute(
+        'UPDATE users SET data_version = ('
+        'SELECT COALESCE(MAX(sync_changes.id), 0) FROM sync_changes WHERE sync_changes.user_id = users.id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('data_version')
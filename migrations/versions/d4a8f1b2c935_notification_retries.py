@@ -0,0 +1,43 @@
+"""Novas tentativas e dead-letter em notification_logs
+
+Revision ID: d4a8f1b2c935
+Revises: b7e2a4c6d813
+Create Date: 2026-10-18 16:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a8f1b2c935'
+down_revision = 'b7e2a4c6d813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    columns = {column['name'] for column in inspector.get_columns('notification_logs')}
+    indexes = {index['name'] for index in inspector.get_indexes('notification_logs')}
+
+    with op.batch_alter_table('notification_logs') as batch_op:
+        if 'attempts' not in columns:
+            batch_op.add_column(sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'))
+        if 'next_attempt_at' not in columns:
+            batch_op.add_column(sa.Column('next_attempt_at', sa.DateTime(), nullable=True))
+        if 'last_error' not in columns:
+            batch_op.add_column(sa.Column('last_error', sa.Text(), nullable=True))
+        if 'ix_notification_logs_status' in indexes:
+            batch_op.drop_index('ix_notification_logs_status')
+        if 'ix_notification_logs_status_next_attempt_at' not in indexes:
+            batch_op.create_index('ix_notification_logs_status_next_attempt_at', ['status', 'next_attempt_at'])
+
+
+def downgrade():
+    with op.batch_alter_table('notification_logs') as batch_op:
+        batch_op.drop_index('ix_notification_logs_status_next_attempt_at')
+        batch_op.create_index('ix_notification_logs_status', ['status'])
+        batch_op.drop_column('last_error')
+        batch_op.drop_column('next_attempt_at')
+        batch_op.drop_column('attempts')
@@ -0,0 +1,68 @@
+"""Lembretes automáticos de consultas (reminder_at, reminder_sent_at)
+
+Revision ID: e2c7b9a4f318
+Revises: d4a8f1b2c935
+Create Date: 2026-10-18 18:10:00.000000
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2c7b9a4f318'
+down_revision = 'd4a8f1b2c935'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    columns = {column['name'] for column in inspector.get_columns('appointments')}
+    indexes = {index['name'] for index in inspector.get_indexes('appointments')}
+
+    with op.batch_alter_table('appointments') as batch_op:
+        if 'reminder_at' not in columns:
+            batch_op.add_column(sa.Column('reminder_at', sa.DateTime(), nullable=True))
+        if 'reminder_sent_at' not in columns:
+            batch_op.add_column(sa.Column('reminder_sent_at', sa.DateTime(), nullable=True))
+        if 'ix_appointments_status_reminder_at' not in indexes:
+            batch_op.create_index('ix_appointments_status_reminder_at', ['status', 'reminder_at'])
+
+    # Preencher reminder_at das consultas existentes (data/hora - reminder_hours_before)
+    appointments = sa.table(
+        'appointments',
+        sa.column('id', sa.Integer),
+        sa.column('appointment_date', sa.Date),
+        sa.column('appointment_time', sa.Time),
+        sa.column('reminder_hours_before', sa.Integer),
+        sa.column('reminder_at', sa.DateTime),
+    )
+    rows = bind.execute(sa.select(
+        appointments.c.id,
+        appointments.c.appointment_date,
+        appointments.c.appointment_time,
+        appointments.c.reminder_hours_before,
+    ).where(appointments.c.reminder_at.is_(None))).all()
+    if rows:
+        bind.execute(
+            appointments.update().where(appointments.c.id == sa.bindparam('_id')),
+            [
+                {
+                    '_id': row.id,
+                    'reminder_at': datetime.combine(row.appointment_date, row.appointment_time)
+                    - timedelta(hours=row.reminder_hours_before if row.reminder_hours_before is not None else 24),
+                }
+                for row in rows
+            ],
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('appointments') as batch_op:
+        batch_op.drop_index('ix_appointments_status_reminder_at')
+        batch_op.drop_column('reminder_sent_at')
+        batch_op.drop_column('reminder_at')
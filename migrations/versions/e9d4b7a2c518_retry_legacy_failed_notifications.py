@@ -0,0 +1,50 @@
+"""Notificações 'failed' antigas passam a 'retry' (recentes) ou 'dead'
+
+Revision ID: e9d4b7a2c518
+Revises: c6f1d9b3e742
+Create Date: 2026-10-18 22:00:00.000000
+
+Antes das novas tentativas, send_whatsapp_message gravava os envios
+falhados como 'failed', um estado que o NotificationDispatcher não recolhe.
+As da última hora voltam à fila como 'retry' (próxima tentativa imediata);
+as mais antigas passam a 'dead': um lembrete de medicação ou de consulta
+reenviado horas ou dias depois já não serve e só confunde.
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9d4b7a2c518'
+down_revision = 'c6f1d9b3e742'
+branch_labels = None
+depends_on = None
+
+RETRY_WINDOW = timedelta(hours=1)
+
+
+def upgrade():
+    notification_logs = sa.table(
+        'notification_logs',
+        sa.column('status', sa.String),
+        sa.column('attempts', sa.Integer),
+        sa.column('next_attempt_at', sa.DateTime),
+        sa.column('created_at', sa.DateTime),
+    )
+    failed = notification_logs.c.status == 'failed'
+    recent = notification_logs.c.created_at >= datetime.utcnow() - RETRY_WINDOW
+    attempts = sa.case((notification_logs.c.attempts > 0, notification_logs.c.attempts), else_=1)
+
+    op.execute(notification_logs.update().where(failed, recent).values(
+        status='retry', attempts=attempts, next_attempt_at=None,
+    ))
+    op.execute(notification_logs.update().where(failed).values(
+        status='dead', attempts=attempts, next_attempt_at=None,
+    ))
+
+
+def downgrade():
+    pass
@@ -0,0 +1,99 @@
+"""Índice único em health_readings (user_id, reading_type, measured_at)
+
+Revision ID: f1b6d3a8c274
+Revises: e9d4b7a2c518
+Create Date: 2026-10-18 22:30:00.000000
+
+O lote de medições ignora as repetidas, mas sem índice único dois pedidos
+concorrentes (ou o POST individual) podiam gravar a mesma medição duas vezes.
+Antes do índice os duplicados existentes são removidos, mantendo o de maior
+id (o que health_reading_latest referencia), e os agregados, que os
+contavam, são recalculados.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b6d3a8c274'
+down_revision = 'e9d4b7a2c518'
+branch_labels = None
+depends_on = None
+
+
+OLD_INDEX = 'ix_health_readings_user_type_measured_at'
+NEW_INDEX = 'uq_health_readings_user_type_measured_at'
+COLUMNS = ['user_id', 'reading_type', 'measured_at']
+
+BUCKETS = {
+    'postgresql': {
+        'hour': "date_trunc('hour', measured_at)",
+        'day': "date_trunc('day', measured_at)",
+    },
+    'sqlite': {
+        'hour': "strftime('%Y-%m-%d %H:00:00.000000', measured_at)",
+        'day': "strftime('%Y-%m-%d 00:00:00.000000', measured_at)",
+    },
+}
+
+
+def _existing_indexes(inspector, table):
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+    if 'health_readings' not in tables:
+        return
+
+    if 'health_reading_latest' in tables:
+        # A última medição passa a apontar para o duplicado que fica
+        op.execute(
+            'UPDATE health_reading_latest SET reading_id = ('
+            'SELECT MAX(h.id) FROM health_readings h '
+            'WHERE h.user_id = health_reading_latest.user_id '
+            'AND h.reading_type = health_reading_latest.reading_type '
+            'AND h.measured_at = health_reading_latest.measured_at)'
+        )
+
+    deleted = bind.execute(sa.text(
+        'DELETE FROM health_readings WHERE measured_at IS NOT NULL AND id NOT IN ('
+        'SELECT MAX(id) FROM health_readings WHERE measured_at IS NOT NULL '
+        'GROUP BY user_id, reading_type, measured_at)'
+    )).rowcount
+
+    buckets = BUCKETS.get(bind.dialect.name)
+    if deleted and buckets and 'health_reading_rollups' in tables:
+        op.execute('DELETE FROM health_reading_rollups')
+        for resolution, bucket in buckets.items():
+            op.execute(
+                'INSERT INTO health_reading_rollups (user_id, reading_type, resolution, bucket_start, count, '
+                'sum_primary, min_primary, max_primary, count_secondary, sum_secondary) '
+                f"SELECT user_id, reading_type, '{resolution}', {bucket}, COUNT(id), "
+                'SUM(value_primary), MIN(value_primary), MAX(value_primary), '
+                'COUNT(value_secondary), COALESCE(SUM(value_secondary), 0) '
+                'FROM health_readings WHERE measured_at IS NOT NULL '
+                f'GROUP BY user_id, reading_type, {bucket}'
+            )
+
+    existing = _existing_indexes(inspector, 'health_readings')
+    if OLD_INDEX in existing:
+        op.drop_index(OLD_INDEX, table_name='health_readings')
+    if NEW_INDEX not in existing:
+        op.create_index(NEW_INDEX, 'health_readings', COLUMNS, unique=True)
+
+
+def downgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if 'health_readings' not in inspector.get_table_names():
+        return
+
+    existing = _existing_indexes(inspector, 'health_readings')
+    if NEW_INDEX in existing:
+        op.drop_index(NEW_INDEX, table_name='health_readings')
+    if OLD_INDEX not in existing:
+        op.create_index(OLD_INDEX, 'health_readings', COLUMNS)
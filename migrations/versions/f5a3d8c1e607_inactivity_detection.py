@@ -0,0 +1,40 @@
+"""Deteção de inatividade (limite opt-in por utilizador e índice em last_active)
+
+Revision ID: f5a3d8c1e607
+Revises: e2c7b9a4f318
+Create Date: 2026-10-18 19:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5a3d8c1e607'
+down_revision = 'e2c7b9a4f318'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    columns = {column['name'] for column in inspector.get_columns('users')}
+    indexes = {index['name'] for index in inspector.get_indexes('users')}
+
+    with op.batch_alter_table('users') as batch_op:
+        if 'inactivity_threshold' not in columns:
+            batch_op.add_column(sa.Column('inactivity_threshold', sa.Integer(), nullable=True))
+        if 'inactivity_monitored_since' not in columns:
+            batch_op.add_column(sa.Column('inactivity_monitored_since', sa.DateTime(), nullable=True))
+        if 'inactivity_alerted_at' not in columns:
+            batch_op.add_column(sa.Column('inactivity_alerted_at', sa.DateTime(), nullable=True))
+        if 'ix_users_last_active' not in indexes:
+            batch_op.create_index('ix_users_last_active', ['last_active'])
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_index('ix_users_last_active')
+        batch_op.drop_column('inactivity_alerted_at')
+        batch_op.drop_column('inactivity_monitored_since')
+        batch_op.drop_column('inactivity_threshold')
@@ -43,6 +43,11 @@ self.addEventListener('fetch', (event) => {
     const { request } = event;
     const url = new URL(request.url);
 
+    // Sincronização incremental - respostas são deltas, não guardar em cache
+    if (url.pathname === '/api/sync') {
+        return;
+    }
+
     // API calls - network first
     if (url.pathname.startsWith('/api/')) {
         event.respondWith(
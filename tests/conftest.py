@@ -0,0 +1,128 @@
+"""
+Fixtures dos testes: app com uma BD de teste, cliente HTTP, utilizador
+registado, relógio controlado (clock) e orçamento de queries por pedido
+(query_budget).
+"""
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from flask import g, request, request_finished
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """
+    Módulo app importado sem serviços em background, com uma BD SQLite
+    temporária ou a de TEST_DATABASE_URL (ex: PostgreSQL; as tabelas são apagadas)
+    """
+    os.environ.update({
+        'DATABASE_URL': os.environ.get('TEST_DATABASE_URL')
+        or 'sqlite:///' + str(tmp_path_factory.mktemp('db') / 'seniorcare.db'),
+        'MEDICATION_SCHEDULER_ENABLED': '0',
+        'APPOINTMENT_SCHEDULER_ENABLED': '0',
+        'INACTIVITY_DETECTOR_ENABLED': '0',
+        'NOTIFICATION_MODE': 'sync',
+        'NOTIFICATION_LOG_FLUSH_INTERVAL': '0',
+        'QUERY_DEBUG': 'off',
+    })
+    import app as module
+    # Não arrancar schedulers/threads no primeiro pedido
+    module.app._db_initialized = True
+    return module
+
+
+@pytest.fixture
+def app(app_module):
+    """App com as tabelas recriadas (cada teste começa com a BD vazia)"""
+    with app_module.app.app_context():
+        app_module.db.drop_all()
+        app_module.db.create_all()
+    yield app_module.app
+    with app_module.app.app_context():
+        app_module.db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(client):
+    """Utilizador registado: {'id', 'token', 'headers'}"""
+    response = client.post('/api/auth/register', json={'name': 'Maria', 'phone': '+351912345678'})
+    assert response.status_code == 201, response.get_json()
+    data = response.get_json()
+    return {
+        'id': data['user']['id'],
+        'token': data['token'],
+        'headers': {'Authorization': f"Bearer {data['token']}"},
+    }
+
+
+class FrozenClock:
+    """Relógio parado para os componentes com clock= injetável; avança com advance()"""
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, **delta):
+        self.now += timedelta(**delta)
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FrozenClock(datetime(2026, 3, 2, 9, 0))
+
+
+@pytest.fixture
+def fake_twilio(app_module, monkeypatch):
+    """FakeTwilioClient no lugar do Twilio (WhatsApp e SMS); as mensagens ficam em .sent"""
+    client = app_module.FakeTwilioClient()
+    monkeypatch.setattr(app_module, 'twilio_client', client)
+    monkeypatch.setattr(app_module, 'TWILIO_SMS_FROM', '+351900000000')
+    return client
+
+
+@pytest.fixture
+def query_budget(app_module, monkeypatch):
+    """
+    Orçamento de queries por pedido
+    
+        with query_budget(4):
+            client.get('/api/bootstrap', headers=user['headers'])
+    
+    Falha se algum pedido dentro do bloco fizer mais de max_queries queries
+    ou repetir a mesma query mais de QUERY_REPEAT_LIMIT vezes (query_report).
+    """
+    monkeypatch.setattr(app_module, 'QUERY_DEBUG', 'log')
+    
+    @contextmanager
+    def budget(max_queries):
+        recorded = []
+        
+        def record(sender, response, **extra):
+            recorded.append((f'{request.method} {request.path}', g.get('db_queries', 0), app_module.query_report()))
+        
+        request_finished.connect(record, app_module.app)
+        try:
+            yield recorded
+        finally:
+            request_finished.disconnect(record, app_module.app)
+        
+        assert recorded, 'Nenhum pedido feito dentro do orçamento de queries'
+        for path, queries, repeated in recorded:
+            assert queries <= max_queries, f'{path}: {queries} queries (orçamento: {max_queries})'
+            assert not repeated, f'{path}: queries repetidas (N+1?) {repeated}'
+    
+    return budget
@@ -0,0 +1,142 @@
+"""
+AppointmentReminderScheduler com relógio parado: um só lembrete por consulta,
+reagendamento nas rotas de create/update/delete e o dia relativo na mensagem
+dos cuidadores (appointment_day_label).
+"""
+from datetime import date, datetime
+
+import pytest
+
+
+@pytest.fixture
+def reminders(app_module, monkeypatch):
+    """Mensagens dos cuidadores enviadas pelos lembretes: [(consulta, mensagem)]"""
+    messages = []
+    monkeypatch.setattr(app_module, 'enqueue_notifications', lambda *args, **kwargs: [])
+    monkeypatch.setattr(app_module, 'notify_caregivers',
+                        lambda user_id, notification_type, message, reference_type=None, reference_id=None, **kwargs:
+                        messages.append((reference_id, message)))
+    return messages
+
+
+@pytest.fixture
+def scheduler(app_module, app, clock, monkeypatch):
+    """Agendador usado também pelas rotas, já com a primeira recolha feita"""
+    scheduler = app_module.AppointmentReminderScheduler(clock=clock, interval=30, refresh_interval=300)
+    monkeypatch.setattr(app_module, 'appointment_scheduler', scheduler)
+    with app.app_context():
+        scheduler.tick()
+    return scheduler
+
+
+def create(client, user, day='2026-03-03', at='10:00', hours_before=24):
+    response = client.post('/api/appointments', json={
+        'title': 'Cardiologia', 'appointment_date': day, 'appointment_time': at,
+        'reminder_hours_before': hours_before,
+    }, headers=user['headers'])
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def tick_at(app, scheduler, clock, when):
+    clock.now = when
+    with app.app_context():
+        return scheduler.tick()
+
+
+def test_reminder_fires_once(app_module, app, client, user, scheduler, clock, reminders):
+    appointment_id = create(client, user)  # lembrete às 10:00 de 2026-03-02, fora do horizonte
+    assert scheduler.queue_size() == 0
+    
+    assert tick_at(app, scheduler, clock, datetime(2026, 3, 2, 9, 59)) == 0
+    assert scheduler.queue_size() == 1
+    assert tick_at(app, scheduler, clock, datetime(2026, 3, 2, 10, 0)) == 1
+    assert tick_at(app, scheduler, clock, datetime(2026, 3, 2, 10, 1)) == 0
+    
+    # Outro worker (ou um reinício) não volta a enviar
+    other = app_module.AppointmentReminderScheduler(clock=clock)
+    assert tick_at(app, other, clock, datetime(2026, 3, 2, 10, 2)) == 0
+    
+    assert reminders == [(appointment_id, 'Lembrete: Maria tem consulta amanhã - Cardiologia às 10:00')]
+
+
+def test_create_inside_horizon_is_scheduled_immediately(app, client, user, scheduler, clock, reminders):
+    clock.now = datetime(2026, 3, 2, 9, 58)
+    with app.app_context():
+        scheduler.refresh()
+    
+    create(client, user)
+    
+    assert scheduler.next_fire_at() == datetime(2026, 3, 2, 10, 0)
+    assert tick_at(app, scheduler, clock, datetime(2026, 3, 2, 10, 0)) == 1
+
+
+def test_update_moves_the_reminder(app, client, user, scheduler, clock, reminders):
+    clock.now = datetime(2026, 3, 2, 9, 58)
+    with app.app_context():
+        scheduler.refresh()
+    appointment_id = create(client, user)
+    
+    response = client.put(f'/api/appointments/{appointment_id}', json={'appointment_time': '11:00'},
+                          headers=user['headers'])
+    assert response.status_code == 200
+    
+    assert tick_at(app, scheduler, clock, datetime(2026, 3, 2, 10, 0)) == 0  # entrada antiga ignorada
+    assert tick_at(app, scheduler, clock, datetime(2026, 3, 2, 10, 59)) == 0
+    assert tick_at(app, scheduler, clock, datetime(2026, 3, 2, 11, 0)) == 1
+    assert reminders == [(appointment_id, 'Lembrete: Maria tem consulta amanhã - Cardiologia às 11:00')]
+
+
+def test_rescheduling_after_the_reminder_sends_a_new_one(app, client, user, scheduler, clock, reminders):
+    appointment_id = create(client, user)
+    assert tick_at(app, scheduler, clock, datetime(2026, 3, 2, 9, 59)) == 0
+    assert tick_at(app, scheduler, clock, datetime(2026, 3, 2, 10, 0)) == 1
+    
+    client.put(f'/api/appointments/{appointment_id}', json={'appointment_date': '2026-03-04'}, headers=user['headers'])
+    
+    assert tick_at(app, scheduler, clock, datetime(2026, 3, 3, 9, 59)) == 0
+    assert tick_at(app, scheduler, clock, datetime(2026, 3, 3, 10, 0)) == 1
+    assert len(reminders) == 2
+
+
+def test_delete_cancels_the_reminder(app, client, user, scheduler, clock, reminders):
+    clock.now = datetime(2026, 3, 2, 9, 58)
+    with app.app_context():
+        scheduler.refresh()
+    appointment_id = create(client, user)
+    
+    assert client.delete(f'/api/appointments/{appointment_id}', headers=user['headers']).status_code == 200
+    
+    assert scheduler.queue_size() == 0
+    assert tick_at(app, scheduler, clock, datetime(2026, 3, 2, 10, 0)) == 0
+    assert reminders == []
+
+
+def test_cancelled_status_cancels_the_reminder(app, client, user, scheduler, clock, reminders):
+    appointment_id = create(client, user)
+    client.put(f'/api/appointments/{appointment_id}', json={'status': 'cancelled'}, headers=user['headers'])
+    
+    assert tick_at(app, scheduler, clock, datetime(2026, 3, 2, 10, 0)) == 0
+    assert reminders == []
+
+
+@pytest.mark.parametrize('day, at, hours_before, label', [
+    ('2026-03-02', '13:00', 2, 'hoje'),
+    ('2026-03-03', '11:00', 24, 'amanhã'),
+    ('2026-03-05', '11:00', 72, 'a 05/03/2026'),
+])
+def test_message_uses_lead_time_day_label(app, client, user, scheduler, clock, reminders, day, at, hours_before, label):
+    create(client, user, day=day, at=at, hours_before=hours_before)
+    
+    tick_at(app, scheduler, clock, datetime(2026, 3, 2, 10, 59))
+    assert tick_at(app, scheduler, clock, datetime(2026, 3, 2, 11, 0)) == 1
+    
+    assert reminders[0][1] == f'Lembrete: Maria tem consulta {label} - Cardiologia às {at}'
+
+
+def test_appointment_day_label(app_module):
+    today = date(2026, 12, 31)
+    
+    assert app_module.appointment_day_label(date(2026, 12, 31), today) == 'hoje'
+    assert app_module.appointment_day_label(date(2027, 1, 1), today) == 'amanhã'
+    assert app_module.appointment_day_label(date(2027, 1, 2), today) == 'a 02/01/2027'
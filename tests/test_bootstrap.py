@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+
+def add_messages(app_module, app, user, count):
+    start = datetime(2026, 3, 1, 9, 0)
+    with app.app_context():
+        app_module.db.session.add_all([
+            app_module.ChatMessage(user_id=user['id'], role='user', content=f'Mensagem {i}',
+                                   created_at=start + timedelta(minutes=i))
+            for i in range(count)
+        ])
+        app_module.db.session.commit()
+
+
+def test_chat_section_is_the_first_chat_page(app_module, app, client, user):
+    add_messages(app_module, app, user, 55)
+    
+    data = client.get('/api/bootstrap?include=chat', headers=user['headers']).get_json()
+    page = client.get('/api/chat/messages', headers=user['headers'])
+    
+    assert data['chat'] == page.get_json()
+    assert [m['content'] for m in data['chat'][:1]] == ['Mensagem 5']
+    assert data['chat_cursor'] == page.headers['X-Next-Cursor']
+    
+    rest = client.get(f"/api/chat/messages?cursor={data['chat_cursor']}", headers=user['headers'])
+    assert [m['content'] for m in rest.get_json()] == [f'Mensagem {i}' for i in range(5)]
+    assert 'X-Next-Cursor' not in rest.headers
+
+
+def test_chat_section_without_more_pages(app_module, app, client, user):
+    add_messages(app_module, app, user, 3)
+    
+    data = client.get('/api/bootstrap?include=chat&limit=10', headers=user['headers']).get_json()
+    
+    assert [m['content'] for m in data['chat']] == ['Mensagem 0', 'Mensagem 1', 'Mensagem 2']
+    assert data['chat_cursor'] is None
+
+
+def test_invalid_chat_cursor_is_rejected(client, user):
+    response = client.get('/api/bootstrap?include=chat&cursor=lixo', headers=user['headers'])
+    
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Cursor inválido'}
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+
+def get(client, user, path, etag=None):
+    headers = dict(user['headers'])
+    if etag:
+        headers['If-None-Match'] = etag
+    return client.get(path, headers=headers)
+
+
+def add_contact(client, user, name, phone):
+    response = client.post('/api/contacts', json={'name': name, 'phone': phone}, headers=user['headers'])
+    assert response.status_code == 201
+
+
+def test_unchanged_list_returns_304(client, user):
+    add_contact(client, user, 'Filha', '+351911111111')
+    first = get(client, user, '/api/contacts')
+    assert first.status_code == 200
+    
+    second = get(client, user, '/api/contacts', first.headers['ETag'])
+    
+    assert second.status_code == 304
+    assert second.headers['ETag'] == first.headers['ETag']
+
+
+def test_change_invalidates_etag(client, user):
+    etag = get(client, user, '/api/contacts').headers['ETag']
+    add_contact(client, user, 'Filha', '+351911111111')
+    
+    response = get(client, user, '/api/contacts', etag)
+    
+    assert response.status_code == 200
+    assert len(response.get_json()) == 1
+    assert response.headers['ETag'] != etag
+
+
+def test_etag_survives_sync_prune(app_module, app, client, user):
+    etag = get(client, user, '/api/contacts').headers['ETag']
+    add_contact(client, user, 'Filha', '+351911111111')
+    with app.app_context():
+        app_module.SyncChange.query.update({'created_at': datetime.utcnow() - timedelta(days=app_module.SYNC_RETENTION_DAYS + 1)})
+        app_module.db.session.commit()
+        app_module.prune_sync_changes()
+        # Pior caso: todo o histórico de sync_changes desaparece
+        app_module.SyncChange.query.delete()
+        app_module.db.session.commit()
+    
+    response = get(client, user, '/api/contacts', etag)
+    
+    assert response.status_code == 200
+    assert len(response.get_json()) == 1
+
+
+def test_etags_are_per_user(client, user):
+    etag = get(client, user, '/api/contacts').headers['ETag']
+    other = client.post('/api/auth/register', json={'name': 'Rui', 'phone': '+351987654321'}).get_json()
+    
+    response = client.get('/api/contacts', headers={'Authorization': f"Bearer {other['token']}", 'If-None-Match': etag})
+    
+    assert response.status_code == 200
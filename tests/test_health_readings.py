@@ -0,0 +1,149 @@
+def add_reading(client, user, reading_type, value, measured_at):
+    response = client.post('/api/health/readings', json={
+        'reading_type': reading_type,
+        'value_primary': value,
+        'measured_at': measured_at,
+    }, headers=user['headers'])
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def latest(client, user):
+    response = client.get('/api/health/readings/latest', headers=user['headers'])
+    assert response.status_code == 200
+    return {reading_type: reading['value_primary'] for reading_type, reading in response.get_json().items()}
+
+
+def test_latest_follows_measured_at_not_insert_order(client, user):
+    add_reading(client, user, 'heart_rate', 70, '2026-01-02T08:00:00')
+    add_reading(client, user, 'heart_rate', 65, '2026-01-01T08:00:00')
+    add_reading(client, user, 'weight', 72.5, '2026-01-01T09:00:00')
+    
+    assert latest(client, user) == {'heart_rate': 70, 'weight': 72.5}
+
+
+def test_deleting_latest_reading_falls_back_to_previous(client, user):
+    add_reading(client, user, 'heart_rate', 60, '2026-01-01T08:00:00')
+    add_reading(client, user, 'heart_rate', 65, '2026-01-02T08:00:00')
+    newest = add_reading(client, user, 'heart_rate', 70, '2026-01-03T08:00:00')
+    
+    response = client.delete(f'/api/health/readings/{newest}', headers=user['headers'])
+    
+    assert response.status_code == 200
+    assert latest(client, user) == {'heart_rate': 65}
+
+
+def test_deleting_older_reading_keeps_latest(client, user):
+    older = add_reading(client, user, 'heart_rate', 60, '2026-01-01T08:00:00')
+    add_reading(client, user, 'heart_rate', 70, '2026-01-02T08:00:00')
+    
+    client.delete(f'/api/health/readings/{older}', headers=user['headers'])
+    
+    assert latest(client, user) == {'heart_rate': 70}
+
+
+def test_deleting_only_reading_removes_type(client, user):
+    only = add_reading(client, user, 'heart_rate', 70, '2026-01-01T08:00:00')
+    add_reading(client, user, 'weight', 72.5, '2026-01-01T09:00:00')
+    
+    client.delete(f'/api/health/readings/{only}', headers=user['headers'])
+    
+    assert latest(client, user) == {'weight': 72.5}
+
+
+def post_batch(client, user, readings, **kwargs):
+    return client.post('/api/health/readings/batch', headers=user['headers'], **(kwargs or {'json': readings}))
+
+
+def hourly(client, user, reading_type):
+    response = client.get(f'/api/health/readings?type={reading_type}&resolution=hour', headers=user['headers'])
+    return [(bucket['count'], bucket['average']) for bucket in response.get_json()]
+
+
+def stored_values(app_module, app, reading_type):
+    with app.app_context():
+        return sorted(
+            (r.measured_at.isoformat(), r.value_primary)
+            for r in app_module.HealthReading.query.filter_by(reading_type=reading_type)
+        )
+
+
+def test_batch_inserts_and_counts_duplicates(app_module, app, client, user):
+    add_reading(client, user, 'heart_rate', 60, '2026-01-01T08:00:00')
+    
+    response = post_batch(client, user, [
+        {'reading_type': 'heart_rate', 'value_primary': 99, 'measured_at': '2026-01-01T08:00:00'},  # já gravada
+        {'reading_type': 'heart_rate', 'value_primary': 70, 'measured_at': '2026-01-01T08:10:00'},
+        {'reading_type': 'heart_rate', 'value_primary': 75, 'measured_at': '2026-01-01T08:10:00'},  # repetida no lote
+        {'reading_type': 'heart_rate', 'value_primary': 'x', 'measured_at': '2026-01-01T08:20:00'},
+        {'value_primary': 80},
+    ])
+    
+    assert response.status_code == 201
+    assert response.get_json() == {'inserted': 1, 'duplicates': 2, 'errors': [
+        {'index': 3, 'error': 'value_primary inválido'},
+        {'index': 4, 'error': 'reading_type é obrigatório'},
+    ]}
+    assert stored_values(app_module, app, 'heart_rate') == [('2026-01-01T08:00:00', 60), ('2026-01-01T08:10:00', 75)]
+    assert hourly(client, user, 'heart_rate') == [(2, 67.5)]
+    assert latest(client, user) == {'heart_rate': 75}
+
+
+def test_batch_resent_is_idempotent(client, user):
+    readings = [
+        {'reading_type': 'weight', 'value_primary': 72 + i, 'measured_at': f'2026-01-0{i + 1}T09:00:00'}
+        for i in range(3)
+    ]
+    
+    first = post_batch(client, user, readings).get_json()
+    again = post_batch(client, user, readings).get_json()
+    
+    assert (first['inserted'], first['duplicates']) == (3, 0)
+    assert (again['inserted'], again['duplicates']) == (0, 3)
+    assert [count for count, _ in hourly(client, user, 'weight')] == [1, 1, 1]
+    assert latest(client, user) == {'weight': 74}
+
+
+def test_batch_accepts_ndjson(client, user):
+    body = '\n'.join([
+        '{"reading_type": "glucose", "value_primary": 110, "measured_at": "2026-01-01T07:00:00"}',
+        'não é json',
+        '',
+        '{"reading_type": "glucose", "value_primary": 140, "measured_at": "2026-01-01T07:30:00"}',
+    ])
+    
+    response = post_batch(client, user, None, data=body, content_type='application/x-ndjson')
+    
+    assert response.get_json() == {'inserted': 2, 'duplicates': 0, 'errors': [{'index': 1, 'error': 'JSON inválido'}]}
+    assert hourly(client, user, 'glucose') == [(2, 125)]
+
+
+def test_concurrent_insert_is_skipped_not_counted(app_module, app, user):
+    """Medição gravada por outro pedido depois da verificação: ignorada pelo índice único"""
+    def row(value, minute):
+        return {'user_id': user['id'], 'reading_type': 'heart_rate', 'value_primary': value,
+                'measured_at': app_module.datetime(2026, 1, 1, 8, minute)}
+    
+    with app.app_context():
+        assert app_module.insert_health_readings([row(60, 0)]) == [row(60, 0)]
+        app_module.db.session.commit()
+        
+        inserted = app_module.insert_health_readings([row(61, 0), row(70, 10), row(80, 20)])
+        app_module.db.session.commit()
+    
+    assert inserted == [row(70, 10), row(80, 20)]
+    assert stored_values(app_module, app, 'heart_rate') == [
+        ('2026-01-01T08:00:00', 60), ('2026-01-01T08:10:00', 70), ('2026-01-01T08:20:00', 80)
+    ]
+
+
+def test_repeated_single_reading_returns_existing(client, user):
+    first = add_reading(client, user, 'heart_rate', 60, '2026-01-01T08:00:00')
+    
+    response = client.post('/api/health/readings', json={
+        'reading_type': 'heart_rate', 'value_primary': 99, 'measured_at': '2026-01-01T08:00:00'
+    }, headers=user['headers'])
+    
+    assert response.status_code == 200
+    assert response.get_json()['id'] == first
+    assert hourly(client, user, 'heart_rate') == [(1, 60)]
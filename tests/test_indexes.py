@@ -0,0 +1,187 @@
+"""
+Os caminhos mais frequentes usam os índices compostos (EXPLAIN em SQLite e
+PostgreSQL); as migrações 3f9a1c2d7b41 e f1b6d3a8c274 removem doses e medições
+duplicadas antes dos índices únicos sem perder tomas nem a última medição.
+"""
+import os
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytest
+import sqlalchemy as sa
+from flask_migrate import stamp, upgrade
+from sqlalchemy import event
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+@contextmanager
+def captured_statements(engine):
+    """SQL (statement, parâmetros) executado pelo engine dentro do bloco"""
+    statements = []
+    
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append((statement, parameters))
+    
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+
+def query_plan(connection, statement, parameters):
+    if connection.dialect.name == 'postgresql':
+        # Em tabelas pequenas o planeador prefere seq scan; assim só o evita se houver índice
+        connection.exec_driver_sql('SET enable_seqscan = off')
+        rows = connection.exec_driver_sql(f'EXPLAIN {statement}', parameters).all()
+    else:
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+    return '\n'.join(str(row[-1]) for row in rows)
+
+
+def plans_for(engine, statements, table):
+    """Planos das queries SELECT que leem a tabela"""
+    with engine.connect() as connection:
+        return [
+            query_plan(connection, statement, parameters)
+            for statement, parameters in statements
+            if statement.lstrip().upper().startswith('SELECT') and (f'FROM {table}' in statement or f'JOIN {table}' in statement)
+        ]
+
+
+def add_medication(client, user):
+    response = client.post('/api/medications', json={
+        'name': 'Paracetamol', 'schedules': [{'time': '08:00'}],
+    }, headers=user['headers'])
+    assert response.status_code == 201
+    medication = response.get_json()
+    return medication['id'], medication['schedules'][0]['id']
+
+
+def take(client, user, medication_id, schedule_id):
+    return client.post(f'/api/medications/{medication_id}/take', json={'schedule_id': schedule_id}, headers=user['headers'])
+
+
+def add_caregiver(app_module, user):
+    with app_module.app.app_context():
+        caregiver = app_module.Caregiver(email='filha@example.com', name='Filha', phone='+351911111111')
+        caregiver.set_password('segredo')
+        app_module.db.session.add(caregiver)
+        app_module.db.session.flush()
+        app_module.db.session.add(app_module.CaregiverUser(caregiver_id=caregiver.id, user_id=user['id']))
+        app_module.db.session.commit()
+
+
+HOT_PATHS = [
+    ('take_medication', 'medication_logs', 'uq_medication_logs_dose'),
+    ('health_readings', 'health_readings', 'uq_health_readings_user_type_measured_at'),
+    ('alerts', 'alerts', 'ix_alerts_user_id_created_at'),
+    ('mood', 'mood_logs', 'ix_mood_logs_user_id_created_at'),
+    ('chat', 'chat_messages', 'ix_chat_messages_user_id_created_at'),
+    ('notification_log', 'notification_logs', 'ix_notification_logs_user_id_created_at'),
+    ('emergency', 'caregiver_users', 'ix_caregiver_users_user_id_notify_alerts'),
+]
+
+
+def hot_request(name, app_module, client, user):
+    headers = user['headers']
+    if name == 'take_medication':
+        medication_id, schedule_id = add_medication(client, user)
+        return lambda: take(client, user, medication_id, schedule_id)
+    if name == 'health_readings':
+        client.post('/api/health/readings', json={'reading_type': 'heart_rate', 'value_primary': 72}, headers=headers)
+        return lambda: client.get('/api/health/readings?type=heart_rate', headers=headers)
+    if name == 'alerts':
+        return lambda: client.get('/api/alerts', headers=headers)
+    if name == 'mood':
+        client.post('/api/mood', json={'mood': 'happy'}, headers=headers)
+        return lambda: client.get('/api/mood/recent', headers=headers)
+    if name == 'chat':
+        return lambda: client.get('/api/chat/messages', headers=headers)
+    if name == 'notification_log':
+        return lambda: client.get('/api/notifications/log', headers=headers)
+    if name == 'emergency':
+        add_caregiver(app_module, user)
+        return lambda: client.post('/api/alerts/emergency', json={}, headers=headers)
+    raise ValueError(name)
+
+
+@pytest.mark.parametrize('name, table, index', HOT_PATHS, ids=[path[0] for path in HOT_PATHS])
+def test_hot_path_uses_index(app_module, app, client, user, name, table, index):
+    send = hot_request(name, app_module, client, user)
+    with app.app_context():
+        engine = app_module.db.engine
+    
+    with captured_statements(engine) as statements:
+        response = send()
+    assert response.status_code < 400, response.get_json()
+    
+    plans = plans_for(engine, statements, table)
+    assert plans, f'Nenhuma query a {table}'
+    assert any(index in plan for plan in plans), '\n\n'.join(plans)
+
+
+def test_dose_dedup_migration_keeps_taken_log(app_module, app):
+    db = app_module.db
+    with app.app_context():
+        connection = db.session.connection()
+        connection.exec_driver_sql('DROP INDEX uq_medication_logs_dose')
+        user = app_module.User(name='Maria', phone='+351912345678')
+        db.session.add(user)
+        db.session.flush()
+        medication = app_module.Medication(user_id=user.id, name='Paracetamol')
+        db.session.add(medication)
+        db.session.flush()
+        
+        scheduled = datetime(2026, 1, 1, 8, 0)
+        rows = [
+            # Mesma dose: a toma (mais antiga) tem de sobreviver ao registo posterior
+            ('taken', scheduled),
+            ('missed', scheduled),
+            # Outra dose sem toma: fica o mais recente
+            ('missed', scheduled.replace(hour=20)),
+            ('skipped', scheduled.replace(hour=20)),
+        ]
+        logs = [app_module.MedicationLog(medication_id=medication.id, scheduled_time=when, status=status)
+                for status, when in rows]
+        db.session.add_all(logs)
+        db.session.commit()
+        kept = {logs[0].id, logs[3].id}
+        
+        stamp(directory=MIGRATIONS, revision='1d4e7a9b3c20')
+        upgrade(directory=MIGRATIONS, revision='3f9a1c2d7b41')
+        
+        remaining = db.session.query(app_module.MedicationLog.id, app_module.MedicationLog.status).all()
+        assert {row.id for row in remaining} == kept
+        assert sorted(row.status for row in remaining) == ['skipped', 'taken']
+
+
+def test_reading_dedup_migration_keeps_latest_and_rebuilds_rollups(app_module, app, client, user):
+    db = app_module.db
+    headers = user['headers']
+    with app.app_context():
+        db.session.connection().exec_driver_sql('DROP INDEX uq_health_readings_user_type_measured_at')
+        db.session.commit()
+    client.post('/api/health/readings', json={
+        'reading_type': 'heart_rate', 'value_primary': 60, 'measured_at': '2026-01-01T08:00:00'
+    }, headers=headers)
+    # Duplicado gravado antes do índice único (contado duas vezes nos agregados)
+    for value in (70, 72):
+        client.post('/api/health/readings', json={
+            'reading_type': 'heart_rate', 'value_primary': value, 'measured_at': '2026-01-01T08:30:00'
+        }, headers=headers)
+    
+    with app.app_context():
+        stamp(directory=MIGRATIONS, revision='e9d4b7a2c518')
+        upgrade(directory=MIGRATIONS, revision='f1b6d3a8c274')
+        values = sorted(r.value_primary for r in app_module.HealthReading.query.all())
+        unique = {index['name']: index['unique'] for index in sa.inspect(db.engine).get_indexes('health_readings')}
+    
+    assert values == [60, 72]
+    assert unique == {'uq_health_readings_user_type_measured_at': 1}
+    latest = client.get('/api/health/readings/latest', headers=headers).get_json()
+    assert latest['heart_rate']['value_primary'] == 72
+    hours = client.get('/api/health/readings?type=heart_rate&resolution=hour', headers=headers).get_json()
+    assert [(bucket['count'], bucket['average']) for bucket in hours] == [(2, 66)]
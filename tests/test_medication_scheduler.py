@@ -0,0 +1,135 @@
+"""
+MedicationReminderScheduler com relógio parado: níveis first/second/escalation
+nos atrasos configurados, sem duplicados após reinício ou com dois workers, e
+replaneamento (cancel_user + plan_day) quando os atrasos mudam.
+"""
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def sent(app_module, monkeypatch):
+    """Lembretes enviados: [(nível, hora agendada)]"""
+    calls = []
+    monkeypatch.setattr(app_module, 'send_medication_reminder',
+                        lambda user_id, medication_name, scheduled_time, alert_level='first', medication_id=None:
+                        calls.append((alert_level, scheduled_time)))
+    return calls
+
+
+@pytest.fixture
+def scheduler(app_module, app, clock, monkeypatch):
+    """Agendador usado também pelas rotas (relógio parado às 07:00)"""
+    clock.now = datetime(2026, 3, 2, 7, 0)
+    scheduler = app_module.MedicationReminderScheduler(clock=clock)
+    monkeypatch.setattr(app_module, 'medication_scheduler', scheduler)
+    return scheduler
+
+
+@pytest.fixture
+def medication(client, user, scheduler):
+    response = client.put('/api/alerts/config', json={
+        'first_alert_delay': 5, 'second_alert_delay': 15, 'escalation_delay': 30
+    }, headers=user['headers'])
+    assert response.status_code == 200
+    response = client.post('/api/medications', json={
+        'name': 'Aspirina', 'schedules': [{'time': '08:00'}]
+    }, headers=user['headers'])
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def tick_at(app, scheduler, clock, hour, minute):
+    clock.now = clock.now.replace(hour=hour, minute=minute)
+    with app.app_context():
+        return scheduler.tick()
+
+
+def statuses(app_module, app):
+    with app.app_context():
+        return {
+            reminder.alert_level: reminder.status
+            for reminder in app_module.MedicationReminder.query.all()
+        }
+
+
+def test_levels_fire_at_their_delays(app_module, app, scheduler, clock, medication, sent):
+    assert tick_at(app, scheduler, clock, 7, 0) == 0
+    assert scheduler.next_fire_at() == datetime(2026, 3, 2, 8, 5)
+    
+    assert tick_at(app, scheduler, clock, 8, 4) == 0
+    assert tick_at(app, scheduler, clock, 8, 5) == 1
+    assert tick_at(app, scheduler, clock, 8, 14) == 0
+    assert tick_at(app, scheduler, clock, 8, 15) == 1
+    assert tick_at(app, scheduler, clock, 8, 30) == 1
+    
+    assert sent == [('first', '08:00'), ('second', '08:00'), ('escalation', '08:00')]
+    assert statuses(app_module, app) == {'first': 'fired', 'second': 'fired', 'escalation': 'fired'}
+    with app.app_context():
+        [alert] = app_module.Alert.query.filter_by(type='medication_missed').all()
+    assert 'Aspirina' in alert.message and '08:00' in alert.message
+
+
+def test_restart_does_not_resend(app_module, app, scheduler, clock, medication, sent):
+    assert tick_at(app, scheduler, clock, 8, 5) == 1
+    
+    # Processo novo (heap vazio): replaneia e recolhe sem repetir o primeiro aviso
+    restarted = app_module.MedicationReminderScheduler(clock=clock)
+    assert tick_at(app, restarted, clock, 8, 6) == 0
+    with app.app_context():
+        assert restarted.plan_day() == 0
+    assert tick_at(app, restarted, clock, 8, 15) == 1
+    
+    assert sent == [('first', '08:00'), ('second', '08:00')]
+
+
+def test_two_workers_fire_each_reminder_once(app_module, app, scheduler, clock, medication, sent):
+    other = app_module.MedicationReminderScheduler(clock=clock)
+    
+    assert tick_at(app, other, clock, 8, 5) + tick_at(app, scheduler, clock, 8, 5) == 1
+    assert sent == [('first', '08:00')]
+
+
+def test_reminders_missed_while_stopped_are_skipped(app_module, app, scheduler, clock, medication, sent):
+    restarted = app_module.MedicationReminderScheduler(clock=clock)
+    
+    assert tick_at(app, restarted, clock, 9, 0) == 0
+    
+    assert sent == []
+    assert statuses(app_module, app) == {'first': 'skipped', 'second': 'skipped', 'escalation': 'skipped'}
+
+
+def test_changed_delays_replan_pending_reminders(app_module, app, client, user, scheduler, clock, medication, sent):
+    assert tick_at(app, scheduler, clock, 8, 5) == 1
+    
+    # cancel_user remove os pendentes e plan_day recria-os com os novos atrasos
+    response = client.put('/api/alerts/config', json={'second_alert_delay': 20, 'escalation_delay': 40},
+                          headers=user['headers'])
+    assert response.status_code == 200
+    
+    assert tick_at(app, scheduler, clock, 8, 15) == 0  # a entrada antiga no heap já não existe
+    assert tick_at(app, scheduler, clock, 8, 20) == 1
+    assert tick_at(app, scheduler, clock, 8, 30) == 0
+    assert tick_at(app, scheduler, clock, 8, 40) == 1
+    assert sent == [('first', '08:00'), ('second', '08:00'), ('escalation', '08:00')]
+
+
+def test_refresh_loads_reminders_planned_by_another_worker(app_module, app, client, user, scheduler, clock, sent):
+    assert tick_at(app, scheduler, clock, 7, 0) == 0
+    
+    # Outro worker planeia a dose; este só a conhece pela recolha periódica
+    other = app_module.MedicationReminderScheduler(clock=clock)
+    client.put('/api/alerts/config', json={'first_alert_delay': 5}, headers=user['headers'])
+    with app.app_context():
+        medication = app_module.Medication(user_id=user['id'], name='Metformina')
+        app_module.db.session.add(medication)
+        app_module.db.session.flush()
+        app_module.db.session.add(app_module.MedicationSchedule(
+            medication_id=medication.id, time=datetime(2026, 3, 2, 8, 0).time(), days_of_week='0123456'))
+        app_module.db.session.commit()
+        assert other.plan_day() == 3
+    assert scheduler.queue_size() == 0
+    
+    assert tick_at(app, scheduler, clock, 8, 5) == 1
+    assert sent == [('first', '08:00')]
@@ -0,0 +1,44 @@
+def add_medications(client, user, count, times=('08:00', '14:00', '20:00')):
+    medications = []
+    for i in range(count):
+        response = client.post('/api/medications', json={
+            'name': f'Medicamento {i}',
+            'schedules': [{'time': time} for time in times],
+        }, headers=user['headers'])
+        assert response.status_code == 201
+        medications.append(response.get_json())
+    return medications
+
+
+def today_queries(client, user, query_budget):
+    with query_budget(2) as requests:
+        response = client.get('/api/medications/today', headers=user['headers'])
+    assert response.status_code == 200
+    return response.get_json(), requests[0][1]
+
+
+def test_today_query_count_is_constant(client, user, query_budget):
+    add_medications(client, user, 1)
+    doses, queries_one = today_queries(client, user, query_budget)
+    assert len(doses) == 3
+    
+    medications = add_medications(client, user, 7)
+    first = medications[0]
+    client.post(f"/api/medications/{first['id']}/take", json={'schedule_id': first['schedules'][0]['id']},
+                headers=user['headers'])
+    doses, queries_many = today_queries(client, user, query_budget)
+    
+    assert len(doses) == 24
+    assert queries_many == queries_one
+    assert sum(dose['taken'] for dose in doses) == 1
+
+
+def test_today_marks_taken_dose(client, user):
+    medication = add_medications(client, user, 1, times=('08:00', '20:00'))[0]
+    evening = medication['schedules'][1]['id']
+    client.post(f"/api/medications/{medication['id']}/take", json={'schedule_id': evening}, headers=user['headers'])
+    
+    doses = client.get('/api/medications/today', headers=user['headers']).get_json()
+    
+    assert [(dose['time'], dose['taken']) for dose in doses] == [('08:00', False), ('20:00', True)]
+    assert doses[1]['taken_at'] is not None
@@ -0,0 +1,175 @@
+"""
+O dispatcher de notificações reenvia com backoff, passa a dead-letter ao fim
+de NOTIFICATION_MAX_ATTEMPTS, faz failover para SMS e respeita o circuit
+breaker. As linhas 'failed' antigas são convertidas pela migração e9d4b7a2c518.
+"""
+import os
+from datetime import timedelta
+
+import pytest
+from flask_migrate import stamp, upgrade
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+PHONE = '+351911111111'
+
+
+@pytest.fixture
+def dispatcher(app_module, clock):
+    return app_module.NotificationDispatcher(clock=clock)
+
+
+@pytest.fixture
+def queue(app_module, app, user):
+    """Gravar uma notificação pendente; devolve o id"""
+    def add(notification_type='medication', channel='whatsapp', sent_to=PHONE, message='Hora do medicamento'):
+        log = app_module.NotificationLog(
+            user_id=user['id'],
+            notification_type=notification_type,
+            message=message,
+            channel=channel,
+            sent_to=sent_to,
+            status='pending',
+        )
+        with app.app_context():
+            return app_module.notification_writer.insert([log])[0]
+    return add
+
+
+def stored(app_module, app, notification_id):
+    with app.app_context():
+        app_module.db.session.remove()
+        return app_module.db.session.get(app_module.NotificationLog, notification_id)
+
+
+def test_successful_send_is_marked_sent(app_module, app, dispatcher, queue, fake_twilio):
+    notification_id = queue()
+    
+    with app.app_context():
+        assert dispatcher.process(notification_id) == 'sent'
+        assert dispatcher.process(notification_id) is None  # já não está disponível
+    
+    log = stored(app_module, app, notification_id)
+    assert log.status == 'sent' and log.sent_at is not None
+    assert [message['to'] for message in fake_twilio.sent] == [f'whatsapp:{PHONE}']
+
+
+def test_failure_is_retried_with_backoff(app_module, app, dispatcher, queue, fake_twilio, clock):
+    fake_twilio.fail_numbers.add(PHONE)
+    notification_id = queue()
+    
+    with app.app_context():
+        assert dispatcher.process(notification_id) == 'retry'
+        log = stored(app_module, app, notification_id)
+        delay = (log.next_attempt_at - clock.now).total_seconds()
+        assert log.attempts == 1 and 'Falha simulada' in log.last_error
+        assert app_module.NOTIFICATION_RETRY_BASE / 2 <= delay <= app_module.NOTIFICATION_RETRY_BASE
+        
+        # Antes do backoff não é recolhida; depois é enviada
+        assert dispatcher.due_ids(10) == []
+        clock.advance(seconds=delay + 1)
+        assert dispatcher.due_ids(10) == [notification_id]
+        fake_twilio.fail_numbers.clear()
+        assert dispatcher.process_pending() == ['sent']
+
+
+def test_backoff_grows_and_is_capped(app_module):
+    delays = [app_module.retry_delay(attempts) for attempts in range(1, 12)]
+    
+    for attempts, delay in enumerate(delays, start=1):
+        full = min(app_module.NOTIFICATION_RETRY_MAX, app_module.NOTIFICATION_RETRY_BASE * 2 ** (attempts - 1))
+        assert full / 2 <= delay <= full
+
+
+def test_exhausted_retries_go_to_dead_letter(app_module, app, dispatcher, queue, fake_twilio, clock):
+    fake_twilio.fail_numbers.add(PHONE)
+    notification_id = queue()
+    
+    with app.app_context():
+        statuses = []
+        for _ in range(app_module.NOTIFICATION_MAX_ATTEMPTS):
+            statuses.append(dispatcher.process(notification_id))
+            clock.advance(hours=1)
+        assert statuses == ['retry'] * (app_module.NOTIFICATION_MAX_ATTEMPTS - 1) + ['dead']
+        assert dispatcher.process(notification_id) is None
+        assert dispatcher.due_ids(10) == []
+        assert dispatcher.stats()['dead'] == 1
+    
+    log = stored(app_module, app, notification_id)
+    assert log.status == 'dead' and log.attempts == app_module.NOTIFICATION_MAX_ATTEMPTS
+
+
+def test_dead_emergency_fails_over_to_sms(app_module, app, dispatcher, queue, fake_twilio, monkeypatch):
+    monkeypatch.setattr(app_module, 'NOTIFICATION_MAX_ATTEMPTS', 1)
+    fake_twilio.fail_numbers.add(f'whatsapp:{PHONE}')
+    notification_id = queue(notification_type='emergency', sent_to=f'whatsapp:{PHONE}')
+    
+    with app.app_context():
+        assert dispatcher.process(notification_id) == 'dead'
+        copy = app_module.NotificationLog.query.filter_by(reference_type='notification', reference_id=notification_id).one()
+    
+    assert copy.channel == 'sms' and copy.sent_to == PHONE and copy.status == 'sent'
+    assert fake_twilio.sent == [{'body': 'Hora do medicamento', 'from': '+351900000000', 'to': PHONE}]
+
+
+def test_non_critical_without_sms_opt_in_has_no_failover(app_module, app, dispatcher, queue, fake_twilio, monkeypatch):
+    monkeypatch.setattr(app_module, 'NOTIFICATION_MAX_ATTEMPTS', 1)
+    fake_twilio.fail_numbers.add(PHONE)
+    notification_id = queue()
+    
+    with app.app_context():
+        assert dispatcher.process(notification_id) == 'dead'
+        assert app_module.NotificationLog.query.count() == 1
+
+
+def test_open_breaker_skips_the_provider(app_module, app, dispatcher, queue, fake_twilio):
+    breaker = dispatcher.breakers['whatsapp']
+    for _ in range(breaker.failure_threshold):
+        breaker.failure()
+    notification_id = queue()
+    
+    with app.app_context():
+        assert dispatcher.process(notification_id) == 'retry'
+    
+    assert fake_twilio.sent == []
+    assert 'circuito aberto' in stored(app_module, app, notification_id).last_error
+
+
+def test_circuit_breaker_opens_half_opens_and_closes(app_module):
+    now = [0.0]
+    breaker = app_module.CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=lambda: now[0])
+    
+    breaker.failure()
+    assert breaker.state == 'closed'
+    breaker.failure()
+    assert breaker.state == 'open' and not breaker.allow()
+    
+    now[0] += 31
+    assert breaker.state == 'half_open' and breaker.allow()
+    breaker.failure()  # a tentativa falhou: reabre logo
+    assert breaker.state == 'open'
+    
+    now[0] += 31
+    breaker.success()
+    assert breaker.state == 'closed' and breaker.failures == 0
+
+
+def test_legacy_failed_rows_are_converted(app_module, app, user, clock):
+    with app.app_context():
+        now = app_module.datetime.utcnow()
+        logs = [
+            app_module.NotificationLog(user_id=user['id'], notification_type='medication', message='recente',
+                                       channel='whatsapp', sent_to=PHONE, status='failed', created_at=now - timedelta(minutes=5)),
+            app_module.NotificationLog(user_id=user['id'], notification_type='medication', message='antiga',
+                                       channel='whatsapp', sent_to=PHONE, status='failed', created_at=now - timedelta(days=2)),
+        ]
+        app_module.db.session.add_all(logs)
+        app_module.db.session.commit()
+        
+        stamp(directory=MIGRATIONS, revision='c6f1d9b3e742')
+        upgrade(directory=MIGRATIONS, revision='e9d4b7a2c518')
+        app_module.db.session.expire_all()
+        
+        assert [(log.message, log.status, log.attempts) for log in logs] == [('recente', 'retry', 1), ('antiga', 'dead', 1)]
+        assert app_module.NotificationDispatcher().due_ids(10) == [logs[0].id]
@@ -0,0 +1,112 @@
+"""
+Modo queue: o pedido HTTP só grava as notificações e devolve os IDs; o pool
+envia-as depois. /api/notifications/queue mostra a profundidade da fila e a
+latência e exige o METRICS_TOKEN.
+"""
+import pytest
+
+
+CONTACTS = ['+351921111111', '+351922222222']
+
+
+class ManualExecutor:
+    """Pool que só corre as tarefas quando o teste mandar"""
+
+    def __init__(self):
+        self.tasks = []
+
+    def submit(self, fn, *args):
+        self.tasks.append((fn, args))
+
+    def run_all(self):
+        tasks, self.tasks = self.tasks, []
+        for fn, args in tasks:
+            fn(*args)
+
+
+@pytest.fixture
+def dispatcher(app_module, monkeypatch):
+    dispatcher = app_module.NotificationDispatcher(workers=2)
+    dispatcher._executor = ManualExecutor()  # start() fica sem efeito: nada corre sozinho
+    monkeypatch.setattr(app_module, 'notification_dispatcher', dispatcher)
+    monkeypatch.setattr(app_module, 'NOTIFICATION_MODE', 'queue')
+    return dispatcher
+
+
+@pytest.fixture
+def contacts(client, user):
+    for i, phone in enumerate(CONTACTS):
+        response = client.post('/api/contacts', json={
+            'name': f'Contacto {i}', 'phone': phone, 'is_emergency': True, 'priority': len(CONTACTS) - i
+        }, headers=user['headers'])
+        assert response.status_code == 201
+
+
+def statuses(app_module, app):
+    with app.app_context():
+        app_module.db.session.remove()
+        return sorted(log.status for log in app_module.NotificationLog.query.all())
+
+
+def test_request_returns_queued_ids_without_sending(app_module, app, client, user, contacts, dispatcher, fake_twilio):
+    response = client.post('/api/alerts/emergency', json={}, headers=user['headers'])
+    
+    assert response.status_code == 201
+    data = response.get_json()
+    assert data['notifications_queued'] == 2 and len(data['notification_ids']) == 2
+    assert fake_twilio.sent == []
+    assert statuses(app_module, app) == ['pending', 'pending']
+    assert [args for _, args in dispatcher._executor.tasks] == [(i,) for i in data['notification_ids']]
+    
+    dispatcher._executor.run_all()
+    
+    assert sorted(message['to'] for message in fake_twilio.sent) == [f'whatsapp:{phone}' for phone in CONTACTS]
+    assert statuses(app_module, app) == ['sent', 'sent']
+
+
+def test_enqueue_skips_ids_already_in_flight(dispatcher):
+    dispatcher.enqueue([1, 2])
+    dispatcher.enqueue([2, 3])
+    
+    assert [args for _, args in dispatcher._executor.tasks] == [(1,), (2,), (3,)]
+
+
+def test_queue_stats_show_depth_and_latency(app_module, app, client, user, contacts, dispatcher, fake_twilio, monkeypatch):
+    monkeypatch.setattr(app_module, 'METRICS_TOKEN', 'segredo-ops')
+    headers = {'Authorization': 'Bearer segredo-ops'}
+    client.post('/api/alerts/emergency', json={}, headers=user['headers'])
+    
+    queued = client.get('/api/notifications/queue', headers=headers).get_json()
+    assert (queued['pending'], queued['in_flight'], queued['sent']) == (2, 2, 0)
+    assert queued['latency_ms']['p50'] is None
+    
+    dispatcher._executor.run_all()
+    
+    done = client.get('/api/notifications/queue', headers=headers).get_json()
+    assert (done['pending'], done['in_flight'], done['sent'], done['dead']) == (0, 0, 2, 0)
+    assert done['latency_ms']['p50'] is not None and done['circuits'] == {'whatsapp': 'closed', 'sms': 'closed'}
+    assert done['throttle']['send'] >= 2
+
+
+def test_queue_endpoint_needs_metrics_token(app_module, client, user, monkeypatch):
+    monkeypatch.setattr(app_module, 'METRICS_TOKEN', '')
+    assert client.get('/api/notifications/queue').status_code == 404
+    
+    monkeypatch.setattr(app_module, 'METRICS_TOKEN', 'segredo-ops')
+    assert client.get('/api/notifications/queue').status_code == 401
+    assert client.get('/api/notifications/queue', headers=user['headers']).status_code == 401
+
+
+def test_poller_picks_up_rows_left_pending(app_module, app, client, user, contacts, dispatcher, fake_twilio):
+    """Pendentes que nunca chegaram ao pool (ex: reinício): o poller volta a submetê-las"""
+    ids = client.post('/api/alerts/emergency', json={}, headers=user['headers']).get_json()['notification_ids']
+    dispatcher._executor.tasks.clear()
+    dispatcher._queued.clear()
+    
+    with app.app_context():
+        assert dispatcher.due_ids(500) == ids
+        dispatcher.submit(dispatcher.due_ids(500))
+    dispatcher._executor.run_all()
+    
+    assert len(fake_twilio.sent) == 2
+    assert statuses(app_module, app) == ['sent', 'sent']
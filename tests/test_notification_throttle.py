@@ -0,0 +1,126 @@
+"""
+NotificationThrottle: deduplicação, retenção acima do limite e resumos, com o
+relógio injetado, nos dois backends (memória e notification_logs).
+"""
+from datetime import timedelta
+
+import pytest
+
+
+CAREGIVER = '+351922222222'
+
+
+def key(reference_id=1, notification_type='medication'):
+    return (CAREGIVER, notification_type, 'medication', reference_id)
+
+
+@pytest.fixture(params=['memory', 'database'])
+def throttle(request, app_module, app, clock):
+    return app_module.NotificationThrottle(backend=request.param, dedup_window=120, rate_limit=2,
+                                           rate_window=600, clock=clock)
+
+
+@pytest.fixture
+def second_user(client):
+    response = client.post('/api/auth/register', json={'name': 'Joaquim', 'phone': '+351913333333'})
+    assert response.status_code == 201
+    return response.get_json()['user']['id']
+
+
+def check(app_module, app, throttle, user_id, message, reference_id=1, notification_type='medication'):
+    """Decisão do throttle; o backend database precisa do envio gravado como o enqueue faria"""
+    with app.app_context():
+        decision = throttle.check(user_id, key(reference_id, notification_type), message)
+        if decision == 'send' and throttle.backend == 'database':
+            log_sent(app_module, throttle, user_id, message, reference_id, notification_type)
+    return decision
+
+
+def log_sent(app_module, throttle, user_id, message, reference_id=1, notification_type='medication'):
+    app_module.db.session.add(app_module.NotificationLog(
+        user_id=user_id, notification_type=notification_type, reference_type='medication',
+        reference_id=reference_id, message=message, channel='whatsapp', sent_to=CAREGIVER,
+        status='sent', created_at=throttle.clock(),
+    ))
+    app_module.db.session.commit()
+
+
+def test_identical_message_is_dropped_within_dedup_window(app_module, app, throttle, user, clock):
+    assert check(app_module, app, throttle, user['id'], 'Tomar Aspirina') == 'send'
+    assert check(app_module, app, throttle, user['id'], 'Tomar Aspirina') == 'duplicate'
+    
+    clock.advance(seconds=121)
+    assert check(app_module, app, throttle, user['id'], 'Tomar Aspirina') == 'send'
+    assert throttle.counts == {'send': 2, 'duplicate': 1, 'held': 0, 'digests': 0}
+
+
+def test_emergencies_are_never_deduplicated(app_module, app, throttle, user):
+    for _ in range(5):
+        assert check(app_module, app, throttle, user['id'], 'SOS', notification_type='emergency') == 'send'
+
+
+def test_over_limit_is_held_and_sent_as_one_digest(app_module, app, throttle, user, clock):
+    assert check(app_module, app, throttle, user['id'], 'Lembrete 1') == 'send'
+    assert check(app_module, app, throttle, user['id'], 'Lembrete 2') == 'send'
+    assert check(app_module, app, throttle, user['id'], 'Lembrete 3') == 'held'
+    assert check(app_module, app, throttle, user['id'], 'Lembrete 4') == 'held'
+    assert check(app_module, app, throttle, user['id'], 'Lembrete 4') == 'duplicate'
+    
+    with app.app_context():
+        assert throttle.due_digests() == []  # ainda dentro do limite
+        clock.advance(seconds=601)
+        [(user_id, digest_key, digest)] = throttle.due_digests()
+        assert throttle.due_digests() == []
+    
+    assert (user_id, digest_key) == (user['id'], key())
+    assert digest.startswith('📋 Resumo: 2 notificações') and 'Lembrete 3' in digest and 'Lembrete 4' in digest
+    assert throttle.stats()['holding'] == 0
+
+
+def test_each_user_has_its_own_limit_and_digest(app_module, app, throttle, user, second_user, clock):
+    """Um cuidador de dois utilizadores: os alertas de um não gastam o limite do outro"""
+    for n in range(2):
+        assert check(app_module, app, throttle, user['id'], f'Maria {n}') == 'send'
+    assert check(app_module, app, throttle, user['id'], 'Maria 2') == 'held'
+    
+    assert check(app_module, app, throttle, second_user, 'Joaquim 0') == 'send'
+    assert check(app_module, app, throttle, second_user, 'Joaquim 1') == 'send'
+    assert check(app_module, app, throttle, second_user, 'Joaquim 2') == 'held'
+    
+    with app.app_context():
+        clock.advance(seconds=601)
+        digests = {user_id: digest for user_id, _, digest in throttle.due_digests()}
+    
+    assert digests == {user['id']: 'Maria 2', second_user: 'Joaquim 2'}
+
+
+def test_digests_are_logged_under_their_own_user(app_module, app, user, second_user, clock, monkeypatch):
+    throttle = app_module.NotificationThrottle(rate_limit=1, rate_window=600, clock=clock)
+    monkeypatch.setattr(app_module, 'notification_throttle', throttle)
+    
+    with app.app_context():
+        for user_id in (user['id'], second_user):
+            app_module.enqueue_notifications(user_id, [CAREGIVER], f'Primeiro {user_id}',
+                                             reference_type='medication', reference_id=1)
+            app_module.enqueue_notifications(user_id, [CAREGIVER], f'Segundo {user_id}',
+                                             reference_type='medication', reference_id=1)
+        clock.advance(seconds=601)
+        app_module.send_due_digests()
+        
+        logged = {
+            (log.user_id, log.message)
+            for log in app_module.NotificationLog.query.filter(app_module.NotificationLog.message.like('Segundo%'))
+        }
+    
+    assert logged == {(user['id'], f"Segundo {user['id']}"), (second_user, f'Segundo {second_user}')}
+
+
+def test_memory_history_is_pruned_after_the_window(app_module, app, user, clock):
+    throttle = app_module.NotificationThrottle(dedup_window=120, rate_limit=2, rate_window=600, clock=clock)
+    for reference_id in range(3):
+        throttle.check(user['id'], key(reference_id), 'Tomar Aspirina')
+    assert len(throttle._sent) == 3
+    
+    clock.advance(seconds=601)
+    throttle.check(user['id'], key(99), 'Outra')
+    assert list(throttle._sent) == [(user['id'], key(99))]
@@ -0,0 +1,18 @@
+import pytest
+
+
+def test_bootstrap_within_budget(client, user, query_budget):
+    client.post('/api/contacts', json={'name': 'Filha', 'phone': '+351911111111'}, headers=user['headers'])
+    
+    # Utilizador do token + uma query por secção (user, medications, contacts, activities)
+    with query_budget(5) as requests:
+        response = client.get('/api/bootstrap', headers=user['headers'])
+    
+    assert response.status_code == 200
+    assert requests[0][1] > 0
+
+
+def test_budget_exceeded_fails(client, user, query_budget):
+    with pytest.raises(AssertionError, match='orçamento'):
+        with query_budget(0):
+            client.get('/api/bootstrap', headers=user['headers'])
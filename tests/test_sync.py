@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+
+def add_contact(client, user, name, phone):
+    response = client.post('/api/contacts', json={'name': name, 'phone': phone}, headers=user['headers'])
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def sync(client, user, since=None):
+    path = '/api/sync' if since is None else f'/api/sync?since={since}'
+    response = client.get(path, headers=user['headers'])
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def prune_all(app_module, app):
+    """Envelhecer todo o histórico para lá da retenção e limpar"""
+    with app.app_context():
+        app_module.SyncChange.query.update({'created_at': datetime.utcnow() - timedelta(days=app_module.SYNC_RETENTION_DAYS + 1)})
+        app_module.db.session.commit()
+        return app_module.prune_sync_changes()
+
+
+def test_incremental_changes_since_token(client, user):
+    add_contact(client, user, 'Filha', '+351911111111')
+    first = sync(client, user)
+    assert first['full'] is True
+    
+    contact_id = add_contact(client, user, 'Filho', '+351922222222')
+    second = sync(client, user, first['token'])
+    
+    assert second['full'] is False
+    assert second['token'] > first['token']
+    assert contact_id in [contact['id'] for contact in second['changes']['contacts']['upserted']]
+
+
+def test_idle_user_resumes_incrementally_after_prune(app_module, app, client, user):
+    add_contact(client, user, 'Filha', '+351911111111')
+    add_contact(client, user, 'Filho', '+351922222222')
+    token = sync(client, user)['token']
+    
+    assert prune_all(app_module, app) >= 1
+    for _ in range(3):
+        response = sync(client, user, token)
+        assert response['full'] is False
+        assert 'contacts' not in response['changes']
+        token = response['token']
+
+
+def test_token_older_than_pruned_history_gets_full_state(app_module, app, client, user):
+    add_contact(client, user, 'Filha', '+351911111111')
+    token = sync(client, user)['token']
+    add_contact(client, user, 'Filho', '+351922222222')
+    add_contact(client, user, 'Neta', '+351933333333')
+    
+    prune_all(app_module, app)
+    response = sync(client, user, token)
+    
+    assert response['full'] is True
+    assert len(response['changes']['contacts']['upserted']) == 3
+    assert response['token'] >= token
+
+
+def test_tokens_never_go_backwards_after_prune(app_module, app, client, user):
+    add_contact(client, user, 'Filha', '+351911111111')
+    add_contact(client, user, 'Filho', '+351922222222')
+    token = sync(client, user)['token']
+    
+    prune_all(app_module, app)
+    add_contact(client, user, 'Neta', '+351933333333')
+    response = sync(client, user, token)
+    
+    assert response['full'] is False
+    assert response['token'] > token
+    assert [c['name'] for c in response['changes']['contacts']['upserted']][-1] == 'Neta'